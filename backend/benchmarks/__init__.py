@@ -0,0 +1,4 @@
+"""
+Benchmarks
+Load and latency benchmarks against in-process fakes of Sheets, OpenAI and ElevenLabs
+"""
@@ -0,0 +1,147 @@
+"""
+Benchmark Data
+Seeded synthetic customers, orders, products and interactions in sheet row layout
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+PROFILES = {
+    "small": {"customers": 1000, "orders": 50000, "products": 5000, "interactions": 2000},
+    "medium": {"customers": 5000, "orders": 250000, "products": 20000, "interactions": 5000},
+    "full": {"customers": 10000, "orders": 1000000, "products": 50000, "interactions": 10000},
+}
+
+CATEGORIES = ["Phone Cases", "Chargers", "Cables", "Headphones", "Screen Protectors", "Batteries", "Adapters", "Mounts"]
+DEVICES = ["iPhone 15", "iPhone 14", "Galaxy S24", "Galaxy S23", "Pixel 8", "Pixel 7", "iPad Air", "MacBook Pro", "ThinkPad X1", "Surface Pro"]
+ADJECTIVES = ["Ultra", "Pro", "Slim", "Rugged", "Fast", "Wireless", "Premium", "Compact", "Braided", "Magnetic"]
+STATUSES = ["delivered"] * 6 + ["shipped"] * 2 + ["processing", "pending", "cancelled"]
+QUERIES = [
+    "Where is my order {order}?",
+    "Can you track order {order} for me",
+    "Is the {product} compatible with my {device}?",
+    "I'd like to reorder the same chargers as last time",
+    "What cables do you have for the {device}",
+    "Do you have any {category} in stock?",
+    "Please place an order for 10 {product}",
+    "What's the price of {product}?",
+    "I need to return a damaged item from my last order",
+    "Can I get an invoice for order {order}",
+]
+
+HEADERS = {
+    "Customers": ["id", "company_name", "email", "phone", "registration_date", "total_spent", "last_order_date", "status"],
+    "Orders": ["id", "customer_id", "date", "products", "quantities", "total_amount", "status", "tracking_number", "notes"],
+    "Products": ["sku", "name", "category", "price", "stock_level", "description", "compatibility", "image_url"],
+    "Interactions": ["timestamp", "customer_id", "channel", "query", "response", "session_id", "satisfaction"],
+}
+
+
+def customer_id(i: int) -> str:
+    return f"CUST-{i:05d}"
+
+
+def product_sku(i: int) -> str:
+    return f"SKU-{i:06d}"
+
+
+def generate_dataset(
+    customers: int = 10000,
+    orders: int = 1000000,
+    products: int = 50000,
+    interactions: int = 10000,
+    seed: int = 42
+) -> Dict[str, List[List[Any]]]:
+    """Rows for every sheet the service reads, header first, identical for a given seed.
+
+    Order volume is skewed: a few customers carry long histories, like the
+    wholesale accounts that make pagination matter.
+    """
+    rng = random.Random(seed)
+    start = datetime(2022, 1, 1)
+    span = int(timedelta(days=3 * 365).total_seconds())
+
+    product_rows = []
+    prices = []
+    for i in range(products):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        price = round(rng.uniform(4.99, 249.99), 2)
+        prices.append(price)
+        product_rows.append([
+            product_sku(i),
+            f"{rng.choice(ADJECTIVES)} {category[:-1] if category.endswith('s') else category} {i}",
+            category,
+            str(price),
+            str(rng.randint(0, 500)),
+            f"{rng.choice(ADJECTIVES)} accessory for everyday use",
+            ",".join(rng.sample(DEVICES, rng.randint(1, 4))),
+            ""
+        ])
+
+    order_rows = []
+    totals = [0.0] * customers
+    last_dates = [""] * customers
+    for i in range(orders):
+        owner = int(customers * rng.random() ** 2)  # Skewed towards low ids
+        date = (start + timedelta(seconds=rng.randrange(span))).isoformat()
+        picks = [rng.randrange(products) for _ in range(rng.randint(1, 3))]
+        quantities = [rng.randint(1, 20) for _ in picks]
+        total = round(sum(prices[p] * q for p, q in zip(picks, quantities)), 2)
+        totals[owner] += total
+        last_dates[owner] = max(last_dates[owner], date)
+        status = rng.choice(STATUSES)
+        order_rows.append([
+            f"ORD-{i:08X}",
+            customer_id(owner),
+            date,
+            json.dumps([product_sku(p) for p in picks]),
+            json.dumps(quantities),
+            str(total),
+            status,
+            f"1Z{i:012d}" if status in ("shipped", "delivered") else "",
+            ""
+        ])
+
+    customer_rows = []
+    for i in range(customers):
+        customer_rows.append([
+            customer_id(i),
+            f"Retailer {i}",
+            f"buyer{i}@retailer{i}.example.com",
+            f"+1-555-{i % 10000:04d}",
+            (start - timedelta(days=rng.randrange(1000))).date().isoformat(),
+            str(round(totals[i], 2)),
+            last_dates[i],
+            "active"
+        ])
+
+    interaction_rows = []
+    for i in range(interactions):
+        interaction_rows.append([
+            (start + timedelta(seconds=rng.randrange(span))).isoformat(),
+            customer_id(rng.randrange(customers)),
+            "chat",
+            random_query(rng, orders, products),
+            "",
+            "",
+            ""
+        ])
+
+    return {
+        "Customers": [HEADERS["Customers"]] + customer_rows,
+        "Orders": [HEADERS["Orders"]] + order_rows,
+        "Products": [HEADERS["Products"]] + product_rows,
+        "Interactions": [HEADERS["Interactions"]] + interaction_rows,
+    }
+
+
+def random_query(rng: random.Random, orders: int, products: int) -> str:
+    """A customer chat message drawn from common support intents"""
+    return rng.choice(QUERIES).format(
+        order=f"ORD-{rng.randrange(max(orders, 1)):08X}",
+        product=product_sku(rng.randrange(max(products, 1))),
+        device=rng.choice(DEVICES),
+        category=rng.choice(CATEGORIES).lower()
+    )
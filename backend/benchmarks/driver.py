@@ -0,0 +1,175 @@
+"""
+Benchmark Driver
+Async closed-loop load generator, latency recorder and result comparison
+"""
+
+import math
+import time
+import random
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def percentile(ordered: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyRecorder:
+    """Every sample per name, so percentiles are exact rather than bucketed"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, name: str, seconds: float, ok: bool = True):
+        self.samples.setdefault(name, []).append(seconds)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def reset(self):
+        self.samples.clear()
+        self.errors.clear()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        results = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            results[name] = {
+                "count": len(ordered),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0,
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return results
+
+
+class MethodProbe:
+    """Times async methods on live service objects without touching their code.
+
+    Wrappers are set as instance attributes, so internal ``self.method()``
+    calls are measured too; ``restore`` removes them.
+    """
+
+    def __init__(self, recorder: LatencyRecorder):
+        self.recorder = recorder
+        self._patched: List[Tuple[Any, str]] = []
+
+    def wrap(self, obj: Any, prefix: str, names: Sequence[str]):
+        for name in names:
+            method = getattr(obj, name, None)
+            if method is None or not asyncio.iscoroutinefunction(method):
+                continue
+            setattr(obj, name, self._timed(f"{prefix}.{name}", method))
+            self._patched.append((obj, name))
+
+    def _timed(self, label: str, method: Callable[..., Awaitable[Any]]):
+        recorder = self.recorder
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            ok = False
+            try:
+                result = await method(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                recorder.record(label, time.perf_counter() - start, ok)
+        return wrapper
+
+    def restore(self):
+        for obj, name in self._patched:
+            obj.__dict__.pop(name, None)
+        self._patched.clear()
+
+
+class Scenario:
+    """A named request the driver issues; ``run(rng)`` returns True on success"""
+
+    def __init__(self, name: str, run: Callable[[random.Random], Awaitable[bool]], weight: float = 1.0):
+        self.name = name
+        self.run = run
+        self.weight = weight
+
+
+async def run_load(
+    scenarios: List[Scenario],
+    recorder: LatencyRecorder,
+    concurrency: int = 50,
+    duration: Optional[float] = 30.0,
+    requests: Optional[int] = None,
+    seed: int = 42
+) -> Dict[str, Dict[str, Any]]:
+    """Closed-loop load: ``concurrency`` virtual users issue weighted scenarios back to back.
+
+    Stops after ``requests`` total requests or ``duration`` seconds,
+    whichever comes first. Each user has its own seeded RNG so runs replay
+    the same request mix.
+    """
+    weights = [scenario.weight for scenario in scenarios]
+    deadline = time.perf_counter() + duration if duration else None
+    issued = 0
+
+    async def user(index: int):
+        nonlocal issued
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if requests is not None:
+                if issued >= requests:
+                    return
+                issued += 1
+            scenario = rng.choices(scenarios, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = await scenario.run(rng)
+            except Exception as e:
+                print(f"Error in scenario {scenario.name}: {e}")
+                ok = False
+            recorder.record(scenario.name, time.perf_counter() - start, ok)
+
+    recorder.reset()
+    await asyncio.gather(*[user(i) for i in range(concurrency)])
+    recorder.stop()
+    return recorder.summary()
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.2,
+    metric: str = "p95_ms",
+    min_delta_ms: float = 1.0
+) -> List[str]:
+    """Entries whose ``metric`` grew by more than ``tolerance`` (and ``min_delta_ms``) over the baseline run"""
+    regressions = []
+    for section in ("endpoints", "services"):
+        for name, current in results.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous or not previous.get(metric):
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric]
+            # Sub-millisecond cache hits jitter by large ratios; ignore that noise
+            if change > tolerance and current[metric] - previous[metric] >= min_delta_ms:
+                regressions.append(
+                    f"{section}/{name}: {metric} {previous[metric]:.1f} -> {current[metric]:.1f} ms (+{change:.0%})"
+                )
+    return regressions
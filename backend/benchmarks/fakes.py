@@ -0,0 +1,200 @@
+"""
+Benchmark Fakes
+In-process stand-ins for the Sheets client, OpenAI and ElevenLabs with configurable latency
+"""
+
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class LatencyModel:
+    """Base latency plus gaussian jitter plus a per-unit cost (rows, tokens, bytes)"""
+
+    def __init__(self, base: float = 0.0, jitter: float = 0.0, per_unit: float = 0.0, seed: Optional[int] = None):
+        self.base = base
+        self.jitter = jitter
+        self.per_unit = per_unit
+        self.rng = random.Random(seed)
+
+    def sample(self, units: int = 0) -> float:
+        jitter = self.rng.gauss(0.0, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.base + jitter + units * self.per_unit)
+
+
+class FakeError(Exception):
+    """Transient upstream failure; carries a status so the retry logic treats it as retryable"""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeSheetsClient:
+    """The SheetsClient methods ``ManagedSheetsClient`` calls, served from memory.
+
+    ``sheets`` maps sheet name to rows, header first, as the real API returns
+    them. Ranges are ignored; every read returns the whole sheet.
+    """
+
+    def __init__(self, sheets: Dict[str, List[List[Any]]], latency: Optional[LatencyModel] = None, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.sheets = sheets
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats = {"reads": 0, "batch_reads": 0, "writes": 0, "updates": 0, "rows_read": 0, "rows_written": 0, "errors": 0}
+
+    async def _delay(self, rows: int):
+        await asyncio.sleep(self.latency.sample(rows))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            raise FakeError("The service is currently unavailable")
+
+    async def get_sheet_data(self, spreadsheet_id: str, sheet: str, range: str) -> List[List[Any]]:
+        rows = self.sheets.get(sheet, [])
+        self.stats["reads"] += 1
+        self.stats["rows_read"] += len(rows)
+        await self._delay(len(rows))
+        return list(rows)
+
+    async def batch_get(self, spreadsheet_id: str, ranges: List[Tuple[str, str]]) -> List[List[List[Any]]]:
+        results = [list(self.sheets.get(sheet, [])) for sheet, _ in ranges]
+        self.stats["batch_reads"] += 1
+        self.stats["rows_read"] += sum(len(rows) for rows in results)
+        await self._delay(sum(len(rows) for rows in results))
+        return results
+
+    async def add_rows(self, spreadsheet_id: str, sheet: str, data: List[List[Any]]) -> Dict[str, Any]:
+        await self._delay(len(data))
+        self.sheets.setdefault(sheet, [[]]).extend(data)
+        self.stats["writes"] += 1
+        self.stats["rows_written"] += len(data)
+        return {"updates": {"updatedRows": len(data)}}
+
+    async def batch_update_cells(self, spreadsheet_id: str, sheet: str, ranges: Dict[str, List[List[Any]]]) -> Dict[str, Any]:
+        await self._delay(len(ranges))
+        rows = self.sheets.setdefault(sheet, [[]])
+        for range, values in ranges.items():
+            top, left = _a1_cell(range.split(":")[0])
+            for r, line in enumerate(values):
+                while len(rows) <= top + r:
+                    rows.append([])
+                row = rows[top + r] = list(rows[top + r])
+                row.extend([""] * (left + len(line) - len(row)))
+                row[left:left + len(line)] = line
+        self.stats["updates"] += 1
+        return {"totalUpdatedRanges": len(ranges)}
+
+
+def _a1_cell(cell: str) -> Tuple[int, int]:
+    """Zero-based (row, column) of an A1 cell like ``F12``"""
+    letters = cell.rstrip("0123456789")
+    column = 0
+    for letter in letters.upper():
+        column = column * 26 + ord(letter) - ord("A") + 1
+    return int(cell[len(letters):]) - 1, column - 1
+
+
+class _AsyncChunks:
+    def __init__(self, chunks: List[Any], delay: float):
+        self._chunks = iter(chunks)
+        self._delay = delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delay)
+        return chunk
+
+
+class FakeOpenAI:
+    """Async ``create(**kwargs)`` shaped like ``openai.ChatCompletion.acreate``.
+
+    Plug into ``LLMGateway.create``. Latency is time-to-first-token plus a
+    per-token cost, per model when ``models`` overrides the default.
+    """
+
+    REPLY = (
+        "Thanks for reaching out. Based on your recent orders I can help with that right away. "
+        "Let me know if you would like me to place a reorder or check compatibility for another device."
+    )
+
+    def __init__(
+        self,
+        first_token: Optional[LatencyModel] = None,
+        per_token: float = 0.0,
+        models: Optional[Dict[str, Tuple[LatencyModel, float]]] = None,
+        reply_tokens: int = 60,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.first_token = first_token or LatencyModel()
+        self.per_token = per_token
+        self.models = models or {}
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats = {"calls": 0, "streams": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _reply(self, max_tokens: int) -> List[str]:
+        words = self.REPLY.split(" ")
+        count = min(self.reply_tokens, max_tokens or self.reply_tokens)
+        return [words[i % len(words)] + " " for i in range(count)]
+
+    async def __call__(self, model: str, messages: List[Dict[str, str]], max_tokens: int = 0, stream: bool = False, **kwargs) -> Any:
+        first_token, per_token = self.models.get(model, (self.first_token, self.per_token))
+        tokens = self._reply(max_tokens)
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        self.stats["calls"] += 1
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += len(tokens)
+
+        await asyncio.sleep(first_token.sample(prompt_tokens))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            raise FakeError("The server is overloaded", status_code=503)
+
+        if stream:
+            self.stats["streams"] += 1
+            chunks = [SimpleNamespace(choices=[SimpleNamespace(delta={"content": token})]) for token in tokens]
+            return _AsyncChunks(chunks, per_token)
+
+        await asyncio.sleep(per_token * len(tokens))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="".join(tokens)))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(tokens))
+        )
+
+
+class FakeElevenLabs:
+    """Blocking ``generate(text, voice, stream=False)`` like ``elevenlabs.generate``.
+
+    Runs on the voice worker threads, so it sleeps with ``time.sleep``.
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, bytes_per_char: int = 40, chunk_size: int = 4096):
+        self.latency = latency or LatencyModel()
+        self.bytes_per_char = bytes_per_char
+        self.chunk_size = chunk_size
+        self.stats = {"calls": 0, "bytes": 0}
+
+    def generate(self, text: str, voice: Any = None, stream: bool = False, **kwargs) -> Any:
+        self.stats["calls"] += 1
+        size = len(text) * self.bytes_per_char
+        self.stats["bytes"] += size
+        time.sleep(self.latency.sample(len(text)))
+        audio = b"\xff" * size
+        if stream:
+            return self._chunks(audio)
+        return audio
+
+    def _chunks(self, audio: bytes) -> Iterator[bytes]:
+        for start in range(0, len(audio), self.chunk_size):
+            yield audio[start:start + self.chunk_size]
@@ -0,0 +1,312 @@
+"""
+Benchmark Runner
+Drives the API in process against fakes and saves per-endpoint and per-method latencies
+
+Run from backend/:
+
+    python -m benchmarks.run --profile small --duration 30 --out bench.json
+    python -m benchmarks.run --profile full --baseline bench.json
+
+Sheets, OpenAI and ElevenLabs are replaced by the fakes in
+``benchmarks.fakes``; everything else (caches, indexes, gateway, write
+buffer, middleware) is the real code path. Token verification is
+bypassed so the numbers measure the service, not JWT decoding.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List
+
+from benchmarks.data import PROFILES, DEVICES, CATEGORIES, customer_id, generate_dataset, random_query
+from benchmarks.driver import LatencyRecorder, MethodProbe, Scenario, compare, run_load
+from benchmarks.fakes import FakeElevenLabs, FakeOpenAI, FakeSheetsClient, LatencyModel
+
+DEFAULT_WEIGHTS = "chat=2,products=3,orders=3,orders_filtered=1"
+
+SERVICE_METHODS = {
+    "sheets_service": [
+        "get_customer", "get_customer_by_email", "get_customer_orders_page", "search_products",
+        "get_order", "get_order_tracking", "get_customer_analytics", "log_interaction", "create_order"
+    ],
+    "ai_service": ["process_message", "generate_voice"],
+    "llm": ["complete"],
+    "sheets_client": ["get_sheet_data", "batch_get", "add_rows"],
+}
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load and latency benchmark against local fakes")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--customers", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of unmeasured load first")
+    parser.add_argument("--scenarios", default=DEFAULT_WEIGHTS, help="name=weight list; also tracking, chat_stream, voice")
+    parser.add_argument("--sheets-latency-ms", type=float, default=150.0)
+    parser.add_argument("--sheets-row-us", type=float, default=1.0, help="extra read latency per row")
+    parser.add_argument("--openai-latency-ms", type=float, default=400.0, help="time to first token")
+    parser.add_argument("--openai-token-ms", type=float, default=15.0)
+    parser.add_argument("--voice-latency-ms", type=float, default=800.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="transient failure rate of every fake")
+    parser.add_argument("--mirror", action="store_true", help="serve reads from a SQLite mirror")
+    parser.add_argument("--out", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="previous results to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth before failing")
+    return parser.parse_args(argv)
+
+
+def configure_env(args: argparse.Namespace, workdir: str):
+    """Settings the services read at import time; explicit env vars still win"""
+    os.environ.setdefault("MAIN_SPREADSHEET_ID", "benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    if args.mirror:
+        os.environ.setdefault("SHEETS_MIRROR_ENABLED", "true")
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'mirror.db')}")
+    else:
+        os.environ.setdefault("SHEETS_MIRROR_ENABLED", "false")
+
+
+def dataset_sizes(args: argparse.Namespace) -> Dict[str, int]:
+    sizes = dict(PROFILES[args.profile])
+    for name in ("customers", "orders", "products"):
+        if getattr(args, name):
+            sizes[name] = getattr(args, name)
+    return sizes
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def build_scenarios(args: argparse.Namespace, client, sizes: Dict[str, int]) -> List[Scenario]:
+    customers = sizes["customers"]
+
+    def pick_customer(rng: random.Random) -> str:
+        return customer_id(rng.randrange(customers))
+
+    async def chat(rng: random.Random) -> bool:
+        cid = pick_customer(rng)
+        response = await client.post(
+            "/chat",
+            json={"message": random_query(rng, sizes["orders"], sizes["products"]), "customer_id": cid, "session_id": f"bench-{cid}"},
+            headers={"x-bench-customer": cid}
+        )
+        return response.status_code < 400
+
+    async def chat_stream(rng: random.Random) -> bool:
+        cid = pick_customer(rng)
+        response = await client.post(
+            "/chat/stream",
+            json={"message": random_query(rng, sizes["orders"], sizes["products"]), "customer_id": cid},
+            headers={"x-bench-customer": cid}
+        )
+        return response.status_code < 400
+
+    async def products(rng: random.Random) -> bool:
+        params: Dict[str, Any] = {"limit": 50}
+        roll = rng.random()
+        if roll < 0.4:
+            params["category"] = rng.choice(CATEGORIES)
+        elif roll < 0.8:
+            params["search"] = rng.choice(["charger", "cable", "case", rng.choice(DEVICES)])
+        response = await client.get("/products", params=params, headers={"x-bench-customer": pick_customer(rng)})
+        return response.status_code < 400
+
+    async def orders(rng: random.Random) -> bool:
+        cid = pick_customer(rng)
+        response = await client.get(f"/customers/{cid}/orders", params={"limit": 20}, headers={"x-bench-customer": cid})
+        if response.status_code >= 400:
+            return False
+        # A third of clients page back once
+        cursor = response.json().get("next_cursor")
+        if cursor and rng.random() < 0.33:
+            response = await client.get(
+                f"/customers/{cid}/orders", params={"limit": 20, "cursor": cursor}, headers={"x-bench-customer": cid}
+            )
+        return response.status_code < 400
+
+    async def orders_filtered(rng: random.Random) -> bool:
+        cid = pick_customer(rng)
+        params = {"limit": 20, "status": rng.choice(["delivered", "shipped", "pending"]), "date_from": "2023-01-01"}
+        response = await client.get(f"/customers/{cid}/orders", params=params, headers={"x-bench-customer": cid})
+        return response.status_code < 400
+
+    async def tracking(rng: random.Random) -> bool:
+        response = await client.get(
+            f"/orders/ORD-{rng.randrange(sizes['orders']):08X}/tracking", headers={"x-bench-customer": pick_customer(rng)}
+        )
+        return response.status_code < 400
+
+    async def voice(rng: random.Random) -> bool:
+        response = await client.post(
+            "/chat/voice",
+            json={"text": random_query(rng, sizes["orders"], sizes["products"])},
+            headers={"x-bench-customer": pick_customer(rng)}
+        )
+        # A 200 without audio is still a failed synthesis
+        return response.status_code < 400 and bool(response.json().get("audio_url"))
+
+    available = {
+        "chat": ("POST /chat", chat),
+        "chat_stream": ("POST /chat/stream", chat_stream),
+        "products": ("GET /products", products),
+        "orders": ("GET /customers/{id}/orders", orders),
+        "orders_filtered": ("GET /customers/{id}/orders?filtered", orders_filtered),
+        "tracking": ("GET /orders/{id}/tracking", tracking),
+        "voice": ("POST /chat/voice", voice),
+    }
+    scenarios = []
+    for item in args.scenarios.split(","):
+        key, _, weight = item.strip().partition("=")
+        if key not in available:
+            raise SystemExit(f"Unknown scenario {key!r}; choose from {', '.join(available)}")
+        if float(weight or 1) > 0:
+            name, run = available[key]
+            scenarios.append(Scenario(name, run, float(weight or 1)))
+    return scenarios
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="portal-bench-")
+    configure_env(args, workdir)
+    sizes = dataset_sizes(args)
+
+    started = time.perf_counter()
+    print(f"Generating {sizes} (seed {args.seed})...")
+    sheets = generate_dataset(seed=args.seed, **sizes)
+    generation_seconds = time.perf_counter() - started
+
+    fake_sheets = FakeSheetsClient(
+        sheets,
+        LatencyModel(args.sheets_latency_ms / 1000, args.sheets_latency_ms / 4000, args.sheets_row_us / 1e6, seed=args.seed),
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    fake_openai = FakeOpenAI(
+        first_token=LatencyModel(args.openai_latency_ms / 1000, args.openai_latency_ms / 4000, seed=args.seed),
+        per_token=args.openai_token_ms / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    fake_voice = FakeElevenLabs(LatencyModel(args.voice_latency_ms / 1000, args.voice_latency_ms / 4000, seed=args.seed))
+
+    # Imported late: services read their configuration at import time
+    import httpx
+    from fastapi import Request
+    import main
+    from services import ai_service as ai_service_module
+    from services.audio_cache import AudioCache
+
+    main.sheets_service.sheets_client.client = fake_sheets
+    main.ai_service.llm.create = fake_openai
+    ai_service_module.generate = fake_voice.generate
+    # A fresh cache (and directory) per run, so every voice request synthesizes
+    main.ai_service.audio_cache = AudioCache(os.path.join(workdir, "audio"), main.ai_service.audio_cache.max_bytes)
+
+    async def bench_claims(request: Request) -> Dict[str, Any]:
+        return {"customer_id": request.headers.get("x-bench-customer", "")}
+
+    main.app.dependency_overrides[main.authenticate] = bench_claims
+
+    services = LatencyRecorder()
+    probe = MethodProbe(services)
+    probe.wrap(main.sheets_service, "sheets_service", SERVICE_METHODS["sheets_service"])
+    probe.wrap(main.ai_service, "ai_service", SERVICE_METHODS["ai_service"])
+    probe.wrap(main.ai_service.llm, "llm", SERVICE_METHODS["llm"])
+    probe.wrap(main.sheets_service.sheets_client, "sheets_client", SERVICE_METHODS["sheets_client"])
+
+    endpoints = LatencyRecorder()
+    await main.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark", timeout=120) as client:
+            scenarios = build_scenarios(args, client, sizes)
+            warmup: Dict[str, Any] = {}
+            if args.warmup > 0:
+                print(f"Warming up for {args.warmup:.0f}s...")
+                warmup = await run_load(scenarios, endpoints, args.concurrency, args.warmup, seed=args.seed + 1)
+            warmup_loop = main.loop_monitor.get_stats()
+            print(f"Running {len(scenarios)} scenarios with {args.concurrency} users...")
+            services.reset()
+            main.loop_monitor.reset()
+            endpoint_results = await run_load(scenarios, endpoints, args.concurrency, args.duration, args.requests, seed=args.seed)
+            services.stop()
+    finally:
+        await main.shutdown()
+        probe.restore()
+        main.app.dependency_overrides.pop(main.authenticate, None)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "generation_seconds": round(generation_seconds, 2),
+        },
+        "config": {**vars(args), "dataset": sizes},
+        "warmup": {**warmup, "event_loop": warmup_loop} if warmup else {"event_loop": warmup_loop},
+        "endpoints": endpoint_results,
+        "services": services.summary(),
+        "fakes": {"sheets": fake_sheets.stats, "openai": fake_openai.stats, "elevenlabs": fake_voice.stats},
+        "app": {
+            "ai_gateway": main.ai_service.llm.get_stats(),
+            "ai_cache": main.ai_service.response_cache.get_stats(),
+            "sheets_client": main.sheets_service.sheets_client.stats,
+            "offload": main.sheets_service.offload.get_stats(),
+            "event_loop": main.loop_monitor.get_stats(),
+        },
+    }
+
+
+def print_table(title: str, results: Dict[str, Dict[str, Any]]):
+    print(f"\n{title}")
+    print(f"{'name':<44} {'count':>7} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, row in results.items():
+        print(
+            f"{name:<44} {row['count']:>7} {row['errors']:>5} {row['throughput_rps']:>8.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+        )
+
+
+def cli(argv: List[str]) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run_benchmark(args))
+
+    print_table("Endpoints (ms)", results["endpoints"])
+    print_table("Service methods (ms)", results["services"])
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\nSaved results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No p95 regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
@@ -4,13 +4,15 @@ Customer AI Portal - Backend API
 FastAPI server with MCP Google Sheets integration
 """
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os
 import json
+import time
 import asyncio
 from datetime import datetime, timedelta
 import openai
@@ -20,8 +22,17 @@ from elevenlabs import generate, set_api_key
 from services.sheets_service import SheetsService
 from services.ai_service import AIService
 from services.auth_service import AuthService
+from services.context_loader import ContextLoader
+from services.chat_connections import ConnectionManager, POLICY_VIOLATION
+from services.auth_cache import TokenCache, claims_customer_id, claims_is_staff
+from services import metrics
+from services.metrics import REGISTRY, HTTP_SECONDS, log_event
+from services.offload import LoopLagMonitor
 from models.customer import Customer, Order, Product, ChatMessage
 
+# Structured events and service errors go to stderr (log_event is silent otherwise)
+metrics.configure_logging()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Customer AI Portal API",
@@ -43,8 +54,83 @@ security = HTTPBearer()
 
 # Initialize services
 sheets_service = SheetsService()
-ai_service = AIService()
+ai_service = AIService(sheets_service=sheets_service)
 auth_service = AuthService()
+token_cache = TokenCache.from_env(auth_service.verify_token, shared=sheets_service.shared)
+chat_connections = ConnectionManager.from_env(ai_service, sheets_service, authorize=token_cache.verify)
+loop_monitor = LoopLagMonitor.from_env()
+MAX_BATCH_ORDERS = int(os.getenv('MAX_BATCH_ORDERS', '100'))
+
+# Existing component counters, exported as gauges on /metrics
+REGISTRY.register_stats("ai_cache", ai_service.response_cache.get_stats)
+REGISTRY.register_stats("ai_gateway", ai_service.llm.get_stats)
+REGISTRY.register_stats("auth_cache", token_cache.get_stats)
+REGISTRY.register_stats("sheets_client", lambda: sheets_service.sheets_client.stats)
+REGISTRY.register_stats("write_buffer", sheets_service.writer.get_stats)
+REGISTRY.register_stats("chat", chat_connections.get_stats)
+REGISTRY.register_stats("offload", sheets_service.offload.get_stats)
+REGISTRY.register_stats("event_loop", loop_monitor.get_stats)
+if sheets_service.shared is not None:
+    REGISTRY.register_stats("shared_cache", sheets_service.shared.get_stats)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+if metrics.ENABLED:
+    @app.middleware("http")
+    async def record_request(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            # Route templates, not raw paths, keep label cardinality bounded
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_SECONDS.observe(elapsed, method=request.method, route=path, status=str(status))
+            log_event("http_request", method=request.method, route=path, status=status, ms=round(elapsed * 1000, 1))
+
+# Lifecycle
+@app.on_event("startup")
+async def startup():
+    loop_monitor.start()
+    await sheets_service.start()
+    chat_connections.start()
+    # Intent model trains off the request path; rules cover until it is ready
+    asyncio.get_running_loop().create_task(ai_service.train_intent_model())
+    # Startup state is long-lived; keep full collections from rescanning it
+    sheets_service.offload.freeze()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat_connections.stop()
+    # Flush buffered sheet writes before the worker exits
+    await sheets_service.stop()
+    await loop_monitor.stop()
+    sheets_service.offload.shutdown()
+
+# Auth dependencies: verify once per token, then serve claims from the cache
+async def authenticate(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Any:
+    try:
+        return await token_cache.verify(credentials.credentials)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+def require_customer(claims: Any, customer_id: str):
+    """Tokens only grant access to their own customer's data"""
+    if claims_customer_id(claims) != customer_id:
+        raise HTTPException(status_code=403, detail="Token does not grant access to this customer")
+
+async def authorize_customer(customer_id: str, claims: Any = Depends(authenticate)) -> Any:
+    require_customer(claims, customer_id)
+    return claims
+
+async def authorize_staff(claims: Any = Depends(authenticate)) -> Any:
+    """Cross-customer data needs an admin or staff token"""
+    if not claims_is_staff(claims):
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return claims
 
 # Pydantic models for API
 class CustomerLoginRequest(BaseModel):
@@ -61,6 +147,17 @@ class OrderRequest(BaseModel):
     products: List[Dict[str, Any]]
     notes: Optional[str] = None
 
+class BatchOrderRequest(BaseModel):
+    orders: List[OrderRequest]
+
+class CompatibilityCheck(BaseModel):
+    sku: str
+    device_model: str
+
+class CompatibilityBatchRequest(BaseModel):
+    checks: List[CompatibilityCheck] = []
+    device_models: List[str] = []
+
 class VoiceRequest(BaseModel):
     text: str
     voice_id: Optional[str] = "professional_female"
@@ -88,32 +185,49 @@ async def customer_login(request: CustomerLoginRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/auth/logout")
+async def customer_logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    claims: Any = Depends(authenticate)
+):
+    """Revoke the presented access token on every worker"""
+    await token_cache.revoke(credentials.credentials, claims)
+    return {"message": "Logged out"}
+
 # Customer data endpoints
 @app.get("/customers/{customer_id}")
-async def get_customer(customer_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_customer(customer_id: str, claims: Any = Depends(authorize_customer)):
     """Get customer profile and summary"""
     try:
-        auth_service.verify_token(credentials.credentials)
         customer = await sheets_service.get_customer(customer_id)
         return customer
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/customers/{customer_id}/orders")
-async def get_customer_orders(customer_id: str, limit: int = 50, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get customer order history"""
+async def get_customer_orders(
+    customer_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    sku: Optional[str] = None,
+    claims: Any = Depends(authorize_customer)
+):
+    """Get customer order history, newest first, filtered and paginated"""
     try:
-        auth_service.verify_token(credentials.credentials)
-        orders = await sheets_service.get_customer_orders(customer_id, limit)
-        return {"orders": orders, "total": len(orders)}
+        page = await sheets_service.get_customer_orders_page(
+            customer_id, min(max(limit, 1), 200), cursor, status, date_from, date_to, sku
+        )
+        return {**page, "total": len(page["orders"])}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/customers/{customer_id}/analytics")
-async def get_customer_analytics(customer_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_customer_analytics(customer_id: str, claims: Any = Depends(authorize_customer)):
     """Get customer purchase analytics and insights"""
     try:
-        auth_service.verify_token(credentials.credentials)
         analytics = await sheets_service.get_customer_analytics(customer_id)
         return analytics
     except Exception as e:
@@ -121,14 +235,13 @@ async def get_customer_analytics(customer_id: str, credentials: HTTPAuthorizatio
 
 # AI Chat endpoints
 @app.post("/chat")
-async def chat_with_ai(request: ChatRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def chat_with_ai(request: ChatRequest, claims: Any = Depends(authenticate)):
     """Process customer chat message with AI"""
+    require_customer(claims, request.customer_id)
     try:
-        auth_service.verify_token(credentials.credentials)
-        
-        # Get customer context
-        customer = await sheets_service.get_customer(request.customer_id)
-        recent_orders = await sheets_service.get_customer_orders(request.customer_id, 10)
+        # Get customer context (concurrent reads)
+        loader = ContextLoader(sheets_service)
+        customer, recent_orders = await loader.load_chat_context(request.customer_id, 10)
         
         # Process with AI
         response = await ai_service.process_message(
@@ -138,7 +251,7 @@ async def chat_with_ai(request: ChatRequest, credentials: HTTPAuthorizationCrede
             session_id=request.session_id
         )
         
-        # Log interaction
+        # Log interaction (buffered, does not wait on Sheets)
         await sheets_service.log_interaction(
             customer_id=request.customer_id,
             query=request.message,
@@ -150,78 +263,188 @@ async def chat_with_ai(request: ChatRequest, credentials: HTTPAuthorizationCrede
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest, claims: Any = Depends(authenticate)):
+    """Process customer chat message with AI, streaming tokens as Server-Sent Events"""
+    require_customer(claims, request.customer_id)
+    try:
+        loader = ContextLoader(sheets_service)
+        customer, recent_orders = await loader.load_chat_context(request.customer_id, 10)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def event_stream():
+        async for event in ai_service.stream_message(
+            message=request.message,
+            customer=customer,
+            recent_orders=recent_orders,
+            session_id=request.session_id
+        ):
+            if event["type"] == "done":
+                await sheets_service.log_interaction(
+                    customer_id=request.customer_id,
+                    query=request.message,
+                    response=event["text"],
+                    session_id=request.session_id
+                )
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/chat/voice")
-async def generate_voice_response(request: VoiceRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def generate_voice_response(request: VoiceRequest, claims: Any = Depends(authenticate)):
     """Generate voice audio from text response"""
     try:
-        auth_service.verify_token(credentials.credentials)
         audio_url = await ai_service.generate_voice(request.text, request.voice_id)
         return {"audio_url": audio_url}
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        # Synthesis failures are upstream trouble, not a bad request
+        raise HTTPException(status_code=503, detail=f"Voice synthesis failed: {e}")
+
+@app.post("/chat/voice/stream")
+async def stream_voice_response(request: VoiceRequest, claims: Any = Depends(authenticate)):
+    """Stream voice audio as it is synthesized so playback can start early"""
+    chunks = ai_service.stream_voice(request.text, request.voice_id)
+    # Wait for the first chunk, so a failed synthesis is still a 503 rather than an empty 200
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Voice synthesis failed: {e}")
+
+    async def body():
+        yield first
+        # A later error propagates and the server aborts the response mid-body
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="audio/mpeg")
 
 # Product and inventory endpoints
 @app.get("/products")
-async def get_products(category: Optional[str] = None, search: Optional[str] = None, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get product catalog with optional filtering"""
+async def get_products(category: Optional[str] = None, search: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None, claims: Any = Depends(authenticate)):
+    """Get product catalog with optional filtering, ranked and paginated"""
     try:
-        auth_service.verify_token(credentials.credentials)
-        products = await sheets_service.get_products(category, search)
-        return {"products": products}
+        return await sheets_service.search_products(category, search, min(max(limit, 1), 200), cursor)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/products/{sku}/compatibility")
-async def check_product_compatibility(sku: str, device_model: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def check_product_compatibility(sku: str, device_model: str, claims: Any = Depends(authenticate)):
     """Check if product is compatible with customer's device"""
     try:
-        auth_service.verify_token(credentials.credentials)
         compatibility = await sheets_service.check_compatibility(sku, device_model)
         return compatibility
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/products/compatibility/batch")
+async def check_product_compatibility_batch(request: CompatibilityBatchRequest, claims: Any = Depends(authenticate)):
+    """Check many SKU/device pairs and list all accessories compatible with given devices"""
+    try:
+        return await sheets_service.check_compatibility_batch(
+            checks=[check.dict() for check in request.checks],
+            device_models=request.device_models
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Order management endpoints
 @app.post("/orders")
-async def create_order(request: OrderRequest, background_tasks: BackgroundTasks, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def create_order(request: OrderRequest, background_tasks: BackgroundTasks, claims: Any = Depends(authenticate)):
     """Create new customer order"""
+    require_customer(claims, request.customer_id)
     try:
-        auth_service.verify_token(credentials.credentials)
-        
         order = await sheets_service.create_order(
             customer_id=request.customer_id,
             products=request.products,
             notes=request.notes
         )
         
+        # Keep the customer's cached AI context current
+        ai_service.record_order(order)
+        
         # Background task: Send confirmation email
         background_tasks.add_task(send_order_confirmation, order)
         
         return {"order": order, "message": "Order created successfully"}
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/orders/batch")
+async def create_orders(request: BatchOrderRequest, background_tasks: BackgroundTasks, claims: Any = Depends(authenticate)):
+    """Create many orders at once, priced from the catalog, sharing one write round trip"""
+    if not request.orders or len(request.orders) > MAX_BATCH_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_BATCH_ORDERS} orders")
+    for order in request.orders:
+        require_customer(claims, order.customer_id)
+    try:
+        result = await sheets_service.create_orders([order.dict() for order in request.orders])
+        for order in result["orders"]:
+            ai_service.record_order(order)
+            background_tasks.add_task(send_order_confirmation, order)
+        return {
+            **result,
+            "total_amount": round(sum(order.total_amount for order in result["orders"]), 2),
+            "message": f"Created {len(result['orders'])} of {len(request.orders)} orders"
+        }
+    except TimeoutError as e:
+        # Another worker held the order lock too long; nothing was written
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/orders/{order_id}/tracking")
-async def get_order_tracking(order_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_order_tracking(order_id: str, claims: Any = Depends(authenticate)):
     """Get order tracking information"""
     try:
-        auth_service.verify_token(credentials.credentials)
-        tracking = await sheets_service.get_order_tracking(order_id)
+        # Customers only see their own orders; others read as not found
+        owner = None if claims_is_staff(claims) else claims_customer_id(claims)
+        tracking = await sheets_service.get_order_tracking(order_id, customer_id=owner)
         return tracking
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # Analytics and reporting endpoints
 @app.get("/analytics/dashboard")
-async def get_dashboard_analytics(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get business dashboard analytics"""
+async def get_dashboard_analytics(claims: Any = Depends(authorize_staff)):
+    """Get business dashboard analytics across all customers (staff only)"""
     try:
-        auth_service.verify_token(credentials.credentials)
         analytics = await sheets_service.get_dashboard_analytics()
         return analytics
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/analytics/ai-cache")
+async def get_ai_cache_stats(claims: Any = Depends(authenticate)):
+    """Get AI response cache hit/miss counters"""
+    try:
+        return ai_service.response_cache.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/ai-gateway")
+async def get_ai_gateway_stats(claims: Any = Depends(authenticate)):
+    """Get OpenAI call, retry, hedge and circuit breaker counters"""
+    try:
+        return ai_service.llm.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Background tasks
 async def send_order_confirmation(order: Dict[str, Any]):
     """Send order confirmation email"""
@@ -230,23 +453,31 @@ async def send_order_confirmation(order: Dict[str, Any]):
 
 # WebSocket for real-time chat
 @app.websocket("/ws/chat/{customer_id}")
-async def websocket_chat(websocket, customer_id: str):
-    """WebSocket endpoint for real-time chat"""
+async def websocket_chat(websocket: WebSocket, customer_id: str):
+    """WebSocket endpoint for real-time chat.
+
+    Authenticate with a ``?token=`` query parameter or an initial
+    ``{"type": "auth", "token": ...}`` frame, then send
+    ``{"type": "message", "request_id": ..., "message": ..., "session_id": ...}``
+    frames; responses stream back tagged with the same ``request_id``.
+    Clients must answer ``ping`` frames with ``pong`` to stay connected.
+    The token is re-checked on every heartbeat; once it is revoked or
+    expires the socket is closed with 1008 (policy violation).
+    """
     await websocket.accept()
     try:
-        while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
-            
-            # Process message with AI
-            response = await ai_service.process_message(
-                message=message_data["message"],
-                customer_id=customer_id
-            )
-            
-            await websocket.send_text(json.dumps(response))
-    except Exception as e:
-        await websocket.close()
+        token = websocket.query_params.get("token")
+        if not token:
+            frame = json.loads(await asyncio.wait_for(websocket.receive_text(), timeout=10))
+            token = frame.get("token") if frame.get("type") == "auth" else None
+        claims = await token_cache.verify(token)
+        if claims_customer_id(claims) != customer_id:
+            raise PermissionError("Token does not grant access to this customer")
+    except Exception:
+        await websocket.close(code=POLICY_VIOLATION)
+        return
+    
+    await chat_connections.serve(websocket, customer_id, token)
 
 if __name__ == "__main__":
     import uvicorn
@@ -4,17 +4,42 @@ Handles all AI-powered customer interactions
 """
 
 import os
-import json
 import asyncio
-from typing import List, Dict, Any, Optional
+import logging
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from elevenlabs import generate, set_api_key, Voice, VoiceSettings
 
 from models.customer import Customer, Order
+from services.response_cache import ResponseCache
+from services.customer_context import CustomerContextStore
+from services.audio_cache import AudioCache, audio_key
+from services.offload import get_executor
+from services.context_loader import SingleFlight
+from services.session_store import SessionStore
+from services.prompt_builder import PromptBuilder, PromptBuild
+from services.intent_router import IntentRouter
+from services.llm_gateway import LLMGateway, ModelRoute, ModelRouter
+from services.metrics import CACHE_EVENTS, EXTERNAL_ERRORS, EXTERNAL_SECONDS, PROMPT_TOKENS, timer
+
+logger = logging.getLogger("portal.ai_service")
+
+AI_ERROR_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again."
+
+# Intents that place or change orders; their answers must never be served from cache
+UNCACHEABLE_INTENTS = {"create_order", "modify_order"}
+
+# Map voice IDs to ElevenLabs voices
+VOICE_MAP = {
+    "professional_female": "21m00Tcm4TlvDq8ikWAM",  # Rachel
+    "friendly_male": "29vD33N1CtxCmqQRPOHJ",      # Drew
+    "warm_female": "pNInz6obpgDQGcFmaJgB"         # Adam (actually female-sounding)
+}
 
 class AIService:
-    def __init__(self):
+    def __init__(self, sheets_service=None):
         # Initialize OpenAI
         openai.api_key = os.getenv('OPENAI_API_KEY')
         
@@ -23,11 +48,31 @@ class AIService:
         if elevenlabs_key:
             set_api_key(elevenlabs_key)
         
-        # AI Configuration
-        self.model = "gpt-4"
-        self.max_tokens = 1000
+        # AI Configuration: model per request, calls limited and retried by the gateway
+        self.model_router = ModelRouter.from_env()
+        self.llm = LLMGateway.from_env()
         self.temperature = 0.7
         
+        # Cache of answers to repeated questions
+        self.response_cache = ResponseCache.from_env()
+        
+        # Incrementally maintained per-customer context and prompts
+        self.context_store = CustomerContextStore.from_env()
+        
+        # Token-budgeted system prompts
+        self.prompt_builder = PromptBuilder.from_env()
+        
+        # Per-session conversation history
+        self.session_store = SessionStore.from_env()
+        
+        # Local intent classification and direct answers for lookups
+        self.intent_router = IntentRouter(sheets_service)
+        
+        # Drop context other workers have changed (order created elsewhere)
+        shared = getattr(sheets_service, "shared", None)
+        if shared is not None:
+            shared.subscribe(self._remote_invalidation)
+        
         # Voice settings
         self.voice_settings = VoiceSettings(
             stability=0.75,
@@ -35,31 +80,70 @@ class AIService:
             style=0.5,
             use_speaker_boost=True
         )
+        
+        # Blocking ElevenLabs calls run on their own threads, apart from the CPU offload
+        # pool, so slow synthesis can't starve parsing; audio is content-addressed on disk
+        self.voice_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('VOICE_WORKERS', '4')),
+            thread_name_prefix="voice"
+        )
+        self.audio_cache = AudioCache(max_bytes=int(os.getenv('AUDIO_CACHE_MAX_MB', '500')) * 1024 * 1024)
+        self.voice_flights = SingleFlight()
 
     async def process_message(self, message: str, customer: Customer, recent_orders: List[Order], session_id: Optional[str] = None) -> Dict[str, Any]:
         """Process customer message with AI and return response"""
         try:
-            # Build context for AI
-            context = self._build_customer_context(customer, recent_orders)
+            # Build context and system prompt (memoized until data changes)
+            customer_context = self.context_store.get(customer, recent_orders)
+            prompt = customer_context.system_prompt(self._create_system_prompt)
+            system_prompt = prompt.text
+            PROMPT_TOKENS.observe(prompt.tokens)
+            session = await self.session_store.get(customer.id, session_id)
+            history = session.prompt_messages() if session else []
             
-            # Create system prompt
-            system_prompt = self._create_system_prompt(context)
+            # Classified once; routing, caching and the action all reuse it
+            intent = self.intent_router.classify(message)
             
-            # Process with OpenAI
-            response = await self._get_ai_response(system_prompt, message)
+            # Tracking and compatibility lookups are answered straight from data
+            direct = await self.intent_router.answer(message, customer, recent_orders, intent)
+            if direct is not None:
+                await self.session_store.record_turn(customer.id, session_id, session, message, direct["text"])
+                return {
+                    "text": direct["text"],
+                    "action": direct["action"],
+                    "session_id": session_id,
+                    "timestamp": datetime.now().isoformat(),
+                    "confidence": 1.0,
+                    "usage": prompt.report()
+                }
+            
+            # Serve repeated questions from cache, otherwise ask OpenAI.
+            # Follow-ups depend on earlier turns, so only first turns are cached.
+            cacheable = not history and self._is_cacheable(intent)
+            digest = customer_context.digest
+            response = await self.response_cache.get(message, digest) if cacheable else None
+            route = self.model_router.route(intent, message, history)
+            if response is None:
+                response = await self._get_ai_response(system_prompt, message, history, customer.id, route)
+                if cacheable and response != AI_ERROR_RESPONSE:
+                    await self.response_cache.set(message, digest, response)
+            
+            if response != AI_ERROR_RESPONSE:
+                await self.session_store.record_turn(customer.id, session_id, session, message, response)
             
             # Determine if action is needed
-            action = self._extract_action(response, message)
+            action = self._extract_action(response, message, intent)
             
             return {
                 "text": response,
                 "action": action,
                 "session_id": session_id,
                 "timestamp": datetime.now().isoformat(),
-                "confidence": 0.95  # Could implement actual confidence scoring
+                "confidence": 0.95,  # Could implement actual confidence scoring
+                "usage": {**prompt.report(), "model": route.model}
             }
         except Exception as e:
-            print(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
             return {
                 "text": "I apologize, but I'm experiencing technical difficulties. Please try again or contact our support team.",
                 "action": None,
@@ -68,195 +152,228 @@ class AIService:
                 "confidence": 0.0
             }
 
-    async def generate_voice(self, text: str, voice_id: str = "professional_female") -> str:
-        """Generate voice audio from text"""
+    async def stream_message(self, message: str, customer: Customer, recent_orders: List[Order], session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Process customer message with AI, yielding tokens as they arrive.
+
+        Yields ``{"type": "token", "text": ...}`` events followed by one
+        ``{"type": "done", ...}`` event carrying the same fields as
+        ``process_message`` computed on the completed text.
+        """
+        chunks = []
+        usage = None
         try:
-            # Map voice IDs to ElevenLabs voices
-            voice_map = {
-                "professional_female": "21m00Tcm4TlvDq8ikWAM",  # Rachel
-                "friendly_male": "29vD33N1CtxCmqQRPOHJ",      # Drew
-                "warm_female": "pNInz6obpgDQGcFmaJgB"         # Adam (actually female-sounding)
-            }
+            customer_context = self.context_store.get(customer, recent_orders)
+            prompt = customer_context.system_prompt(self._create_system_prompt)
+            system_prompt = prompt.text
+            usage = prompt.report()
+            PROMPT_TOKENS.observe(prompt.tokens)
+            session = await self.session_store.get(customer.id, session_id)
+            history = session.prompt_messages() if session else []
             
-            selected_voice = voice_map.get(voice_id, voice_map["professional_female"])
+            intent = self.intent_router.classify(message)
+            direct = await self.intent_router.answer(message, customer, recent_orders, intent)
+            if direct is not None:
+                await self.session_store.record_turn(customer.id, session_id, session, message, direct["text"])
+                yield {"type": "token", "text": direct["text"]}
+                yield {
+                    "type": "done",
+                    "text": direct["text"],
+                    "action": direct["action"],
+                    "session_id": session_id,
+                    "timestamp": datetime.now().isoformat(),
+                    "confidence": 1.0,
+                    "usage": usage
+                }
+                return
             
-            audio = generate(
-                text=text,
-                voice=Voice(
-                    voice_id=selected_voice,
-                    settings=self.voice_settings
-                )
-            )
+            cacheable = not history and self._is_cacheable(intent)
+            digest = customer_context.digest
+            cached = await self.response_cache.get(message, digest) if cacheable else None
+            if cached is not None:
+                chunks.append(cached)
+                yield {"type": "token", "text": cached}
+            else:
+                route = self.model_router.route(intent, message, history)
+                usage = {**usage, "model": route.model}
+                async for token in self._stream_ai_response(system_prompt, message, history, customer.id, route):
+                    chunks.append(token)
+                    yield {"type": "token", "text": token}
             
-            # Save audio file and return URL
-            filename = f"audio_{datetime.now().timestamp()}.mp3"
-            audio_path = f"static/audio/{filename}"
-            
-            # Ensure directory exists
-            os.makedirs("static/audio", exist_ok=True)
-            
-            with open(audio_path, "wb") as f:
-                f.write(audio)
-            
-            return f"/audio/{filename}"
+            response = "".join(chunks).strip()
+            if cacheable and cached is None:
+                await self.response_cache.set(message, digest, response)
+            await self.session_store.record_turn(customer.id, session_id, session, message, response)
+            action = self._extract_action(response, message, intent)
+            confidence = 0.95
         except Exception as e:
-            print(f"Error generating voice: {e}")
-            return ""
-
-    def _build_customer_context(self, customer: Customer, recent_orders: List[Order]) -> Dict[str, Any]:
-        """Build comprehensive customer context for AI"""
-        context = {
-            "customer_info": {
-                "name": customer.company_name,
-                "email": customer.email,
-                "customer_since": customer.registration_date,
-                "total_spent": customer.total_spent,
-                "last_order": customer.last_order_date,
-                "status": customer.status
-            },
-            "recent_orders": [],
-            "purchase_patterns": self._analyze_purchase_patterns(recent_orders),
-            "preferences": self._extract_preferences(recent_orders)
+            logger.error("Error streaming message: %s", e)
+            response = "".join(chunks).strip() or "I apologize, but I'm experiencing technical difficulties. Please try again or contact our support team."
+            action = None
+            confidence = 0.0
+        
+        yield {
+            "type": "done",
+            "text": response,
+            "action": action,
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat(),
+            "confidence": confidence,
+            "usage": usage
         }
+
+    async def generate_voice(self, text: str, voice_id: str = "professional_female") -> str:
+        """Generate voice audio from text, reusing cached audio for repeated text.
+
+        Raises when synthesis fails, so callers can report it.
+        """
+        key, selected_voice = self._voice_key(text, voice_id)
+        loop = asyncio.get_running_loop()
         
-        # Add recent order details
-        for order in recent_orders[:5]:  # Last 5 orders
-            context["recent_orders"].append({
-                "id": order.id,
-                "date": order.date,
-                "products": order.products,
-                "total": order.total_amount,
-                "status": order.status
-            })
+        path = await loop.run_in_executor(self.voice_executor, self.audio_cache.get, key)
+        CACHE_EVENTS.inc(cache="audio", result="hit" if path else "miss")
+        if path is None:
+            # Concurrent requests for the same audio share one synthesis
+            try:
+                await self.voice_flights.do(
+                    key,
+                    lambda: loop.run_in_executor(self.voice_executor, self._synthesize, text, selected_voice, key)
+                )
+            except Exception as e:
+                logger.error("Error generating voice: %s", e)
+                raise
         
-        return context
+        return f"/audio/{self.audio_cache.filename(key)}"
 
-    def _create_system_prompt(self, context: Dict[str, Any]) -> str:
-        """Create comprehensive system prompt for AI"""
-        return f"""You are an expert customer service representative for an electronics accessories company. 
+    async def stream_voice(self, text: str, voice_id: str = "professional_female") -> AsyncIterator[bytes]:
+        """Yield MP3 chunks as they are synthesized (or read from cache); synthesis errors are raised"""
+        key, selected_voice = self._voice_key(text, voice_id)
+        loop = asyncio.get_running_loop()
+        
+        path = await loop.run_in_executor(self.voice_executor, self.audio_cache.get, key)
+        CACHE_EVENTS.inc(cache="audio", result="hit" if path else "miss")
+        if path is not None:
+            chunks = self.audio_cache.read_chunks(path)
+            while True:
+                chunk = await loop.run_in_executor(self.voice_executor, next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def produce():
+            # Runs on a worker thread: stream from ElevenLabs into the cache and the queue
+            def tee():
+                for chunk in generate(
+                    text=text,
+                    voice=Voice(voice_id=selected_voice, settings=self.voice_settings),
+                    stream=True
+                ):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                    yield chunk
+            try:
+                with timer(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service="elevenlabs", operation="stream"):
+                    self.audio_cache.put_chunks(key, tee())
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+        
+        loop.run_in_executor(self.voice_executor, produce)
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                # Raised, never swallowed: ending cleanly would pass truncated audio off as complete
+                logger.error("Error streaming voice: %s", item)
+                raise item
+            yield item
 
-CUSTOMER CONTEXT:
-- Company: {context['customer_info']['name']}
-- Customer since: {context['customer_info']['customer_since']}
-- Total spent: ${context['customer_info']['total_spent']:,.2f}
-- Last order: {context['customer_info']['last_order']}
-- Recent orders: {len(context['recent_orders'])} orders
+    def _voice_key(self, text: str, voice_id: str) -> Tuple[str, str]:
+        selected_voice = VOICE_MAP.get(voice_id, VOICE_MAP["professional_female"])
+        settings = {
+            "stability": self.voice_settings.stability,
+            "similarity_boost": self.voice_settings.similarity_boost,
+            "style": self.voice_settings.style,
+            "use_speaker_boost": self.voice_settings.use_speaker_boost
+        }
+        return audio_key(text, selected_voice, settings), selected_voice
 
-RECENT PURCHASE HISTORY:
-{json.dumps(context['recent_orders'], indent=2)}
+    def _synthesize(self, text: str, selected_voice: str, key: str) -> str:
+        """Blocking ElevenLabs call; runs on the voice worker pool"""
+        with timer(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service="elevenlabs", operation="generate"):
+            audio = generate(
+                text=text,
+                voice=Voice(
+                    voice_id=selected_voice,
+                    settings=self.voice_settings
+                )
+            )
+        return self.audio_cache.put(key, audio)
 
-CUSTOMER PREFERENCES:
-{json.dumps(context['preferences'], indent=2)}
+    async def train_intent_model(self) -> int:
+        """Fit the local intent model on logged customer queries"""
+        try:
+            if self.intent_router.sheets_service is None:
+                return 0
+            queries = await self.intent_router.sheets_service.get_interaction_queries()
+            return await self.intent_router.train_offloaded(queries, get_executor())
+        except Exception as e:
+            logger.error("Error training intent model: %s", e)
+            return 0
 
-YOUR ROLE:
-1. Provide expert advice on electronics accessories (phone cases, screen protectors, chargers, tablets, etc.)
-2. Help with order history, tracking, and reordering
-3. Answer product compatibility questions
-4. Process new orders when requested
-5. Provide personalized recommendations based on purchase history
+    def _remote_invalidation(self, namespace: str, name: str):
+        if namespace == "customer":
+            self.context_store.invalidate(name)
 
-GUIDELINES:
-- Be friendly, professional, and knowledgeable
-- Reference their purchase history when relevant
-- Offer specific product recommendations
-- If they want to place an order, gather: product SKU, quantity, any special requirements
-- For tracking questions, provide order status and estimated delivery
-- Always prioritize customer satisfaction
+    def record_order(self, order: Order):
+        """Update the customer's cached context with a newly created order"""
+        self.context_store.append_order(order)
 
-IMPORTANT: If the customer wants to place an order, respond with action_type: "create_order" and include the order details.
-If they want tracking info, respond with action_type: "track_order" and the order ID.
-For general questions, use action_type: "information".
+    def _create_system_prompt(self, context: Dict[str, Any]) -> PromptBuild:
+        """Create the system prompt for AI within the configured token budget"""
+        return self.prompt_builder.build(context)
 
-Respond naturally and conversationally. You have access to their complete history and can reference specific past orders."""
+    def _build_messages(self, system_prompt: str, user_message: str, history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """System prompt first (stable across turns), then history, then the new message"""
+        return [
+            {"role": "system", "content": system_prompt},
+            *(history or []),
+            {"role": "user", "content": user_message}
+        ]
 
-    async def _get_ai_response(self, system_prompt: str, user_message: str) -> str:
+    async def _get_ai_response(self, system_prompt: str, user_message: str, history: Optional[List[Dict[str, str]]] = None, customer_id: str = "", route: Optional[ModelRoute] = None) -> str:
         """Get response from OpenAI"""
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=self.max_tokens,
+            return await self.llm.complete(
+                customer_id,
+                route or self.model_router.large,
+                self._build_messages(system_prompt, user_message, history),
                 temperature=self.temperature
             )
-            
-            return response.choices[0].message.content.strip()
         except Exception as e:
-            print(f"Error getting AI response: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again."
+            logger.error("Error getting AI response: %s", e)
+            return AI_ERROR_RESPONSE
 
-    def _extract_action(self, ai_response: str, user_message: str) -> Optional[Dict[str, Any]]:
-        """Extract actionable items from AI response"""
-        user_lower = user_message.lower()
-        response_lower = ai_response.lower()
-        
-        # Order-related actions
-        if any(phrase in user_lower for phrase in ["place order", "buy", "purchase", "order", "reorder"]):
-            return {"type": "create_order", "priority": "high"}
-        
-        # Tracking actions
-        if any(phrase in user_lower for phrase in ["track", "tracking", "where is", "status", "delivery"]):
-            return {"type": "track_order", "priority": "medium"}
-        
-        # Product inquiry
-        if any(phrase in user_lower for phrase in ["compatible", "fits", "works with", "recommend"]):
-            return {"type": "product_inquiry", "priority": "medium"}
-        
-        # General information
-        return {"type": "information", "priority": "low"}
+    async def _stream_ai_response(self, system_prompt: str, user_message: str, history: Optional[List[Dict[str, str]]] = None, customer_id: str = "", route: Optional[ModelRoute] = None) -> AsyncIterator[str]:
+        """Stream response tokens from OpenAI"""
+        async for token in self.llm.stream(
+            customer_id,
+            route or self.model_router.large,
+            self._build_messages(system_prompt, user_message, history),
+            temperature=self.temperature
+        ):
+            yield token
 
-    def _analyze_purchase_patterns(self, orders: List[Order]) -> Dict[str, Any]:
-        """Analyze customer purchase patterns"""
-        if not orders:
-            return {}
-        
-        # Calculate average order frequency
-        if len(orders) > 1:
-            dates = [datetime.fromisoformat(order.date.replace('Z', '+00:00')) for order in orders]
-            dates.sort()
-            intervals = [(dates[i] - dates[i-1]).days for i in range(1, len(dates))]
-            avg_interval = sum(intervals) / len(intervals) if intervals else 0
-        else:
-            avg_interval = 0
-        
-        # Calculate average order value
-        avg_order_value = sum(order.total_amount for order in orders) / len(orders)
-        
-        # Find most frequent order size
-        order_sizes = [len(order.products) for order in orders]
-        most_common_size = max(set(order_sizes), key=order_sizes.count) if order_sizes else 0
-        
-        return {
-            "avg_order_interval_days": avg_interval,
-            "avg_order_value": avg_order_value,
-            "most_common_order_size": most_common_size,
-            "total_orders": len(orders),
-            "ordering_frequency": "regular" if avg_interval < 60 else "occasional"
-        }
+    def _is_cacheable(self, intent: Dict[str, Any]) -> bool:
+        """Order-creating messages always go to the model"""
+        if intent["type"] in UNCACHEABLE_INTENTS:
+            self.response_cache.skip()
+            return False
+        return True
 
-    def _extract_preferences(self, orders: List[Order]) -> Dict[str, Any]:
-        """Extract customer preferences from order history"""
-        if not orders:
-            return {}
-        
-        # Count product categories/types
-        product_counts = {}
-        for order in orders:
-            for product in order.products:
-                product_counts[product] = product_counts.get(product, 0) + 1
-        
-        # Get top products
-        top_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        # Analyze spending patterns
-        high_value_orders = [o for o in orders if o.total_amount > 100]
-        prefers_bulk = len([o for o in orders if len(o.products) > 3]) > len(orders) / 2
-        
-        return {
-            "top_products": top_products,
-            "prefers_high_value": len(high_value_orders) > len(orders) / 3,
-            "prefers_bulk_orders": prefers_bulk,
-            "brand_loyalty": len(set(product_counts.keys())) < 10  # Few unique products = loyal
-        }
\ No newline at end of file
+    def _extract_action(self, ai_response: str, user_message: str, intent: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Extract actionable items from the customer's message"""
+        intent = intent or self.intent_router.classify(user_message)
+        return {"type": intent["type"], "priority": intent["priority"]}
@@ -0,0 +1,107 @@
+"""
+Audio Cache
+Content-addressed, size-bounded disk cache for synthesized voice audio
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+
+def audio_key(text: str, voice_id: str, settings: Dict[str, Any]) -> str:
+    """Content address for one synthesis request"""
+    payload = json.dumps({"text": text, "voice": voice_id, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class AudioCache:
+    """MP3 files named by content key, evicted least-recently-used past ``max_bytes``.
+
+    Sizes and recency are tracked in memory as files are written and read,
+    so eviction never rescans the directory. Methods do blocking file I/O
+    and are meant to run on a worker thread.
+    """
+
+    def __init__(self, directory: str = "static/audio", max_bytes: int = 500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # file name -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        files = [entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith(".mp3")]
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            self._track(entry.name, entry.stat().st_size)
+
+    def filename(self, key: str) -> str:
+        return f"{key}.mp3"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, self.filename(key))
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of a cached file, refreshing its recency, or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            name = self.filename(key)
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                # Written by another worker sharing the directory
+                self._track(name, os.path.getsize(path))
+        return path
+
+    def put(self, key: str, audio: bytes) -> str:
+        return self.put_chunks(key, iter([audio]))
+
+    def put_chunks(self, key: str, chunks: Iterator[bytes]) -> str:
+        """Write chunks to a temp file and atomically publish it under ``key``"""
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        # Recreated if removed while running (e.g. a cleared static dir)
+        os.makedirs(self.directory, exist_ok=True)
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._track(self.filename(key), size)
+            self._evict()
+        return path
+
+    def read_chunks(self, path: str, chunk_size: int = 32 * 1024) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _track(self, name: str, size: int):
+        self._size += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+
+    def _evict(self):
+        # The newest file is last and is never evicted, even if over budget alone
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
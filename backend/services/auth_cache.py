@@ -0,0 +1,207 @@
+"""
+Auth Token Cache
+Verified-claims cache so hot endpoints skip repeated JWT decoding
+"""
+
+import os
+import time
+import heapq
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("portal.auth_cache")
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_expiry(claims: Any) -> Optional[float]:
+    """The token's ``exp`` as a Unix timestamp, when the claims carry one"""
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def claims_customer_id(claims: Any) -> Optional[str]:
+    """Customer id carried by verified claims (a payload dict or a bare id)"""
+    if isinstance(claims, dict):
+        value = claims.get("customer_id") or claims.get("sub")
+        return str(value) if value is not None else None
+    return str(claims) if claims else None
+
+
+STAFF_ROLES = {"admin", "staff"}
+
+
+def claims_is_staff(claims: Any) -> bool:
+    """True when the claims carry an admin/staff ``role`` or ``roles`` entry"""
+    if not isinstance(claims, dict):
+        return False
+    roles = claims.get("roles") or []
+    if isinstance(roles, str):
+        roles = roles.split()
+    return claims.get("role") in STAFF_ROLES or any(role in STAFF_ROLES for role in roles)
+
+
+class TokenCache:
+    """Bounded LRU of verified token claims, keyed by token digest.
+
+    Entries live for ``ttl_seconds`` but never past the token's own ``exp``.
+    Revoking a token, or every token issued to a customer before now,
+    takes effect immediately. With a ``SharedCache`` attached, revocations
+    are stored in Redis until the token would have expired anyway, so
+    restarted and newly started workers see them, and are broadcast so
+    running workers drop their cached claims at once.
+    """
+
+    def __init__(
+        self,
+        verify: Callable[[str], Any],
+        ttl_seconds: float = 300.0,
+        max_entries: int = 10000,
+        revocation_ttl: float = 7 * 86400.0,
+        shared=None
+    ):
+        self.verify_fn = verify
+        self.ttl_seconds = ttl_seconds
+        self.revocation_ttl = revocation_ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # digest -> wall-clock time the token expires; pruned via the heap
+        self._revoked: Dict[str, float] = {}
+        self._revoked_expiry: List[Tuple[float, str]] = []
+        # customer id -> wall-clock time before which their tokens are void
+        self._revoked_customers: Dict[str, float] = {}
+        self.stats = {"hits": 0, "misses": 0, "revoked": 0}
+        if shared is not None:
+            shared.subscribe(self._remote_revocation)
+
+    @classmethod
+    def from_env(cls, verify: Callable[[str], Any], shared=None) -> "TokenCache":
+        return cls(
+            verify,
+            ttl_seconds=float(os.getenv('AUTH_CACHE_TTL_SECONDS', '300')),
+            max_entries=int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '10000')),
+            # Lifetime assumed for revoked tokens that carry no exp
+            revocation_ttl=float(os.getenv('AUTH_REVOCATION_TTL_SECONDS', str(7 * 86400))),
+            shared=shared
+        )
+
+    async def verify(self, token: str) -> Any:
+        """Verified claims for ``token``; raises like the underlying verifier"""
+        if not token:
+            raise ValueError("Missing token")
+        digest = token_digest(token)
+        if self._is_revoked(digest):
+            self.stats["revoked"] += 1
+            raise ValueError("Token has been revoked")
+
+        now = time.monotonic()
+        entry = self._entries.get(digest)
+        if entry is not None:
+            expires_at, claims = entry
+            if expires_at > now and not self._customer_revoked(claims):
+                self._entries.move_to_end(digest)
+                self.stats["hits"] += 1
+                return claims
+            del self._entries[digest]
+
+        self.stats["misses"] += 1
+        claims = self.verify_fn(token)
+        await self._load_revocations(digest, claims)
+        if self._is_revoked(digest) or self._customer_revoked(claims):
+            self.stats["revoked"] += 1
+            raise ValueError("Token has been revoked")
+
+        ttl = self.ttl_seconds
+        exp = token_expiry(claims)
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            self._entries[digest] = (now + ttl, claims)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def _is_revoked(self, digest: str) -> bool:
+        until = self._revoked.get(digest)
+        return until is not None and until > time.time()
+
+    def _customer_revoked(self, claims: Any) -> bool:
+        revoked_at = self._revoked_customers.get(claims_customer_id(claims) or "")
+        issued_at = claims.get("iat") if isinstance(claims, dict) else None
+        return revoked_at is not None and isinstance(issued_at, (int, float)) and issued_at <= revoked_at
+
+    async def _load_revocations(self, digest: str, claims: Any):
+        """Pull revocations made before this worker saw them (e.g. it started later)"""
+        if self.shared is None:
+            return
+        try:
+            until = await self.shared.get("auth-token", digest)
+            if until is not None:
+                self._apply_token_revocation(digest, float(until))
+            customer_id = claims_customer_id(claims)
+            if customer_id:
+                revoked_at = await self.shared.get("auth-customer", customer_id)
+                if revoked_at is not None:
+                    self._revoked_customers[customer_id] = max(float(revoked_at), self._revoked_customers.get(customer_id, 0.0))
+        except Exception as e:
+            logger.warning("Error loading shared revocations: %s", e)
+
+    async def revoke(self, token: str, claims: Any):
+        """Revoke a verified token until its own expiry"""
+        digest = token_digest(token)
+        exp = token_expiry(claims)
+        until = exp if exp is not None else time.time() + self.revocation_ttl
+        self._apply_token_revocation(digest, until)
+        if self.shared is not None:
+            try:
+                await self.shared.set("auth-token", digest, until, until - time.time())
+            except Exception as e:
+                logger.error("Error storing token revocation: %s", e)
+            await self.shared.publish("auth-token", f"{digest}@{until}")
+
+    async def revoke_customer(self, customer_id: str):
+        """Void every token issued to ``customer_id`` up to now"""
+        revoked_at = time.time()
+        self._apply_customer_revocation(customer_id, revoked_at)
+        if self.shared is not None:
+            try:
+                await self.shared.set("auth-customer", customer_id, revoked_at, self.revocation_ttl)
+            except Exception as e:
+                logger.error("Error storing customer revocation: %s", e)
+            await self.shared.publish("auth-customer", f"{customer_id}@{revoked_at}")
+
+    def _apply_customer_revocation(self, customer_id: str, revoked_at: float):
+        self._revoked_customers[customer_id] = revoked_at
+        # Tokens without an issue time can't be dated; revoke the ones seen so far
+        for digest, (_, claims) in list(self._entries.items()):
+            if claims_customer_id(claims) == customer_id:
+                exp = token_expiry(claims)
+                self._apply_token_revocation(digest, exp if exp is not None else revoked_at + self.revocation_ttl)
+
+    def _apply_token_revocation(self, digest: str, until: float):
+        self._entries.pop(digest, None)
+        now = time.time()
+        # Drop revocations whose tokens have expired on their own
+        while self._revoked_expiry and self._revoked_expiry[0][0] <= now:
+            expired_at, expired = heapq.heappop(self._revoked_expiry)
+            if self._revoked.get(expired) == expired_at:
+                del self._revoked[expired]
+        if until > now and until > self._revoked.get(digest, 0.0):
+            self._revoked[digest] = until
+            heapq.heappush(self._revoked_expiry, (until, digest))
+
+    def _remote_revocation(self, namespace: str, name: str):
+        if namespace == "auth-token":
+            digest, _, until = name.partition("@")
+            self._apply_token_revocation(digest, float(until) if until else time.time() + self.revocation_ttl)
+        elif namespace == "auth-customer":
+            customer_id, _, revoked_at = name.rpartition("@")
+            self._apply_customer_revocation(customer_id, float(revoked_at))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "revocations": len(self._revoked)}
@@ -0,0 +1,271 @@
+"""
+Chat Connections
+Multiplexed WebSocket chat sessions with per-connection context and heartbeats
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models.customer import Customer, Order
+from services.context_loader import ContextLoader
+
+logger = logging.getLogger("portal.chat_connections")
+
+# WebSocket close codes
+GOING_AWAY = 1001
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+
+
+class ChatConnection:
+    """One customer's WebSocket.
+
+    Context is loaded on the first message and reused until the Customers or
+    Orders snapshot version changes. Messages carry a ``request_id`` and run
+    concurrently (up to ``max_inflight``); every outgoing frame echoes it.
+    Sends are serialized and bounded by ``send_timeout`` so a slow reader
+    throttles its own streams and is dropped if it stops reading.
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket, customer_id: str, token: Optional[str] = None):
+        self.manager = manager
+        self.websocket = websocket
+        self.customer_id = customer_id
+        # Re-verified on every heartbeat so revoked or expired tokens are dropped
+        self.token = token
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._next_id = 0
+        self._context: Optional[Tuple[Customer, List[Order]]] = None
+        self._context_versions: Optional[Tuple[int, int]] = None
+        self._context_lock = asyncio.Lock()
+
+    @property
+    def inflight(self) -> int:
+        return len(self._tasks)
+
+    async def send(self, frame: Dict[str, Any]):
+        if self.closed:
+            return
+        try:
+            async with self._send_lock:
+                await asyncio.wait_for(self.websocket.send_text(json.dumps(frame)), self.manager.send_timeout)
+        except Exception as e:
+            logger.warning("Error sending to chat connection %s: %s", self.customer_id, e)
+            await self.close()
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        for task in list(self._tasks.values()):
+            task.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def run(self):
+        """Receive loop; returns when the client disconnects or is dropped"""
+        try:
+            while not self.closed:
+                raw = await self.websocket.receive_text()
+                self.last_seen = time.monotonic()
+                await self._handle(raw)
+        except Exception as e:
+            # Disconnects surface here as WebSocketDisconnect
+            if not self.closed:
+                logger.info("Chat connection %s ended: %r", self.customer_id, e)
+        finally:
+            self.closed = True
+            for task in list(self._tasks.values()):
+                task.cancel()
+
+    async def _handle(self, raw: str):
+        try:
+            frame = json.loads(raw)
+        except ValueError:
+            await self.send({"type": "error", "error": "invalid JSON"})
+            return
+        if not isinstance(frame, dict):
+            await self.send({"type": "error", "error": "frame must be an object"})
+            return
+
+        kind = frame.get("type", "message")
+        request_id = str(frame.get("request_id") or "")
+        if kind == "ping":
+            await self.send({"type": "pong", "request_id": request_id or None})
+        elif kind == "pong":
+            pass
+        elif kind == "cancel":
+            task = self._tasks.get(request_id)
+            if task:
+                task.cancel()
+        elif kind == "message":
+            if not frame.get("message"):
+                await self.send({"type": "error", "request_id": request_id or None, "error": "message is required"})
+            elif request_id in self._tasks:
+                await self.send({"type": "error", "request_id": request_id, "error": "duplicate request_id"})
+            elif len(self._tasks) >= self.manager.max_inflight:
+                # Backpressure: refuse rather than queue unbounded work
+                await self.send({"type": "busy", "request_id": request_id or None, "error": "too many requests in flight"})
+            else:
+                if not request_id:
+                    self._next_id += 1
+                    request_id = f"auto-{self._next_id}"
+                task = asyncio.ensure_future(self._respond(request_id, frame["message"], frame.get("session_id")))
+                self._tasks[request_id] = task
+                task.add_done_callback(lambda _: self._tasks.pop(request_id, None))
+        else:
+            await self.send({"type": "error", "request_id": request_id or None, "error": f"unknown frame type: {kind}"})
+
+    async def _load_context(self) -> Tuple[Customer, List[Order]]:
+        """Customer context for this connection, reloaded only after the data changes"""
+        cache = self.manager.sheets_service.cache
+        versions = (
+            cache.version(self.manager.sheets_service.CUSTOMERS_SHEET),
+            cache.version(self.manager.sheets_service.ORDERS_SHEET)
+        )
+        async with self._context_lock:  # Concurrent requests share one load
+            if self._context is None or versions != self._context_versions:
+                loader = ContextLoader(self.manager.sheets_service)
+                customer, recent_orders = await loader.load_chat_context(self.customer_id, 10)
+                if customer is None:
+                    raise ValueError("Customer not found")
+                self._context = (customer, recent_orders)
+                self._context_versions = versions
+            return self._context
+
+    async def _respond(self, request_id: str, message: str, session_id: Optional[str]):
+        try:
+            customer, recent_orders = await self._load_context()
+            async for event in self.manager.ai_service.stream_message(
+                message=message,
+                customer=customer,
+                recent_orders=recent_orders,
+                session_id=session_id
+            ):
+                if event["type"] == "done":
+                    await self.manager.sheets_service.log_interaction(
+                        customer_id=self.customer_id,
+                        query=message,
+                        response=event["text"],
+                        session_id=session_id
+                    )
+                await self.send({**event, "request_id": request_id})
+                if self.closed:
+                    return
+        except asyncio.CancelledError:
+            if not self.closed:
+                await self.send({"type": "cancelled", "request_id": request_id})
+        except Exception as e:
+            logger.error("Error handling chat request %s: %s", request_id, e)
+            await self.send({"type": "error", "request_id": request_id, "error": str(e)})
+
+
+class ConnectionManager:
+    """Registry of open chat connections with one shared heartbeat loop.
+
+    Idle connections cost one parked receive and a small object; there is no
+    per-connection timer task. The heartbeat pings every connection each
+    ``heartbeat_interval`` and drops those silent for ``idle_timeout``.
+    With ``authorize`` set, it also re-checks each connection's token and
+    closes the connection with POLICY_VIOLATION once the check raises.
+    """
+
+    def __init__(
+        self,
+        ai_service,
+        sheets_service,
+        max_connections: int = 5000,
+        max_inflight: int = 4,
+        heartbeat_interval: float = 25.0,
+        idle_timeout: float = 75.0,
+        send_timeout: float = 10.0,
+        authorize: Optional[Callable[[str], Awaitable[Any]]] = None
+    ):
+        self.ai_service = ai_service
+        self.sheets_service = sheets_service
+        self.authorize = authorize
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.connections: Dict[int, ChatConnection] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, ai_service, sheets_service, authorize: Optional[Callable[[str], Awaitable[Any]]] = None) -> "ConnectionManager":
+        return cls(
+            ai_service,
+            sheets_service,
+            authorize=authorize,
+            max_connections=int(os.getenv('WS_MAX_CONNECTIONS', '5000')),
+            max_inflight=int(os.getenv('WS_MAX_INFLIGHT', '4')),
+            heartbeat_interval=float(os.getenv('WS_HEARTBEAT_SECONDS', '25')),
+            idle_timeout=float(os.getenv('WS_IDLE_TIMEOUT_SECONDS', '75')),
+            send_timeout=float(os.getenv('WS_SEND_TIMEOUT_SECONDS', '10'))
+        )
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*[conn.close(GOING_AWAY) for conn in list(self.connections.values())])
+
+    async def serve(self, websocket, customer_id: str, token: Optional[str] = None):
+        """Run an accepted, authenticated WebSocket until it closes"""
+        if len(self.connections) >= self.max_connections:
+            await websocket.close(code=TRY_AGAIN_LATER)
+            return
+        connection = ChatConnection(self, websocket, customer_id, token)
+        self.connections[id(connection)] = connection
+        try:
+            await connection.send({"type": "ready", "heartbeat_interval": self.heartbeat_interval})
+            await connection.run()
+        finally:
+            self.connections.pop(id(connection), None)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            pings = []
+            for connection in list(self.connections.values()):
+                if now - connection.last_seen > self.idle_timeout:
+                    pings.append(connection.close(GOING_AWAY))
+                else:
+                    pings.append(self._ping(connection))
+            if pings:
+                await asyncio.gather(*pings, return_exceptions=True)
+
+    async def _ping(self, connection: ChatConnection):
+        if self.authorize is not None and connection.token is not None:
+            try:
+                await self.authorize(connection.token)
+            except Exception as e:
+                logger.warning("Closing chat connection %s: %s", connection.customer_id, e)
+                await connection.close(POLICY_VIOLATION)
+                return
+        await connection.send({"type": "ping"})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "inflight": sum(conn.inflight for conn in self.connections.values())
+        }
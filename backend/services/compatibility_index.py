@@ -0,0 +1,77 @@
+"""
+Compatibility Index
+Bidirectional SKU <-> device model lookup with normalized model names
+"""
+
+import re
+from typing import Any, Dict, List, Set
+
+from services.sheet_records import ProductRecord
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+DEVICE_MEMO_SIZE = 1024
+
+
+def normalize_device(model: str) -> str:
+    """Map "iPhone 15 Pro", "iphone-15-pro" and "iphone15pro" to one key"""
+    return _NON_ALNUM.sub("", model.lower())
+
+
+class CompatibilityIndex:
+    """SKU -> normalized devices and normalized device -> SKUs.
+
+    A device query matches a compatibility entry when its normalized form
+    is contained in the entry's normalized form, so "iPhone 15" still
+    matches an accessory listed for "iPhone 15 Pro" as before.
+    """
+
+    def __init__(self, products: List[ProductRecord]):
+        self.products: Dict[str, ProductRecord] = {}
+        self.devices_by_sku: Dict[str, Set[str]] = {}
+        self.skus_by_device: Dict[str, Set[str]] = {}
+        for product in products:
+            if product.sku in self.products:
+                continue
+            self.products[product.sku] = product
+            devices = {normalize_device(model) for model in product.compatibility}
+            devices.discard("")
+            self.devices_by_sku[product.sku] = devices
+            for device in devices:
+                self.skus_by_device.setdefault(device, set()).add(product.sku)
+        self._memo: Dict[str, List[str]] = {}
+
+    def is_compatible(self, sku: str, device_model: str) -> bool:
+        device = normalize_device(device_model)
+        if not device:
+            return False
+        devices = self.devices_by_sku.get(sku, ())
+        return device in devices or any(device in entry for entry in devices)
+
+    def check(self, sku: str, device_model: str) -> Dict[str, Any]:
+        product = self.products.get(sku)
+        if product is None:
+            return {"compatible": False, "error": "Product not found"}
+        return {
+            "compatible": self.is_compatible(sku, device_model),
+            "product_name": product.name,
+            "supported_devices": list(product.compatibility)
+        }
+
+    def skus_for_device(self, device_model: str) -> List[str]:
+        """All SKUs compatible with ``device_model``, sorted"""
+        device = normalize_device(device_model)
+        skus = self._memo.get(device)
+        if skus is None:
+            matched: Set[str] = set(self.skus_by_device.get(device, ()))
+            if device:
+                for entry, entry_skus in self.skus_by_device.items():
+                    if device in entry:
+                        matched |= entry_skus
+            skus = sorted(matched)
+            if len(self._memo) >= DEVICE_MEMO_SIZE:
+                self._memo.pop(next(iter(self._memo)))
+            self._memo[device] = skus
+        return skus
+
+    def products_for_device(self, device_model: str) -> List[ProductRecord]:
+        return [self.products[sku] for sku in self.skus_for_device(device_model)]
@@ -0,0 +1,95 @@
+"""
+Context Loader
+Concurrent, de-duplicated Sheets reads for building request context
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from models.customer import Customer, Order
+
+logger = logging.getLogger("portal.context_loader")
+
+
+class SingleFlight:
+    """Share one in-flight call between all callers asking for the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller's timeout doesn't cancel the shared call
+        return await asyncio.shield(future)
+
+
+class ContextLoader:
+    """Request-scoped loader that fans out independent reads concurrently.
+
+    Identical reads are de-duplicated per sheet version, both across
+    concurrent requests (via the shared ``SingleFlight``) and within the
+    request (via a local memo).
+    """
+
+    flights = SingleFlight()
+
+    def __init__(self, sheets_service, timeout: Optional[float] = None):
+        self.sheets_service = sheets_service
+        self.timeout = timeout if timeout is not None else float(os.getenv('CONTEXT_FETCH_TIMEOUT_SECONDS', '5'))
+        self._memo: Dict[Hashable, Any] = {}
+
+    async def fetch(self, sheet: str, name: str, fn: Callable[[], Awaitable[Any]], *args, default: Any = None) -> Any:
+        """Run ``fn`` once per (sheet version, name, args) with a timeout; ``default`` on timeout"""
+        key = (sheet, self.sheets_service.cache.version(sheet), name) + args
+        if key in self._memo:
+            return self._memo[key]
+        try:
+            result = await asyncio.wait_for(self.flights.do(key, fn), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Timed out loading %s from %s", name, sheet)
+            return default
+        self._memo[key] = result
+        return result
+
+    async def get_customer(self, customer_id: str) -> Optional[Customer]:
+        return await self.fetch(
+            self.sheets_service.CUSTOMERS_SHEET, "customer",
+            lambda: self.sheets_service.get_customer(customer_id),
+            customer_id
+        )
+
+    async def get_customer_orders(self, customer_id: str, limit: int = 10) -> List[Order]:
+        return await self.fetch(
+            self.sheets_service.ORDERS_SHEET, "customer_orders",
+            lambda: self.sheets_service.get_customer_orders(customer_id, limit),
+            customer_id, limit,
+            default=[]
+        )
+
+    async def load_chat_context(self, customer_id: str, order_limit: int = 10) -> Tuple[Optional[Customer], List[Order]]:
+        """Fetch the customer and their recent orders concurrently"""
+        # Refresh both sheets with one batched read when either is stale.
+        # With the mirror on, both reads below are SQL lookups and need no snapshots.
+        if not self.sheets_service.mirror:
+            try:
+                await asyncio.wait_for(self.sheets_service.cache.get_many([
+                    self.sheets_service.CUSTOMERS_SHEET,
+                    self.sheets_service.ORDERS_SHEET
+                ]), timeout=self.timeout)
+            except Exception as e:
+                # Individual reads below still apply their own timeouts
+                logger.warning("Error prefetching chat context: %s", e)
+        customer, recent_orders = await asyncio.gather(
+            self.get_customer(customer_id),
+            self.get_customer_orders(customer_id, order_limit)
+        )
+        return customer, recent_orders
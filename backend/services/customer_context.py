@@ -0,0 +1,182 @@
+"""
+Customer Context Store
+Incrementally maintained per-customer AI context and memoized prompts
+"""
+
+import os
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from models.customer import Customer, Order
+from services.response_cache import context_digest
+
+RECENT_ORDER_WINDOW = 10
+PROMPT_ORDER_COUNT = 5
+
+
+def _parse_date(date_str: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+
+
+class CustomerContext:
+    """Recent orders and the purchase aggregates derived from them for one customer.
+
+    Aggregates cover only the ``RECENT_ORDER_WINDOW`` newest orders (as the
+    context labels say), so the context depends on the customer's data and
+    not on how long this process has been appending to it. They are
+    computed when the context is first rendered and memoized until the
+    window changes.
+    """
+
+    def __init__(self, customer: Customer):
+        self.customer = customer
+        self.recent: Deque[Order] = deque(maxlen=RECENT_ORDER_WINDOW)  # newest first
+
+        self._context: Optional[Dict[str, Any]] = None
+        self._prompt: Optional[Any] = None
+        self._digest: Optional[str] = None
+
+    def add_order(self, order: Order):
+        """Add one order newer than any seen so far; the oldest leaves the window"""
+        self.recent.appendleft(order)
+        self._invalidate()
+
+    def set_customer(self, customer: Customer):
+        if customer != self.customer:
+            self.customer = customer
+            self._invalidate()
+
+    def matches(self, recent_orders: List[Order]) -> bool:
+        """True if the known recent orders agree with what the caller loaded"""
+        if not recent_orders:
+            # Nothing loaded to confirm against; rebuilding is cheap
+            return False
+        known = [(order.id, order.status) for order in self.recent]
+        loaded = [(order.id, order.status) for order in recent_orders[:RECENT_ORDER_WINDOW]]
+        return known[:len(loaded)] == loaded
+
+    @property
+    def context(self) -> Dict[str, Any]:
+        if self._context is None:
+            self._context = self._render_context()
+        return self._context
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = context_digest(self.context)
+        return self._digest
+
+    def system_prompt(self, render: Callable[[Dict[str, Any]], Any]) -> Any:
+        if self._prompt is None:
+            self._prompt = render(self.context)
+        return self._prompt
+
+    def _invalidate(self):
+        self._context = None
+        self._prompt = None
+        self._digest = None
+
+    def _render_context(self) -> Dict[str, Any]:
+        customer = self.customer
+        return {
+            "customer_info": {
+                "name": customer.company_name,
+                "email": customer.email,
+                "customer_since": customer.registration_date,
+                "total_spent": customer.total_spent,
+                "last_order": customer.last_order_date,
+                "status": customer.status
+            },
+            "recent_orders": [
+                {
+                    "id": order.id,
+                    "date": order.date,
+                    "products": order.products,
+                    "total": order.total_amount,
+                    "status": order.status
+                }
+                for order in list(self.recent)[:PROMPT_ORDER_COUNT]
+            ],
+            "purchase_patterns": self._purchase_patterns(),
+            "preferences": self._preferences()
+        }
+
+    def _purchase_patterns(self) -> Dict[str, Any]:
+        orders = list(self.recent)
+        if not orders:
+            return {}
+
+        # Mean gap between consecutive orders telescopes to (last - first) / (n - 1)
+        dates = [date for date in (_parse_date(order.date) for order in orders) if date is not None]
+        if len(dates) > 1:
+            avg_interval = (max(dates) - min(dates)).total_seconds() / 86400 / (len(dates) - 1)
+        else:
+            avg_interval = 0
+
+        sizes = Counter(len(order.products) for order in orders)
+        return {
+            "avg_order_interval_days": avg_interval,
+            "avg_order_value": sum(order.total_amount for order in orders) / len(orders),
+            "most_common_order_size": sizes.most_common(1)[0][0],
+            "recent_orders_analyzed": len(orders),
+            "ordering_frequency": "regular" if avg_interval < 60 else "occasional"
+        }
+
+    def _preferences(self) -> Dict[str, Any]:
+        orders = list(self.recent)
+        if not orders:
+            return {}
+
+        product_counts = Counter(product for order in orders for product in order.products)
+        return {
+            "top_products": product_counts.most_common(5),
+            "prefers_high_value": sum(1 for order in orders if order.total_amount > 100) > len(orders) / 3,
+            "prefers_bulk_orders": sum(1 for order in orders if len(order.products) > 3) > len(orders) / 2,
+            "brand_loyalty": len(product_counts) < 10  # Few unique products = loyal
+        }
+
+
+class CustomerContextStore:
+    """Bounded LRU of CustomerContext entries keyed by customer id"""
+
+    def __init__(self, max_customers: int = 5000):
+        self.max_customers = max_customers
+        self._entries: "OrderedDict[str, CustomerContext]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "CustomerContextStore":
+        return cls(max_customers=int(os.getenv('CONTEXT_STORE_MAX_CUSTOMERS', '5000')))
+
+    def get(self, customer: Customer, recent_orders: List[Order]) -> CustomerContext:
+        """Return the customer's context, seeding it if unknown or out of sync"""
+        entry = self._entries.get(customer.id)
+        if entry is None or not entry.matches(recent_orders):
+            entry = CustomerContext(customer)
+            # Seed oldest first so "newest" ordering is preserved
+            for order in reversed(recent_orders):
+                entry.add_order(order)
+            self._entries[customer.id] = entry
+        else:
+            entry.set_customer(customer)
+
+        self._entries.move_to_end(customer.id)
+        while len(self._entries) > self.max_customers:
+            self._entries.popitem(last=False)
+        return entry
+
+    def append_order(self, order: Order):
+        """Fold a newly created order into an already-known customer context"""
+        entry = self._entries.get(order.customer_id)
+        if entry is not None:
+            entry.add_order(order)
+
+    def invalidate(self, customer_id: Optional[str] = None):
+        if customer_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(customer_id, None)
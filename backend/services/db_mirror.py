@@ -0,0 +1,382 @@
+"""
+Database Mirror
+Local relational copy of the Google Sheets data with incremental sync
+"""
+
+import os
+import json
+import time
+import hashlib
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column, Float, Index, Integer, MetaData, String, Table, Text,
+    and_, create_engine, delete, func, or_, select
+)
+
+from models.customer import Customer, Order
+from services.metrics import EXTERNAL_ERRORS, EXTERNAL_SECONDS, timer
+from services.order_index import OrderFilter, decode_order_cursor, encode_order_cursor
+
+logger = logging.getLogger("portal.db_mirror")
+
+metadata = MetaData()
+
+customers_table = Table(
+    "customers", metadata,
+    Column("id", String(64), primary_key=True),
+    Column("company_name", String(255)),
+    Column("email", String(255)),
+    Column("phone", String(64)),
+    Column("registration_date", String(64)),
+    Column("total_spent", Float),
+    Column("last_order_date", String(64)),
+    Column("status", String(32)),
+    Column("row_hash", String(40), nullable=False),
+    Column("mirrored_at", Float, default=0.0),
+    Index("ix_customers_company_email", "company_name", "email")
+)
+
+orders_table = Table(
+    "orders", metadata,
+    Column("id", String(64), primary_key=True),
+    Column("customer_id", String(64)),
+    Column("date", String(64)),
+    Column("products", Text),
+    Column("quantities", Text),
+    Column("total_amount", Float),
+    Column("status", String(32)),
+    Column("tracking_number", String(128)),
+    Column("notes", Text),
+    Column("row_hash", String(40), nullable=False),
+    Column("mirrored_at", Float, default=0.0),
+    Index("ix_orders_customer_date", "customer_id", "date")
+)
+
+products_table = Table(
+    "products", metadata,
+    Column("sku", String(64), primary_key=True),
+    Column("name", String(255)),
+    Column("category", String(128), index=True),
+    Column("price", Float),
+    Column("stock_level", Integer),
+    Column("description", Text),
+    Column("compatibility", Text),
+    Column("image_url", Text),
+    Column("row_hash", String(40), nullable=False),
+    Column("mirrored_at", Float, default=0.0)
+)
+
+interactions_table = Table(
+    "interactions", metadata,
+    # Interactions have no id column in the sheet; the row hash is the key
+    Column("row_hash", String(40), primary_key=True),
+    Column("timestamp", String(64)),
+    Column("customer_id", String(64)),
+    Column("type", String(32)),
+    Column("query", Text),
+    Column("response", Text),
+    Column("session_id", String(128)),
+    Column("satisfaction", String(16)),
+    Column("mirrored_at", Float, default=0.0),
+    Index("ix_interactions_customer_timestamp", "customer_id", "timestamp")
+)
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value) if value not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(float(value)) if value not in (None, "") else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def row_hash(row: List[Any]) -> str:
+    return hashlib.sha1(json.dumps(row, default=str).encode()).hexdigest()
+
+
+class TableSpec:
+    """How one sheet maps onto one table: columns in sheet order plus converters"""
+
+    def __init__(self, table: Table, key: str, columns: List[str], converters: Dict[str, Callable[[Any], Any]], min_length: int):
+        self.table = table
+        self.key = key
+        self.columns = columns
+        self.converters = converters
+        self.min_length = min_length
+
+    def to_record(self, row: List[Any]) -> Dict[str, Any]:
+        record = {
+            name: self.converters.get(name, _text)(row[i] if i < len(row) else "")
+            for i, name in enumerate(self.columns)
+        }
+        record["row_hash"] = row_hash(row)
+        record["mirrored_at"] = time.time()
+        return record
+
+    def to_row(self, record: Any) -> List[Any]:
+        """Rebuild a sheet-shaped row from a table record"""
+        return [_text(getattr(record, name)) if name not in self.converters else getattr(record, name) for name in self.columns]
+
+
+SHEET_TABLES = {
+    "Customers": TableSpec(
+        customers_table, "id",
+        ["id", "company_name", "email", "phone", "registration_date", "total_spent", "last_order_date", "status"],
+        {"total_spent": _float}, min_length=3
+    ),
+    "Orders": TableSpec(
+        orders_table, "id",
+        ["id", "customer_id", "date", "products", "quantities", "total_amount", "status", "tracking_number", "notes"],
+        {"total_amount": _float}, min_length=2
+    ),
+    "Products": TableSpec(
+        products_table, "sku",
+        ["sku", "name", "category", "price", "stock_level", "description", "compatibility", "image_url"],
+        {"price": _float, "stock_level": _int}, min_length=6
+    ),
+    "Interactions": TableSpec(
+        interactions_table, "row_hash",
+        ["timestamp", "customer_id", "type", "query", "response", "session_id", "satisfaction"],
+        {}, min_length=2
+    )
+}
+
+
+class DatabaseMirror:
+    """SQLite/Postgres mirror of the portal sheets.
+
+    SQLAlchemy runs synchronously on a small thread pool so queries never
+    block the event loop. ``sync_sheet`` diffs the sheet against stored row
+    hashes and only rewrites rows that changed. Every row records when it
+    was mirrored, so a sync never undoes an upsert made after its fetch began.
+    """
+
+    def __init__(self, url: str, workers: int = 4):
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-mirror")
+        metadata.create_all(self.engine)
+
+    @classmethod
+    def from_env(cls) -> Optional["DatabaseMirror"]:
+        """Mirror at ``DATABASE_URL`` when ``SHEETS_MIRROR_ENABLED`` is set; off by default"""
+        if os.getenv('SHEETS_MIRROR_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        url = os.getenv('DATABASE_URL')
+        if not url:
+            raise ValueError("SHEETS_MIRROR_ENABLED requires DATABASE_URL")
+        return cls(url)
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        with timer(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service="database", operation=fn.__name__.lstrip("_")):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # Sync
+    async def sync_sheet(self, sheet: str, rows: List[List[Any]], fetched_at: Optional[float] = None) -> int:
+        """Apply a full sheet read (header included); returns rows changed.
+
+        Rows mirrored at or after ``fetched_at`` (the time the read began)
+        are newer than the read and are left alone.
+        """
+        return await self._run(self._sync_sheet, sheet, rows, fetched_at)
+
+    def _sync_sheet(self, sheet: str, rows: List[List[Any]], fetched_at: Optional[float] = None) -> int:
+        spec = SHEET_TABLES[sheet]
+        key_column = spec.table.c[spec.key]
+
+        incoming: Dict[str, Dict[str, Any]] = {}
+        for row in rows[1:]:  # Skip header
+            if len(row) < spec.min_length or not row[0]:
+                continue
+            record = spec.to_record(row)
+            incoming.setdefault(record[spec.key], record)
+
+        with self.engine.begin() as conn:
+            existing: Dict[str, str] = {}
+            for key, digest, mirrored_at in conn.execute(select(key_column, spec.table.c.row_hash, spec.table.c.mirrored_at)):
+                if fetched_at is not None and (mirrored_at or 0.0) >= fetched_at:
+                    # Upserted after this read began; the read is the stale side
+                    incoming.pop(key, None)
+                    continue
+                existing[key] = digest
+
+            changed = [r for k, r in incoming.items() if existing.get(k) != r["row_hash"]]
+            removed = [k for k in existing if k not in incoming]
+            stale = [r[spec.key] for r in changed if r[spec.key] in existing] + removed
+
+            for i in range(0, len(stale), 500):
+                conn.execute(delete(spec.table).where(key_column.in_(stale[i:i + 500])))
+            if changed:
+                conn.execute(spec.table.insert(), changed)
+
+        return len(changed) + len(removed)
+
+    async def upsert_rows(self, sheet: str, rows: List[List[Any]]):
+        """Mirror several rows just written to the sheet, in one transaction"""
+        if rows:
+            await self._run(self._upsert_rows, sheet, rows)
+
+    def _upsert_rows(self, sheet: str, rows: List[List[Any]]):
+        spec = SHEET_TABLES[sheet]
+        key_column = spec.table.c[spec.key]
+        records = [spec.to_record(row) for row in rows]
+        with self.engine.begin() as conn:
+            conn.execute(delete(spec.table).where(key_column.in_([r[spec.key] for r in records])))
+            conn.execute(spec.table.insert(), records)
+
+    # Reads
+    async def fetch_rows(self, sheet: str) -> List[List[Any]]:
+        """Sheet-shaped rows (with a header) for snapshot loading"""
+        return await self._run(self._fetch_rows, sheet)
+
+    def _fetch_rows(self, sheet: str) -> List[List[Any]]:
+        spec = SHEET_TABLES[sheet]
+        with self.engine.connect() as conn:
+            records = conn.execute(select(spec.table)).all()
+        return [list(spec.columns)] + [spec.to_row(record) for record in records]
+
+    async def get_customer(self, customer_id: str) -> Optional[Customer]:
+        return await self._run(self._get_customer, customers_table.c.id == customer_id)
+
+    async def get_customer_by_email(self, email: str, company_id: str) -> Optional[Customer]:
+        return await self._run(
+            self._get_customer,
+            (customers_table.c.company_name == company_id) & (customers_table.c.email == email)
+        )
+
+    def _get_customer(self, condition) -> Optional[Customer]:
+        with self.engine.connect() as conn:
+            record = conn.execute(select(customers_table).where(condition).limit(1)).first()
+        if record is None:
+            return None
+        return Customer(
+            id=record.id,
+            company_name=record.company_name,
+            email=record.email,
+            phone=record.phone or "",
+            registration_date=record.registration_date or "",
+            total_spent=record.total_spent or 0.0,
+            last_order_date=record.last_order_date or "",
+            status=record.status or "active"
+        )
+
+    async def get_customer_orders_page(
+        self,
+        customer_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        filters: Optional[OrderFilter] = None
+    ) -> Tuple[List[Order], Optional[str]]:
+        """Keyset-paginated, filtered orders, newest first"""
+        return await self._run(self._get_customer_orders_page, customer_id, limit, decode_order_cursor(cursor), filters or OrderFilter())
+
+    def _get_customer_orders_page(self, customer_id: str, limit: int, after: Optional[Tuple[str, str]], filters: OrderFilter) -> Tuple[List[Order], Optional[str]]:
+        c = orders_table.c
+        conditions = [c.customer_id == customer_id]
+        if after is not None:
+            conditions.append(or_(c.date < after[0], and_(c.date == after[0], c.id < after[1])))
+        if filters.status:
+            conditions.append(func.lower(c.status) == filters.status)
+        if filters.date_from:
+            conditions.append(c.date >= filters.date_from)
+        if filters.date_to:
+            conditions.append(func.substr(c.date, 1, len(filters.date_to)) <= filters.date_to)
+        if filters.sku:
+            # Narrow in SQL, confirm on the parsed list below
+            conditions.append(c.products.contains(filters.sku))
+
+        query = select(orders_table).where(*conditions).order_by(c.date.desc(), c.id.desc())
+        if not filters.sku:
+            query = query.limit(limit + 1)
+        orders: List[Order] = []
+        with self.engine.connect() as conn:
+            for record in conn.execute(query):
+                order = self._to_order(record)
+                if filters.sku and filters.sku not in order.products:
+                    continue
+                orders.append(order)
+                if len(orders) > limit:
+                    break
+
+        page = orders[:limit]
+        next_cursor = encode_order_cursor((page[-1].date, page[-1].id)) if len(orders) > limit else None
+        return page, next_cursor
+
+    async def get_order(self, order_id: str) -> Optional[Order]:
+        return await self._run(self._get_order, order_id)
+
+    def _get_order(self, order_id: str) -> Optional[Order]:
+        with self.engine.connect() as conn:
+            record = conn.execute(select(orders_table).where(orders_table.c.id == order_id)).first()
+        return self._to_order(record) if record is not None else None
+
+    def _to_order(self, record: Any) -> Order:
+        return Order(
+            id=record.id,
+            customer_id=record.customer_id,
+            date=record.date or "",
+            products=json.loads(record.products) if record.products else [],
+            quantities=json.loads(record.quantities) if record.quantities else [],
+            total_amount=record.total_amount or 0.0,
+            status=record.status or "pending",
+            tracking_number=record.tracking_number or "",
+            notes=record.notes or ""
+        )
+
+
+class MirrorSyncWorker:
+    """Periodically pulls each sheet and applies changed rows to the mirror"""
+
+    def __init__(self, mirror: DatabaseMirror, fetch: Callable[[str, str], Any], on_change: Callable[[str], Awaitable[None]], interval: float = 60.0):
+        self.mirror = mirror
+        self.fetch = fetch
+        self.on_change = on_change
+        self.interval = interval
+        self.ranges = {"Customers": "A:H", "Orders": "A:I", "Products": "A:H", "Interactions": "A:G"}
+        # Optional cross-worker lease; only the holder syncs each interval
+        self.lease: Optional[Callable[[], Awaitable[bool]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync_once(self):
+        for sheet, range in self.ranges.items():
+            try:
+                fetched_at = time.time()
+                rows = await self.fetch(sheet, range)
+                changed = await self.mirror.sync_sheet(sheet, rows or [], fetched_at)
+                if changed:
+                    await self.on_change(sheet)
+            except Exception as e:
+                logger.error("Error syncing %s to mirror: %s", sheet, e)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.lease is None or await self.lease():
+                await self.sync_once()
@@ -0,0 +1,228 @@
+"""
+Intent Router
+Local intent classification ahead of the LLM, with direct answers for lookups
+"""
+
+import re
+import math
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.customer import Customer, Order
+from services.compatibility_index import normalize_device
+
+INTENT_PRIORITY = {
+    "create_order": "high",
+    "modify_order": "high",
+    "track_order": "medium",
+    "product_inquiry": "medium",
+    "information": "low"
+}
+
+# Words that make "order" name an existing order rather than ask for a new one
+_EXISTING = r"(?<!\bmy\s)(?<!\bour\s)(?<!\byour\s)(?<!\bthe\s)(?<!\ban\s)(?<!\ba\s)(?<!\bthis\s)(?<!\bthat\s)(?<!\blast\s)(?<!\blatest\s)(?<!\brecent\s)(?<!\bprevious\s)"
+
+# (intent, weight, pattern): every matching rule adds its weight and the
+# highest total wins, so explicit buy/order verbs outweigh shipping words.
+# Ties go to the intent listed first.
+KEYWORD_RULES: List[Tuple[str, float, "re.Pattern"]] = [
+    # Cancel, change or return an existing order
+    ("modify_order", 4.0, re.compile(
+        r"\b(cancel(l?ed|l?ing|lation)?|(change|modify|amend)\s+(my\s+|our\s+|the\s+|this\s+|that\s+)?order)\b"
+    )),
+    ("modify_order", 2.0, re.compile(r"\b(return|refund|exchange)\b(?!\s+polic)")),
+    # Order as a verb; not a noun ("my order", "order history", "order ORD-...")
+    ("create_order", 3.0, re.compile(
+        r"\b(place\s+(an?\s+)?order|buy(ing)?|purchas(e|ing)|re-?order(ing)?|" + _EXISTING +
+        r"order(ing)?(?!\s+(history|status|number|no|id|details|confirmation|summary)\b)(?!\s*#|\s+ord-))\b"
+    )),
+    ("create_order", 2.0, re.compile(r"\b((ship|send)\s+(me|us)|add\s+to\s+(my\s+|our\s+)?order)\b")),
+    ("track_order", 3.0, re.compile(r"\b(track(ing)?|where(\s+is|\s+are|'s)|status|eta|order\s+history)\b")),
+    # References to orders already placed
+    ("track_order", 2.0, re.compile(
+        r"\b((my|our|your|the|this|that|last|latest|recent|previous)\s+orders?|orders?\s+placed|ordered|ord-[a-z0-9]{8})\b"
+    )),
+    ("track_order", 1.0, re.compile(r"\b(deliver(y|ed)?|shipped|shipping|arriv(e|al|ing|ed))\b")),
+    ("product_inquiry", 2.0, re.compile(
+        r"\b(compatib(le|ility)|fits?|works?\s+with|recommend\w*|suggest\w*)\b"
+    ))
+]
+
+ORDER_ID = re.compile(r"\bord-[a-z0-9]{8}\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> List[str]:
+    tokens = _TOKEN.findall(text.lower())
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class IntentModel:
+    """TF-IDF nearest-centroid classifier; tiny, pure Python, trains in milliseconds"""
+
+    def __init__(self):
+        self.idf: Dict[str, float] = {}
+        self.centroids: Dict[str, Dict[str, float]] = {}
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        counts = Counter(f for f in _features(text) if f in self.idf)
+        vector = {f: c * self.idf[f] for f, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        return {f: v / norm for f, v in vector.items()} if norm else {}
+
+    def train(self, texts: List[str], labels: List[str]):
+        documents = [set(_features(text)) for text in texts]
+        df = Counter(f for doc in documents for f in doc)
+        n = len(documents)
+        self.idf = {f: math.log((1 + n) / (1 + c)) + 1 for f, c in df.items()}
+
+        sums: Dict[str, Counter] = {}
+        for text, label in zip(texts, labels):
+            sums.setdefault(label, Counter()).update(self._vector(text))
+        self.centroids = {}
+        for label, total in sums.items():
+            norm = math.sqrt(sum(v * v for v in total.values()))
+            self.centroids[label] = {f: v / norm for f, v in total.items()} if norm else {}
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        vector = self._vector(text)
+        best, best_score = None, 0.0
+        for label, centroid in self.centroids.items():
+            score = sum(v * centroid.get(f, 0.0) for f, v in vector.items())
+            if score > best_score:
+                best, best_score = label, score
+        return best, best_score
+
+
+def fit_intent_model(texts: List[str], labels: List[str]) -> IntentModel:
+    """Module-level so it can run in a worker process"""
+    model = IntentModel()
+    model.train(texts, labels)
+    return model
+
+
+class IntentRouter:
+    """Classifies messages locally and answers deterministic ones from data.
+
+    Keyword rules decide first; the optional TF-IDF model (trained from
+    logged interactions labelled by those rules) covers paraphrases the
+    rules miss. Tracking and compatibility questions with enough detail are
+    answered from SheetsService without calling the LLM.
+    """
+
+    def __init__(self, sheets_service=None, model_threshold: float = 0.45):
+        self.sheets_service = sheets_service
+        self.model_threshold = model_threshold
+        self.model: Optional[IntentModel] = None
+
+    def classify(self, message: str) -> Dict[str, Any]:
+        intent = self._classify_rules(message)
+        if intent != "information":
+            return {"type": intent, "priority": INTENT_PRIORITY[intent], "source": "rules"}
+
+        if self.model is not None:
+            intent, score = self.model.predict(message)
+            if intent and intent != "information" and score >= self.model_threshold:
+                return {"type": intent, "priority": INTENT_PRIORITY[intent], "source": "model", "score": round(score, 3)}
+
+        return {"type": "information", "priority": INTENT_PRIORITY["information"], "source": "rules"}
+
+    def _training_set(self, queries: List[str]) -> Optional[Tuple[List[str], List[str]]]:
+        """Past queries labelled by the keyword rules, or None if too few to learn from"""
+        texts = [q for q in queries if q and q.strip()]
+        if len(texts) < 20:
+            return None
+        labels = [self._classify_rules(text) for text in texts]
+        if len(set(labels)) < 2:
+            return None
+        return texts, labels
+
+    def train(self, queries: List[str]) -> int:
+        """Fit the local model on past queries"""
+        training = self._training_set(queries)
+        if training is None:
+            return 0
+        self.model = fit_intent_model(*training)
+        return len(training[0])
+
+    async def train_offloaded(self, queries: List[str], offload) -> int:
+        """``train`` with the fit on the offload executor's process pool, if it has one"""
+        training = await offload.run(self._training_set, queries, size=len(queries))
+        if training is None:
+            return 0
+        self.model = await offload.run(fit_intent_model, *training, size=len(training[0]), process=True)
+        return len(training[0])
+
+    def _classify_rules(self, message: str) -> str:
+        text = " ".join(message.lower().split())
+        scores: Dict[str, float] = {}
+        for intent, weight, pattern in KEYWORD_RULES:
+            if pattern.search(text):
+                scores[intent] = scores.get(intent, 0.0) + weight
+        if not scores:
+            return "information"
+        # max keeps the first of equal scores, i.e. rule order breaks ties
+        return max(scores, key=scores.get)
+
+    async def answer(self, message: str, customer: Customer, recent_orders: List[Order], intent: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Direct answer for deterministic intents, or None to fall through to the LLM"""
+        if self.sheets_service is None:
+            return None
+        intent = intent or self.classify(message)
+        if intent["type"] == "track_order":
+            text = await self._answer_tracking(message, customer, recent_orders)
+        elif intent["type"] == "product_inquiry":
+            text = await self._answer_compatibility(message)
+        else:
+            text = None
+        if text is None:
+            return None
+        return {"text": text, "action": {"type": intent["type"], "priority": intent["priority"]}}
+
+    async def _answer_tracking(self, message: str, customer: Customer, recent_orders: List[Order]) -> Optional[str]:
+        match = ORDER_ID.search(message)
+        if match:
+            order = await self.sheets_service.get_order(match.group(0).upper())
+            # Never disclose another customer's order
+            if order is None or order.customer_id != customer.id:
+                return None
+        elif recent_orders and re.search(r"\b(my|latest|last|recent)\s+order\b", message.lower()):
+            order = recent_orders[0]
+        else:
+            return None
+
+        tracking = await self.sheets_service.get_order_tracking(order.id)
+        if "error" in tracking:
+            return None
+
+        text = f"Your order {order.id} is currently {tracking['status']}."
+        if tracking.get("tracking_number"):
+            text += f" The tracking number is {tracking['tracking_number']}."
+        delivery = tracking.get("estimated_delivery")
+        if delivery and tracking["status"] not in ("delivered", "cancelled"):
+            try:
+                text += f" Estimated delivery: {datetime.fromisoformat(delivery).strftime('%B %d, %Y')}."
+            except ValueError:
+                pass
+        return text
+
+    async def _answer_compatibility(self, message: str) -> Optional[str]:
+        index = await self.sheets_service.get_compatibility_index()
+
+        sku = next((token for token in re.findall(r"[A-Za-z0-9][A-Za-z0-9_-]*", message) if token in index.products), None)
+        if sku is None:
+            return None
+
+        # Longest known device model mentioned in the message
+        normalized = normalize_device(message)
+        device = max((d for d in index.skus_by_device if d and d in normalized), key=len, default=None)
+        if device is None:
+            return None
+
+        product = index.products[sku]
+        label = next((m.strip() for m in product.compatibility if normalize_device(m) == device), device)
+        if index.is_compatible(sku, device):
+            return f"Yes, {product.name} ({sku}) is compatible with the {label}."
+        supported = ", ".join(m.strip() for m in product.compatibility) or "no listed devices"
+        return f"No, {product.name} ({sku}) isn't listed as compatible with that device. It supports: {supported}."
@@ -0,0 +1,438 @@
+"""
+LLM Gateway
+Model routing, fair concurrency limiting, hedged retries and circuit breaking for OpenAI calls
+"""
+
+import os
+import time
+import random
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import openai
+
+from services.sheets_client_pool import is_retryable
+from services.metrics import EXTERNAL_ERRORS, EXTERNAL_SECONDS, LLM_TOKENS, timer
+
+# Intents that need the large model to get details right
+COMPLEX_INTENTS = {"create_order", "modify_order", "product_inquiry"}
+
+
+class OverloadedError(Exception):
+    """Raised when the request queue is full"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model's circuit is open"""
+
+
+class ModelRoute:
+    """Model and token limit for one request, with an optional cheaper fallback"""
+
+    def __init__(self, model: str, max_tokens: int, tier: str, fallback: Optional["ModelRoute"] = None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.tier = tier
+        self.fallback = fallback
+
+    def candidates(self) -> List["ModelRoute"]:
+        routes, route = [], self
+        while route is not None:
+            routes.append(route)
+            route = route.fallback
+        return routes
+
+
+class ModelRouter:
+    """Sends simple intents to a small, fast model and complex ones to the large model.
+
+    A request is complex when its intent needs careful handling, the message
+    is long, or the conversation already has several turns. When the large
+    model's circuit is open the small model serves as a fallback.
+    """
+
+    def __init__(
+        self,
+        large_model: str = "gpt-4",
+        small_model: str = "gpt-3.5-turbo",
+        large_max_tokens: int = 1000,
+        small_max_tokens: int = 400,
+        long_message_chars: int = 400,
+        long_history_messages: int = 6
+    ):
+        self.small = ModelRoute(small_model, small_max_tokens, "small")
+        self.large = ModelRoute(large_model, large_max_tokens, "large", fallback=self.small)
+        self.long_message_chars = long_message_chars
+        self.long_history_messages = long_history_messages
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        return cls(
+            large_model=os.getenv('OPENAI_MODEL_LARGE', 'gpt-4'),
+            small_model=os.getenv('OPENAI_MODEL_SMALL', 'gpt-3.5-turbo'),
+            large_max_tokens=int(os.getenv('OPENAI_MAX_TOKENS_LARGE', '1000')),
+            small_max_tokens=int(os.getenv('OPENAI_MAX_TOKENS_SMALL', '400'))
+        )
+
+    def route(self, intent: Dict[str, Any], message: str, history: Optional[List[Dict[str, str]]] = None) -> ModelRoute:
+        if (
+            intent.get("type") in COMPLEX_INTENTS
+            or len(message) > self.long_message_chars
+            or len(history or []) > self.long_history_messages
+        ):
+            return self.large
+        return self.small
+
+
+class FairLimiter:
+    """Caps concurrent calls; waiters are served round-robin across keys.
+
+    Each key (customer) has its own FIFO queue, so one customer sending a
+    burst waits behind their own requests rather than everyone else's.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 200):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiting = 0
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def acquire(self, key: Hashable):
+        if self._active < self.max_concurrent and not self._waiting:
+            self._active += 1
+            return
+        if self._waiting >= self.max_queue:
+            raise OverloadedError("Too many queued AI requests")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self._waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._discard(key, future)
+            raise
+
+    def release(self):
+        while self._queues:
+            # Round-robin: serve the oldest key, then move it to the back
+            key, queue = self._queues.popitem(last=False)
+            future = queue.popleft()
+            self._waiting -= 1
+            if queue:
+                self._queues[key] = queue
+            if not future.done():
+                future.set_result(None)  # Slot passes straight to the waiter
+                return
+        self._active -= 1
+
+    def _discard(self, key: Hashable, future: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[key]
+
+    def slot(self, key: Hashable) -> "_Slot":
+        return _Slot(self, key)
+
+
+class _Slot:
+    def __init__(self, limiter: FairLimiter, key: Hashable):
+        self.limiter = limiter
+        self.key = key
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.key)
+
+    async def __aexit__(self, *exc):
+        self.limiter.release()
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; one trial call after ``reset_timeout``.
+
+    A trial that ends without a recorded outcome (cancelled, rejected by
+    the limiter, or a bad request) must call ``release_trial``; a trial
+    left unreleased still expires after another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            now = time.monotonic()
+            if self._trial_at is None or now - self._trial_at >= self.reset_timeout:
+                self._trial_at = now
+                return True
+        return False
+
+    def release_trial(self):
+        """Let another call probe; the trial ended without telling us anything"""
+        self._trial_at = None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_at = None
+
+
+def _is_transient(error: Exception) -> bool:
+    return isinstance(error, asyncio.TimeoutError) or is_retryable(error)
+
+
+class LLMGateway:
+    """All OpenAI chat calls go through here.
+
+    Calls wait for a fair concurrency slot, run with a timeout and, for
+    non-streaming calls, a hedged duplicate request once ``hedge_delay``
+    passes without an answer. Transient failures are retried with jittered
+    backoff, and a per-model circuit breaker fails fast (or falls back to
+    the cheaper model) while the provider is unhealthy. ``create`` defaults
+    to ``openai.ChatCompletion.acreate``; set ``OPENAI_API_BASE`` to point it
+    at a local fake server.
+    """
+
+    def __init__(
+        self,
+        create: Optional[Callable[..., Awaitable[Any]]] = None,
+        max_concurrent: int = 8,
+        max_queue: int = 200,
+        timeout: float = 30.0,
+        hedge_delay: Optional[float] = 8.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ):
+        self.create = create or self._openai_create
+        self.limiter = FairLimiter(max_concurrent, max_queue)
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {
+            "requests": 0, "retries": 0, "timeouts": 0, "hedges": 0,
+            "hedge_wins": 0, "fallbacks": 0, "circuit_rejections": 0, "failures": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        if os.getenv('OPENAI_API_BASE'):
+            openai.api_base = os.getenv('OPENAI_API_BASE')
+        hedge_delay = float(os.getenv('OPENAI_HEDGE_DELAY_SECONDS', '8'))
+        return cls(
+            max_concurrent=int(os.getenv('OPENAI_MAX_CONCURRENCY', '8')),
+            max_queue=int(os.getenv('OPENAI_MAX_QUEUE', '200')),
+            timeout=float(os.getenv('OPENAI_TIMEOUT_SECONDS', '30')),
+            hedge_delay=hedge_delay if hedge_delay > 0 else None,
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '2')),
+            failure_threshold=int(os.getenv('OPENAI_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('OPENAI_BREAKER_RESET_SECONDS', '30'))
+        )
+
+    async def _openai_create(self, **kwargs) -> Any:
+        return await openai.ChatCompletion.acreate(**kwargs)
+
+    async def _timed_create(self, **kwargs) -> Any:
+        operation = f"{kwargs['model']}:stream" if kwargs.get("stream") else kwargs["model"]
+        with timer(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service="openai", operation=operation):
+            return await self.create(**kwargs)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[model]
+
+    def _select(self, route: ModelRoute) -> Tuple[ModelRoute, bool]:
+        """The first candidate whose circuit lets a call through, and whether that call is its trial"""
+        for i, candidate in enumerate(route.candidates()):
+            breaker = self.breaker(candidate.model)
+            trial = breaker.state == "half_open"
+            if breaker.allow():
+                if i:
+                    self.stats["fallbacks"] += 1
+                return candidate, trial
+        self.stats["circuit_rejections"] += 1
+        raise CircuitOpenError(f"OpenAI circuit open for {route.model}")
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def complete(self, key: Hashable, route: ModelRoute, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        """Full completion text for ``messages``"""
+        attempt = 0
+        while True:
+            selected, trial = self._select(route)
+            breaker = self.breaker(selected.model)
+            try:
+                async with self.limiter.slot(key):
+                    response = await self._hedged(
+                        model=selected.model,
+                        messages=messages,
+                        max_tokens=selected.max_tokens,
+                        temperature=temperature
+                    )
+                breaker.record_success()
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=selected.model, kind="prompt")
+                    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=selected.model, kind="completion")
+                return response.choices[0].message.content.strip()
+            except OverloadedError:
+                raise
+            except Exception as e:
+                if not _is_transient(e):
+                    # Bad requests say nothing about provider health; the breaker is left as it was
+                    self.stats["failures"] += 1
+                    raise
+                breaker.record_failure()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                if attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+            finally:
+                # Cancelled, overloaded or bad-request trials never reach record_*
+                if trial:
+                    breaker.release_trial()
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def _hedged(self, **kwargs) -> Any:
+        """Run one call; if it is slow, race a duplicate and keep the first answer"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        self.stats["requests"] += 1
+        primary = asyncio.ensure_future(self._timed_create(**kwargs))
+        tasks = {primary}
+        try:
+            if self.hedge_delay is not None and self.hedge_delay < self.timeout:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+                if not done:
+                    self.stats["requests"] += 1
+                    self.stats["hedges"] += 1
+                    tasks.add(asyncio.ensure_future(self._timed_create(**kwargs)))
+
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, tasks = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not tasks:
+                raise error
+            raise asyncio.TimeoutError()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream(self, key: Hashable, route: ModelRoute, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        """Yield completion tokens; retries only happen before the first token"""
+        attempt = 0
+        while True:
+            selected, trial = self._select(route)
+            breaker = self.breaker(selected.model)
+            started = False
+            try:
+                async with self.limiter.slot(key):
+                    self.stats["requests"] += 1
+                    # Timed until the stream opens (time to first byte)
+                    response = await asyncio.wait_for(
+                        self._timed_create(
+                            model=selected.model,
+                            messages=messages,
+                            max_tokens=selected.max_tokens,
+                            temperature=temperature,
+                            stream=True
+                        ),
+                        timeout=self.timeout
+                    )
+                    streamed = 0
+                    async for chunk in response:
+                        token = chunk.choices[0].delta.get("content")
+                        if token:
+                            started = True
+                            streamed += 1
+                            yield token
+                # Streams carry no usage block; each content delta is about one token
+                LLM_TOKENS.inc(streamed, model=selected.model, kind="completion")
+                breaker.record_success()
+                return
+            except OverloadedError:
+                raise
+            except Exception as e:
+                if not _is_transient(e):
+                    # Bad requests say nothing about provider health; the breaker is left as it was
+                    self.stats["failures"] += 1
+                    raise
+                breaker.record_failure()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                if started or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+            finally:
+                # Cancelled, overloaded or bad-request trials never reach record_*
+                if trial:
+                    breaker.release_trial()
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.limiter.active,
+            "queued": self.limiter.waiting,
+            "circuits": {model: breaker.state for model, breaker in self.breakers.items()}
+        }
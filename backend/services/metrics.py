@@ -0,0 +1,261 @@
+"""
+Metrics
+Low-overhead counters, histograms and timers with Prometheus text exposition
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import functools
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+SLOW_CALL_SECONDS = float(os.getenv('METRICS_SLOW_CALL_SECONDS', '1.0'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400)
+
+logger = logging.getLogger("portal.metrics")
+
+
+def configure_logging(level: Optional[str] = None):
+    """Send ``portal.*`` logs to stderr: events as bare JSON lines, service errors with a prefix.
+
+    Python drops INFO and below when nothing is configured, which would
+    silence every ``log_event``. Call once at startup; repeat calls only
+    update the level.
+    """
+    root = logging.getLogger("portal")
+    root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root.addHandler(handler)
+        root.propagate = False
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """One JSON log line per event"""
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _labels(self.labelnames, key, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+                cumulative += series[len(self.buckets)]
+                labels = _labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative:g}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-1]:g}")
+        return lines
+
+
+class Registry:
+    """Metrics plus stats callbacks, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._stats: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, collect: Callable[[], Dict[str, Any]]):
+        """Export the numeric values of an existing ``get_stats()`` dict as gauges"""
+        self._stats.append((prefix, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, collect in self._stats:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning("Error collecting %s stats: %s", prefix, e)
+                continue
+            for key, value in sorted(stats.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"portal_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "portal_http_request_seconds", "Request latency by route", ["method", "route", "status"]
+)
+EXTERNAL_SECONDS = REGISTRY.histogram(
+    "portal_external_call_seconds", "Latency of calls to Sheets, OpenAI, ElevenLabs and the database", ["service", "operation"]
+)
+EXTERNAL_ERRORS = REGISTRY.counter(
+    "portal_external_call_errors_total", "Failed external calls", ["service", "operation"]
+)
+CPU_SECONDS = REGISTRY.histogram(
+    "portal_cpu_seconds", "Time spent in CPU-heavy helpers", ["operation"]
+)
+CACHE_EVENTS = REGISTRY.counter(
+    "portal_cache_events_total", "Cache lookups by result", ["cache", "result"]
+)
+WRITE_BUFFER_DROPPED = REGISTRY.counter(
+    "portal_write_buffer_dropped_rows_total", "Buffered sheet rows given up on", ["sheet", "reason"]
+)
+SHEET_UPDATE_FAILURES = REGISTRY.counter(
+    "portal_sheet_update_failures_total", "Batched cell updates that failed after orders were appended", ["sheet"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "portal_llm_tokens_total", "OpenAI tokens by model and kind", ["model", "kind"]
+)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "portal_event_loop_lag_seconds", "How late the event loop woke a timer", [],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "portal_prompt_tokens", "System prompt size per chat request", [], buckets=TOKEN_BUCKETS
+)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ("histogram", "errors", "labels", "start")
+
+    def __init__(self, histogram: Histogram, errors: Optional[Counter], labels: Dict[str, str]):
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed, **self.labels)
+        # Cancellation isn't a failure of the dependency
+        if exc_type is not None and self.errors is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.errors.inc(**self.labels)
+        if elapsed >= SLOW_CALL_SECONDS:
+            log_event("slow_call", logging.WARNING, metric=self.histogram.name, seconds=round(elapsed, 3), error=exc_type.__name__ if exc_type else None, **self.labels)
+        return False
+
+
+def timer(histogram: Histogram, errors: Optional[Counter] = None, **labels):
+    """``with timer(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service=..., operation=...):``"""
+    if not ENABLED:
+        return _NOOP
+    return _Timer(histogram, errors, labels)
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None, **labels):
+    """Decorator form of ``timer``; a no-op wrapper-free passthrough when metrics are off"""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _Timer(histogram, errors, labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(histogram, errors, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
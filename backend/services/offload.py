@@ -0,0 +1,153 @@
+"""
+Offload Executor
+Runs CPU-heavy work off the event loop above a size threshold, and measures loop lag
+"""
+
+import gc
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from services.metrics import LOOP_LAG_SECONDS, log_event
+
+_executor: Optional["OffloadExecutor"] = None
+
+
+def get_executor() -> "OffloadExecutor":
+    """The process-wide executor, configured from the environment on first use"""
+    global _executor
+    if _executor is None:
+        _executor = OffloadExecutor.from_env()
+    return _executor
+
+
+class OffloadExecutor:
+    """Inline for small inputs, a worker pool for large ones.
+
+    Handing work to a thread costs tens of microseconds, so inputs below
+    ``inline_max`` run directly on the loop. Larger ones go to the thread
+    pool, where the GIL is released to the loop every switch interval
+    instead of being held for the whole call. ``process=True`` sends a
+    call to the process pool (when configured) for true parallelism; the
+    function and its arguments must then be picklable, and pickling the
+    input costs a copy, so it only pays off for heavy pure functions.
+    """
+
+    def __init__(self, threads: int = 4, processes: int = 0, inline_max: int = 2000, gc_freeze: bool = True):
+        self.inline_max = inline_max
+        self.gc_freeze = gc_freeze
+        self.threads: Executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="offload")
+        self.processes: Optional[Executor] = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+        self.frozen = False
+        self.stats = {"inline": 0, "threads": 0, "processes": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "OffloadExecutor":
+        return cls(
+            threads=int(os.getenv('OFFLOAD_THREADS', '4')),
+            processes=int(os.getenv('OFFLOAD_PROCESSES', '0')),
+            inline_max=int(os.getenv('OFFLOAD_INLINE_MAX_ROWS', '2000')),
+            gc_freeze=os.getenv('OFFLOAD_GC_FREEZE', 'true').lower() not in ('0', 'false', 'no')
+        )
+
+    async def run(self, fn: Callable[..., Any], *args, size: Optional[int] = None, process: bool = False) -> Any:
+        """``fn(*args)`` inline when ``size`` is below the threshold, otherwise on a pool"""
+        if size is not None and size < self.inline_max:
+            self.stats["inline"] += 1
+            return fn(*args)
+
+        pool = self.threads
+        if process and self.processes is not None:
+            pool = self.processes
+            self.stats["processes"] += 1
+        else:
+            self.stats["threads"] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    def freeze(self):
+        """Exempt the long-lived startup heap from cyclic GC, once per process.
+
+        Called after startup warm-up so modules, clients and the first
+        snapshots stop being rescanned by full collections. Objects frozen
+        here are never collected as cyclic garbage, so it must not be
+        repeated while requests are in flight; later snapshots are mostly
+        untracked strings and arrays and need no freezing.
+        """
+        if self.gc_freeze and not self.frozen:
+            gc.collect()
+            gc.freeze()
+            self.frozen = True
+
+    def shutdown(self):
+        global _executor
+        self.threads.shutdown(wait=False)
+        if self.processes is not None:
+            self.processes.shutdown(wait=False)
+        if _executor is self:
+            _executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "inline_max": self.inline_max, "gc_frozen": self.frozen}
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task.
+
+    Every ``interval`` the monitor sleeps and records how much longer than
+    requested the wake-up took; anything the loop ran in between without
+    yielding shows up as lag. Samples above ``warn_seconds`` are logged.
+    """
+
+    def __init__(self, interval: float = 0.25, warn_seconds: float = 0.1):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    @classmethod
+    def from_env(cls) -> "LoopLagMonitor":
+        return cls(
+            interval=float(os.getenv('LOOP_LAG_INTERVAL_SECONDS', '0.25')),
+            warn_seconds=float(os.getenv('LOOP_LAG_WARN_SECONDS', '0.1'))
+        )
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - start - self.interval))
+
+    def reset(self):
+        self.stats = {"samples": 0, "stalls": 0, "last_lag_ms": 0.0, "max_lag_ms": 0.0}
+
+    def record(self, lag: float):
+        LOOP_LAG_SECONDS.observe(lag)
+        self.stats["samples"] += 1
+        self.stats["last_lag_ms"] = round(lag * 1000, 3)
+        self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], self.stats["last_lag_ms"])
+        if lag >= self.warn_seconds:
+            self.stats["stalls"] += 1
+            log_event("event_loop_stall", logging.WARNING, lag_ms=self.stats["last_lag_ms"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -0,0 +1,183 @@
+"""
+Columnar Order Store
+NumPy-backed view of the Orders sheet for vectorized analytics
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.sheet_records import OrderTable
+
+MISSING_TIMESTAMP = np.iinfo(np.int64).min
+RECENT_WINDOW_SECONDS = 31 * 86400  # matches "(now - date).days <= 30"
+
+
+def _timestamp(date_str: str) -> int:
+    try:
+        return int(datetime.fromisoformat(date_str.replace('Z', '+00:00')).timestamp())
+    except (ValueError, AttributeError):
+        return MISSING_TIMESTAMP
+
+
+class OrderColumns:
+    """Orders stored as parallel arrays.
+
+    Per order: customer code (int32), timestamp (int64 epoch seconds),
+    amount (float64). Line items are exploded into parallel arrays of
+    order row, SKU code and quantity. Customer and item rows are also
+    grouped by customer through a stable sort so per-customer queries
+    only touch that customer's slice.
+    """
+
+    def __init__(
+        self,
+        order_ids: List[str],
+        customer_ids: Sequence[str],
+        dates: List[str],
+        amounts: Sequence[float],
+        line_items: Iterable[Tuple[List[Any], List[Any]]]
+    ):
+        self.customer_ids: List[str] = []
+        self.customer_codes_by_id: Dict[str, int] = {}
+        self.skus: List[str] = []
+        self.sku_codes: Dict[str, int] = {}
+
+        self.order_ids = order_ids
+        self.dates = dates
+
+        customer_codes = [self._code(customer_id, self.customer_ids, self.customer_codes_by_id) for customer_id in customer_ids]
+        item_rows = []
+        item_skus = []
+        item_quantities = []
+        for row, (products, quantities) in enumerate(line_items):
+            for i, sku in enumerate(products):
+                item_rows.append(row)
+                item_skus.append(self._code(str(sku), self.skus, self.sku_codes))
+                quantity = quantities[i] if i < len(quantities) else 1
+                item_quantities.append(int(quantity or 0))
+
+        self.customer_codes = np.asarray(customer_codes, dtype=np.int32)
+        self.timestamps = np.fromiter((_timestamp(d) for d in self.dates), dtype=np.int64, count=len(order_ids))
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+
+        self.item_rows = np.asarray(item_rows, dtype=np.int64)
+        self.item_skus = np.asarray(item_skus, dtype=np.int32)
+        self.item_quantities = np.asarray(item_quantities, dtype=np.int64)
+
+        # Group order rows and item rows by customer
+        self.row_perm = np.argsort(self.customer_codes, kind="stable")
+        self.row_bounds = np.searchsorted(self.customer_codes[self.row_perm], np.arange(len(self.customer_ids) + 1))
+        item_customers = self.customer_codes[self.item_rows] if len(self.item_rows) else np.zeros(0, dtype=np.int32)
+        self.item_perm = np.argsort(item_customers, kind="stable")
+        self.item_bounds = np.searchsorted(item_customers[self.item_perm], np.arange(len(self.customer_ids) + 1))
+
+    @classmethod
+    def from_table(cls, table: OrderTable) -> "OrderColumns":
+        """Straight from the compact table; line items are decoded one row at a time"""
+        return cls(
+            table.ids,
+            table.customer_ids,
+            table.dates,
+            table.totals,
+            (table.line_items(position) for position in range(len(table)))
+        )
+
+    @staticmethod
+    def _code(value: str, values: List[str], codes: Dict[str, int]) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.order_ids)
+
+    def _top_skus(self, sku_codes: np.ndarray, n: int) -> List[Tuple[str, int]]:
+        if not len(sku_codes):
+            return []
+        counts = np.bincount(sku_codes, minlength=len(self.skus))
+        top = np.argsort(-counts, kind="stable")[:n]
+        return [(self.skus[code], int(counts[code])) for code in top if counts[code] > 0]
+
+    def _recent_mask(self, timestamps: np.ndarray, now: float) -> np.ndarray:
+        return (timestamps != MISSING_TIMESTAMP) & (now - timestamps < RECENT_WINDOW_SECONDS)
+
+    def customer_summary(self, customer_id: str, now: Optional[float] = None) -> Dict[str, Any]:
+        """Totals, AOV, 30-day spend and top products for one customer"""
+        code = self.customer_codes_by_id.get(customer_id)
+        if code is None:
+            return {"total_orders": 0, "total_spent": 0, "avg_order_value": 0}
+        now = now if now is not None else datetime.now().timestamp()
+
+        rows = self.row_perm[self.row_bounds[code]:self.row_bounds[code + 1]]
+        amounts = self.amounts[rows]
+        timestamps = self.timestamps[rows]
+        items = self.item_perm[self.item_bounds[code]:self.item_bounds[code + 1]]
+
+        total_spent = float(amounts.sum())
+        dated = np.flatnonzero(timestamps != MISSING_TIMESTAMP)
+        last_row = rows[dated[np.argmax(timestamps[dated])]] if len(dated) else rows[-1]
+        first_row = rows[dated[np.argmin(timestamps[dated])]] if len(dated) else rows[0]
+
+        return {
+            "total_orders": int(len(rows)),
+            "total_spent": total_spent,
+            "avg_order_value": total_spent / len(rows),
+            "monthly_spend": float(amounts[self._recent_mask(timestamps, now)].sum()),
+            "top_products": self._top_skus(self.item_skus[items], 5),
+            "last_order_date": self.dates[last_row],
+            "customer_since": self.dates[first_row]
+        }
+
+    def customer_rollups(self) -> Dict[str, np.ndarray]:
+        """Per-customer order count, revenue and AOV, indexed by customer code"""
+        n = len(self.customer_ids)
+        counts = np.bincount(self.customer_codes, minlength=n)
+        revenue = np.bincount(self.customer_codes, weights=self.amounts, minlength=n)
+        aov = np.divide(revenue, counts, out=np.zeros(n, dtype=np.float64), where=counts > 0)
+        return {"order_count": counts, "revenue": revenue, "avg_order_value": aov}
+
+    def dashboard(self, total_customers: Optional[int] = None, now: Optional[float] = None, top_n: int = 10) -> Dict[str, Any]:
+        """Business-wide aggregates across all orders"""
+        now = now if now is not None else datetime.now().timestamp()
+        total_orders = len(self)
+        total_revenue = float(self.amounts.sum())
+
+        rollups = self.customer_rollups()
+        top_customers = np.argsort(-rollups["revenue"], kind="stable")[:top_n]
+
+        # Unit sales per SKU
+        units = np.bincount(self.item_skus, weights=self.item_quantities, minlength=len(self.skus))
+        top_units = np.argsort(-units, kind="stable")[:top_n]
+
+        recent = np.argsort(self.timestamps, kind="stable")[::-1][:top_n]
+
+        return {
+            "total_customers": total_customers if total_customers is not None else len(self.customer_ids),
+            "active_customers": len(self.customer_ids),
+            "total_orders": total_orders,
+            "total_revenue": total_revenue,
+            "avg_order_value": total_revenue / total_orders if total_orders else 0,
+            "monthly_revenue": float(self.amounts[self._recent_mask(self.timestamps, now)].sum()),
+            "top_products": [
+                {"sku": sku, "orders": count, "units": int(units[self.sku_codes[sku]])}
+                for sku, count in self._top_skus(self.item_skus, top_n)
+            ],
+            "top_products_by_units": [(self.skus[code], int(units[code])) for code in top_units if units[code] > 0],
+            "top_customers": [
+                {"customer_id": self.customer_ids[code], "revenue": float(rollups["revenue"][code]), "orders": int(rollups["order_count"][code])}
+                for code in top_customers
+            ],
+            "recent_activity": [
+                {
+                    "order_id": self.order_ids[row],
+                    "customer_id": self.customer_ids[self.customer_codes[row]],
+                    "date": self.dates[row],
+                    "total_amount": float(self.amounts[row])
+                }
+                for row in recent
+            ]
+        }
@@ -0,0 +1,136 @@
+"""
+Order Index
+Per-customer order positions with keyset pagination, filters and lazy parsing
+"""
+
+import json
+import heapq
+import base64
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.sheet_records import OrderTable
+
+OrderKey = Tuple[str, str]  # (date, order id)
+
+
+def encode_order_cursor(key: OrderKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"d": key[0], "i": key[1]}).encode()).decode()
+
+
+def decode_order_cursor(cursor: Optional[str]) -> Optional[OrderKey]:
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(data["d"]), str(data["i"]))
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+class OrderFilter:
+    """Status, date range and SKU predicates over ``OrderTable`` positions"""
+
+    def __init__(
+        self,
+        status: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        sku: Optional[str] = None
+    ):
+        self.status = status.lower() if status else None
+        self.date_from = date_from or None
+        self.date_to = date_to or None
+        self.sku = sku or None
+
+    def __bool__(self) -> bool:
+        return any((self.status, self.date_from, self.date_to, self.sku))
+
+    def matches(self, table: OrderTable, position: int) -> bool:
+        if self.status and table.statuses[position].lower() != self.status:
+            return False
+        date = table.dates[position]
+        if self.date_from and date < self.date_from:
+            return False
+        # Inclusive: a bare "2024-03-01" covers the whole day
+        if self.date_to and date[:len(self.date_to)] > self.date_to:
+            return False
+        if self.sku:
+            products = table.products[position]
+            # Substring check first; decode only rows that might match
+            if not products or self.sku not in products:
+                return False
+            try:
+                return self.sku in json.loads(products)
+            except ValueError:
+                return False
+        return True
+
+
+class OrderIndex:
+    """Order positions grouped by customer over a compact ``OrderTable``.
+
+    The first page of a customer's history is a heap top-k over their
+    positions, so one-off lookups (chat context, dashboards) never sort.
+    A customer's positions are fully sorted only when a client pages past
+    the first page, and that order is memoized for the snapshot's
+    lifetime. Only returned orders are turned into ``Order`` models.
+    """
+
+    def __init__(self, rows: Iterable[List[Any]]):
+        self.table = OrderTable(rows)
+        self.by_id: Dict[str, int] = self.table.positions
+        self._by_customer: Dict[str, array] = {}
+        self._sorted: Dict[str, Tuple[List[OrderKey], List[int]]] = {}
+        for position, customer_id in enumerate(self.table.customer_ids):
+            positions = self._by_customer.get(customer_id)
+            if positions is None:
+                positions = self._by_customer[customer_id] = array("l")
+            positions.append(position)
+
+    def customer_positions(self, customer_id: str) -> Sequence[int]:
+        return self._by_customer.get(customer_id, ())
+
+    def _sorted_positions(self, customer_id: str) -> Tuple[List[OrderKey], List[int]]:
+        """Oldest-first positions and their keys, built once per customer"""
+        entry = self._sorted.get(customer_id)
+        if entry is None:
+            positions = sorted(self.customer_positions(customer_id), key=self.table.key)
+            entry = ([self.table.key(position) for position in positions], positions)
+            self._sorted[customer_id] = entry
+        return entry
+
+    def page(
+        self,
+        customer_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        filters: Optional[OrderFilter] = None
+    ) -> Tuple[List[int], Optional[str]]:
+        """Newest-first positions after ``cursor`` plus the cursor for the next page"""
+        limit = max(1, limit)
+        after = decode_order_cursor(cursor)
+        filters = filters or OrderFilter()
+        table = self.table
+
+        if after is None and customer_id not in self._sorted:
+            candidates: Iterable[int] = self.customer_positions(customer_id)
+            if filters:
+                candidates = (position for position in candidates if filters.matches(table, position))
+            positions = heapq.nlargest(limit + 1, candidates, key=table.key)
+        else:
+            keys, ordered = self._sorted_positions(customer_id)
+            end = bisect_left(keys, after) if after is not None else len(keys)
+            positions = []
+            for i in range(end - 1, -1, -1):
+                if filters.date_from and keys[i][0] < filters.date_from:
+                    break  # Everything older is out of range too
+                if filters.matches(table, ordered[i]):
+                    positions.append(ordered[i])
+                    if len(positions) > limit:
+                        break
+
+        page = positions[:limit]
+        next_cursor = encode_order_cursor(table.key(page[-1])) if len(positions) > limit else None
+        return page, next_cursor
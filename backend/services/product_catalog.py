@@ -0,0 +1,177 @@
+"""
+Product Catalog Index
+Inverted token/trigram index over the Products sheet with ranked, paginated search
+"""
+
+import re
+import json
+import base64
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.sheet_records import ProductRecord
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+SEARCH_MEMO_SIZE = 256
+SEARCH_MEMO_MAX_RESULTS = 50000  # product references held across all memoized results
+
+# Relevance weight per field; exact token hits count double
+FIELD_WEIGHTS = {"name": 3.0, "compatibility": 2.0, "description": 1.0}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def rows_fingerprint(rows: List[List[Any]]) -> str:
+    """Digest of raw sheet rows, used to skip rebuilding an unchanged catalog"""
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(json.dumps(row, default=str).encode())
+    return digest.hexdigest()
+
+
+class ProductCatalog:
+    """Immutable search index built from one Products snapshot.
+
+    Search keeps the original contract: a product matches when the query
+    is a case-insensitive substring of its name or description. The
+    token index only narrows the candidates (every such product contains
+    each query token inside one of its own tokens) and ranks them.
+    """
+
+    def __init__(self, products: List[ProductRecord], fingerprint: str = ""):
+        self.products = products
+        self.fingerprint = fingerprint
+        self.by_sku: Dict[str, ProductRecord] = {}
+        self.by_category: Dict[str, List[int]] = {}
+        self._memo: "OrderedDict[Tuple[str, str], List[ProductRecord]]" = OrderedDict()
+        self._memo_results = 0
+
+        # token -> {product position: field weight}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        for position, product in enumerate(products):
+            self.by_sku.setdefault(product.sku, product)
+            self.by_category.setdefault(product.category.lower(), []).append(position)
+            for field, text in (
+                ("name", product.name),
+                ("description", product.description),
+                ("compatibility", " ".join(product.compatibility))
+            ):
+                weight = FIELD_WEIGHTS[field]
+                for token in set(tokenize(text)):
+                    postings = self.postings.setdefault(token, {})
+                    postings[position] = max(postings.get(position, 0.0), weight)
+
+        # Vocabulary lookups for partial terms
+        self.vocabulary = sorted(self.postings.keys())
+        self.trigram_index: Dict[str, Set[str]] = {}
+        for token in self.vocabulary:
+            for gram in _trigrams(token):
+                self.trigram_index.setdefault(gram, set()).add(token)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _matching_tokens(self, term: str) -> List[str]:
+        """Vocabulary tokens containing ``term``"""
+        if len(term) >= 3:
+            grams = _trigrams(term)
+            candidates = None
+            for gram in grams:
+                tokens = self.trigram_index.get(gram, set())
+                candidates = tokens if candidates is None else candidates & tokens
+                if not candidates:
+                    return []
+            return [token for token in candidates if term in token]
+
+        # Short terms have no trigrams; scan the vocabulary
+        return [token for token in self.vocabulary if term in token]
+
+    def _score(self, query: str) -> Dict[int, float]:
+        """Products matching every query term, with relevance scores"""
+        scores: Optional[Dict[int, float]] = None
+        for term in set(tokenize(query)):
+            term_scores: Dict[int, float] = {}
+            for token in self._matching_tokens(term):
+                boost = 2.0 if token == term else 1.0
+                for position, weight in self.postings[token].items():
+                    term_scores[position] = max(term_scores.get(position, 0.0), weight * boost)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {p: s + term_scores[p] for p, s in scores.items() if p in term_scores}
+            if not scores:
+                return {}
+        return scores or {}
+
+    def search(self, search: Optional[str] = None, category: Optional[str] = None) -> List[ProductRecord]:
+        """All matching products, most relevant first"""
+        key = ((search or "").lower(), (category or "").lower())
+        results = self._memo.get(key)
+        if results is not None:
+            self._memo.move_to_end(key)
+            return results
+
+        results = self._search(key[0], key[1])
+        self._memo[key] = results
+        self._memo_results += len(results)
+        # LRU, bounded by entries and by total results held
+        while len(self._memo) > SEARCH_MEMO_SIZE or (self._memo_results > SEARCH_MEMO_MAX_RESULTS and len(self._memo) > 1):
+            _, evicted = self._memo.popitem(last=False)
+            self._memo_results -= len(evicted)
+        return results
+
+    def _matches(self, position: int, search: str) -> bool:
+        product = self.products[position]
+        return search in product.name.lower() or search in product.description.lower()
+
+    def _search(self, search: str, category: str) -> List[ProductRecord]:
+        allowed = None
+        if category:
+            allowed = self.by_category.get(category, [])
+
+        if search and tokenize(search):
+            scores = self._score(search)
+            if allowed is not None:
+                allowed_set = set(allowed)
+                scores = {p: s for p, s in scores.items() if p in allowed_set}
+            scores = {p: s for p, s in scores.items() if self._matches(p, search)}
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self.products[item[0]].name))
+            return [self.products[position] for position, _ in ranked]
+
+        positions = allowed if allowed is not None else range(len(self.products))
+        if search:
+            # Punctuation-only query: nothing to index on, so match it directly
+            positions = [position for position in positions if self._matches(position, search)]
+        return [self.products[position] for position in positions]
+
+    def page(self, search: Optional[str] = None, category: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of search results plus an opaque cursor for the next page"""
+        offset = decode_cursor(cursor)
+        results = self.search(search, category)
+        page = results[offset:offset + limit]
+        next_offset = offset + len(page)
+        return {
+            "products": page,
+            "next_cursor": encode_cursor(next_offset) if next_offset < len(results) else None,
+            "total": len(results)
+        }
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        return max(0, int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["o"]))
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
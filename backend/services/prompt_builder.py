@@ -0,0 +1,148 @@
+"""
+Prompt Builder
+Token-budgeted system prompts with a stable instruction prefix and compact context
+"""
+
+import os
+import json
+from typing import Any, Dict, List
+
+from services.metrics import CPU_SECONDS, timed
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a character estimate
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+# Identical for every request so providers can cache the prefix
+STATIC_INSTRUCTIONS = """You are an expert customer service representative for an electronics accessories company.
+
+YOUR ROLE:
+1. Provide expert advice on electronics accessories (phone cases, screen protectors, chargers, tablets, etc.)
+2. Help with order history, tracking, and reordering
+3. Answer product compatibility questions
+4. Process new orders when requested
+5. Provide personalized recommendations based on purchase history
+
+GUIDELINES:
+- Be friendly, professional, and knowledgeable
+- Reference their purchase history when relevant
+- Offer specific product recommendations
+- If they want to place an order, gather: product SKU, quantity, any special requirements
+- For tracking questions, provide order status and estimated delivery
+- Always prioritize customer satisfaction
+
+IMPORTANT: If the customer wants to place an order, respond with action_type: "create_order" and include the order details.
+If they want tracking info, respond with action_type: "track_order" and the order ID.
+For general questions, use action_type: "information".
+
+Respond naturally and conversationally. You have access to their complete history and can reference specific past orders.
+
+Customer data follows in compact form. Order rows are: id|date|total|status|products."""
+
+
+class PromptBuild:
+    """A rendered system prompt plus its per-section token counts"""
+
+    def __init__(self, text: str, sections: Dict[str, int], orders_included: int, orders_dropped: int):
+        self.text = text
+        self.sections = sections
+        self.orders_included = orders_included
+        self.orders_dropped = orders_dropped
+
+    @property
+    def tokens(self) -> int:
+        return sum(self.sections.values())
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.tokens,
+            "sections": self.sections,
+            "orders_included": self.orders_included,
+            "orders_dropped": self.orders_dropped
+        }
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _order_row(order: Dict[str, Any]) -> str:
+    products = ",".join(str(p) for p in order.get("products", []))
+    total = order.get("total") or 0
+    return f"{order.get('id', '')}|{str(order.get('date', ''))[:10]}|{total:.2f}|{order.get('status', '')}|{products}"
+
+
+class PromptBuilder:
+    """Builds system prompts that fit ``token_budget``.
+
+    Sections in priority order: static instructions, customer summary,
+    preferences and patterns, then as many recent orders (newest first)
+    as still fit.
+    """
+
+    def __init__(self, token_budget: int = 800):
+        self.token_budget = token_budget
+        self.instruction_tokens = count_tokens(STATIC_INSTRUCTIONS)
+
+    @classmethod
+    def from_env(cls) -> "PromptBuilder":
+        return cls(token_budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '800')))
+
+    @timed(CPU_SECONDS, operation="prompt_build")
+    def build(self, context: Dict[str, Any]) -> PromptBuild:
+        info = context["customer_info"]
+        customer = (
+            f"CUSTOMER: company={info['name']}; since={info['customer_since']}; "
+            f"total_spent=${info['total_spent']:,.2f}; last_order={info['last_order']}; status={info['status']}"
+        )
+        profile_parts = []
+        if context.get("preferences"):
+            profile_parts.append(f"RECENT PREFERENCES: {_compact(context['preferences'])}")
+        if context.get("purchase_patterns"):
+            profile_parts.append(f"RECENT PATTERNS: {_compact(context['purchase_patterns'])}")
+        profile = "\n".join(profile_parts)
+
+        sections = {
+            "instructions": self.instruction_tokens,
+            "customer": count_tokens(customer),
+            "profile": count_tokens(profile) if profile else 0
+        }
+        remaining = self.token_budget - sum(sections.values())
+
+        # Drop the profile before dropping the required sections
+        if remaining < 0 and profile:
+            remaining += sections["profile"]
+            sections["profile"] = 0
+            profile = ""
+
+        order_lines: List[str] = []
+        order_tokens = 0
+        orders = context.get("recent_orders", [])
+        for order in orders:  # newest first
+            line = _order_row(order)
+            tokens = count_tokens(line) + 1
+            if order_tokens + tokens > remaining:
+                break
+            order_lines.append(line)
+            order_tokens += tokens
+
+        body = [customer]
+        if profile:
+            body.append(profile)
+        if order_lines:
+            header = f"RECENT ORDERS ({len(order_lines)} of {len(orders)}):"
+            body.append(header + "\n" + "\n".join(order_lines))
+            order_tokens += count_tokens(header)
+        sections["orders"] = order_tokens
+
+        text = STATIC_INSTRUCTIONS + "\n\n" + "\n".join(body)
+        return PromptBuild(text, sections, len(order_lines), len(orders) - len(order_lines))
@@ -0,0 +1,186 @@
+"""
+AI Response Cache
+Exact and similarity-matched caching of AI answers to repeated questions
+"""
+
+import os
+import re
+import json
+import time
+import math
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.shared_cache import connect
+
+logger = logging.getLogger("portal.response_cache")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+EMBEDDING_DIMS = 256
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION.sub(" ", message.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def context_digest(context: Dict[str, Any]) -> str:
+    """Stable digest of the customer context an answer depends on"""
+    payload = json.dumps(context, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def embed(text: str) -> List[float]:
+    """Cheap local embedding: hashed unigrams + bigrams, L2-normalized"""
+    tokens = text.split()
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = [0.0] * EMBEDDING_DIMS
+    for feature in features:
+        h = int(hashlib.md5(feature.encode()).hexdigest()[:8], 16)
+        vector[h % EMBEDDING_DIMS] += 1.0 if h & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+class ResponseCache:
+    """LRU + TTL cache of AI responses.
+
+    The exact tier is keyed by normalized message plus context digest and
+    can live in Redis when ``REDIS_URL`` is set. The optional similarity
+    tier compares local embeddings of messages asked under the same context.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2000,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.0,
+        redis_url: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # context digest -> [(key, embedding)] for the similarity tier
+        self._vectors: Dict[str, List[Tuple[str, List[float]]]] = {}
+
+        # One connection pool per URL, shared with the other Redis-backed caches
+        self._redis = connect(redis_url)
+
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "skipped": 0, "stores": 0}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            max_entries=int(os.getenv('AI_CACHE_MAX_ENTRIES', '2000')),
+            ttl_seconds=float(os.getenv('AI_CACHE_TTL_SECONDS', '3600')),
+            similarity_threshold=float(os.getenv('AI_CACHE_SIMILARITY_THRESHOLD', '0')),
+            redis_url=os.getenv('REDIS_URL')
+        )
+
+    def key(self, message: str, digest: str) -> str:
+        return f"ai:response:{digest}:{hashlib.sha256(normalize_message(message).encode()).hexdigest()[:24]}"
+
+    async def get(self, message: str, digest: str) -> Optional[str]:
+        key = self.key(message, digest)
+
+        text = await self._get_exact(key)
+        if text is not None:
+            self.stats["exact_hits"] += 1
+            return text
+
+        if self.similarity_threshold > 0:
+            similar_key = self._find_similar(normalize_message(message), digest)
+            if similar_key:
+                text = await self._get_exact(similar_key)
+                if text is not None:
+                    self.stats["similar_hits"] += 1
+                    return text
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, message: str, digest: str, text: str):
+        key = self.key(message, digest)
+        self.stats["stores"] += 1
+
+        self._remember(key, text)
+
+        if self.similarity_threshold > 0:
+            vectors = self._vectors.setdefault(digest, [])
+            if all(k != key for k, _ in vectors):
+                vectors.append((key, embed(normalize_message(message))))
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, text, ex=int(self.ttl_seconds))
+            except Exception as e:
+                logger.warning("Error writing response cache to Redis: %s", e)
+
+    def skip(self):
+        """Record a message that bypassed the cache (e.g. order-creating intents)"""
+        self.stats["skipped"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "backend": "redis" if self._redis is not None else "memory"
+        }
+
+    async def _get_exact(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, text = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return text
+            del self._entries[key]
+            self._forget_vector(key)
+
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(key)
+            except Exception as e:
+                logger.warning("Error reading response cache from Redis: %s", e)
+                return None
+            if value is not None:
+                text = value.decode() if isinstance(value, bytes) else value
+                self._remember(key, text)
+                return text
+        return None
+
+    def _remember(self, key: str, text: str):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._forget_vector(evicted)
+
+    def _find_similar(self, normalized: str, digest: str) -> Optional[str]:
+        vectors = self._vectors.get(digest)
+        if not vectors:
+            return None
+        query = embed(normalized)
+        best_key, best_score = None, self.similarity_threshold
+        for key, vector in vectors:
+            score = sum(a * b for a, b in zip(query, vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _forget_vector(self, key: str):
+        digest = key.split(":")[2]
+        vectors = self._vectors.get(digest)
+        if vectors:
+            vectors[:] = [(k, v) for k, v in vectors if k != key]
+            if not vectors:
+                del self._vectors[digest]
@@ -0,0 +1,158 @@
+"""
+Chat Session Store
+Per-session message history with a token budget and rolling summary
+"""
+
+import os
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.prompt_builder import count_tokens
+from services.shared_cache import connect
+
+logger = logging.getLogger("portal.session_store")
+
+SUMMARY_LINE_CHARS = 160
+
+
+class ChatSession:
+    """Recent turns verbatim plus a summary of everything older"""
+
+    def __init__(self, messages: Optional[List[Dict[str, str]]] = None, summary: str = ""):
+        self.messages = messages or []
+        self.summary = summary
+
+    @property
+    def history_tokens(self) -> int:
+        return sum(count_tokens(m["content"]) for m in self.messages)
+
+    def prompt_messages(self) -> List[Dict[str, str]]:
+        """History to place between the system prompt and the new user message"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of earlier conversation:\n{self.summary}"})
+        return messages + self.messages
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        self.messages.append({"role": "user", "content": user_message})
+        self.messages.append({"role": "assistant", "content": assistant_message})
+
+    def compact(self, history_budget: int, summary_budget: int):
+        """Fold the oldest turns into the summary until history fits the budget"""
+        folded = []
+        while len(self.messages) > 2 and self.history_tokens > history_budget:
+            folded.extend(self.messages[:2])
+            del self.messages[:2]
+        if not folded:
+            return
+
+        lines = self.summary.splitlines() if self.summary else []
+        for message in folded:
+            text = " ".join(message["content"].split())
+            if len(text) > SUMMARY_LINE_CHARS:
+                text = text[:SUMMARY_LINE_CHARS - 3] + "..."
+            lines.append(f"{'Customer' if message['role'] == 'user' else 'Assistant'}: {text}")
+
+        # Oldest summary lines go first once the summary itself is over budget
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > summary_budget:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps({"messages": self.messages, "summary": self.summary})
+
+    @classmethod
+    def from_json(cls, payload: str) -> "ChatSession":
+        data = json.loads(payload)
+        return cls(data.get("messages", []), data.get("summary", ""))
+
+
+class SessionStore:
+    """Chat sessions in Redis when configured, else in an in-memory LRU.
+
+    With Redis, every read goes to Redis so all workers see the same
+    history, and a turn is appended to a fresh copy just before it is
+    saved. The local LRU then only serves while Redis is unreachable.
+    Local entries expire after ``ttl_seconds`` like the Redis keys.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: int = 3600,
+        history_budget: int = 1500,
+        summary_budget: int = 400,
+        redis_url: Optional[str] = None
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self._sessions: "OrderedDict[str, Tuple[float, ChatSession]]" = OrderedDict()
+        # One connection pool per URL, shared with the other Redis-backed caches
+        self._redis = connect(redis_url)
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            max_sessions=int(os.getenv('SESSION_MAX_SESSIONS', '10000')),
+            ttl_seconds=int(os.getenv('SESSION_TTL_SECONDS', '3600')),
+            history_budget=int(os.getenv('SESSION_HISTORY_TOKEN_BUDGET', '1500')),
+            summary_budget=int(os.getenv('SESSION_SUMMARY_TOKEN_BUDGET', '400')),
+            redis_url=os.getenv('REDIS_URL')
+        )
+
+    def _key(self, customer_id: str, session_id: str) -> str:
+        # Scope sessions to the customer so ids can't be replayed across accounts
+        return f"chat:session:{customer_id}:{session_id}"
+
+    async def get(self, customer_id: str, session_id: Optional[str]) -> Optional[ChatSession]:
+        if not session_id:
+            return None
+        key = self._key(customer_id, session_id)
+        session = await self._load(key)
+        self._remember(key, session)
+        return session
+
+    async def _load(self, key: str) -> ChatSession:
+        if self._redis is not None:
+            try:
+                payload = await self._redis.get(key)
+                if payload is None:
+                    return ChatSession()
+                return ChatSession.from_json(payload.decode() if isinstance(payload, bytes) else payload)
+            except Exception as e:
+                logger.warning("Error loading chat session from Redis: %s", e)
+        entry = self._sessions.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                return entry[1]
+            del self._sessions[key]
+        return ChatSession()
+
+    async def record_turn(self, customer_id: str, session_id: Optional[str], session: Optional[ChatSession], user_message: str, assistant_message: str):
+        """Append a completed turn, compact if over budget and persist"""
+        if not session_id or session is None:
+            return
+        key = self._key(customer_id, session_id)
+        if self._redis is not None:
+            # Other workers may have added turns since ``session`` was read
+            session = await self._load(key)
+        session.add_turn(user_message, assistant_message)
+        session.compact(self.history_budget, self.summary_budget)
+
+        self._remember(key, session)
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, session.to_json(), ex=self.ttl_seconds)
+            except Exception as e:
+                logger.warning("Error saving chat session to Redis: %s", e)
+
+    def _remember(self, key: str, session: ChatSession):
+        self._sessions[key] = (time.monotonic() + self.ttl_seconds, session)
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -0,0 +1,359 @@
+"""
+Shared Cache
+Cross-worker cache tier and pub/sub invalidation on Redis, with an in-process stand-in
+"""
+
+import os
+import json
+import time
+import uuid
+import zlib
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional
+    aioredis = None
+
+logger = logging.getLogger("portal.shared_cache")
+
+_clients: Dict[str, Any] = {}
+
+
+def connect(url: Optional[str]):
+    """Shared client for ``url``: Redis, ``memory://`` for the in-process stand-in, or None"""
+    if not url:
+        return None
+    if url not in _clients:
+        if url.startswith("memory://"):
+            _clients[url] = MemoryRedis()
+        elif aioredis is not None:
+            _clients[url] = aioredis.from_url(url)
+        else:
+            return None
+    return _clients[url]
+
+
+class MemoryRedis:
+    """The subset of ``redis.asyncio.Redis`` this app uses, kept in process memory.
+
+    Lets tests (and single-process setups) run the shared tier without a
+    server; several services built in one process see each other's writes
+    and published messages, like workers sharing one Redis.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._channels: Dict[str, Set["MemoryPubSub"]] = {}
+
+    def _encode(self, value: Any) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def mget(self, *keys: str) -> List[Optional[bytes]]:
+        return [self._live(key) for key in keys]
+
+    async def set(self, key: str, value: Any, ex: Optional[float] = None, px: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._live(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000.0 if px is not None else None)
+        self._data[key] = (self._encode(value), time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._live(key) or 0) + 1
+        expires_at = self._data.get(key, (None, None))[1]
+        self._data[key] = (str(value).encode(), expires_at)
+        return value
+
+    async def publish(self, channel: str, message: Any) -> int:
+        subscribers = list(self._channels.get(channel, ()))
+        for pubsub in subscribers:
+            pubsub._queue.put_nowait({"type": "message", "channel": channel.encode(), "data": self._encode(message)})
+        return len(subscribers)
+
+    def pubsub(self) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+
+class MemoryPubSub:
+    def __init__(self, redis: MemoryRedis):
+        self._redis = redis
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self._redis._channels.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels or list(self._redis._channels):
+            self._redis._channels.get(channel, set()).discard(self)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def close(self):
+        await self.unsubscribe()
+
+
+def encode_value(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, default=str, separators=(",", ":")).encode(), 1)
+
+
+def decode_value(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload))
+
+
+class SharedCache:
+    """JSON values shared by all workers, with versioned keys and invalidation events.
+
+    ``get_or_load`` lets one worker fetch a missing value while the others
+    wait for it (a Redis ``SET NX`` lock), so N workers cost one upstream
+    read. ``invalidate`` bumps a namespace version, so in-flight loads of
+    stale data land under a dead key, and publishes an event that the
+    other workers use to drop their near-cache copies.
+
+    Values are stored zlib-compressed; ones larger than ``chunk_bytes``
+    are split across several keys so no single Redis value grows to
+    megabytes. Encoding and decoding large values (whole sheets) runs on
+    ``offload`` instead of the event loop.
+    """
+
+    def __init__(
+        self,
+        redis,
+        prefix: str = "portal",
+        lock_timeout: float = 10.0,
+        poll_interval: float = 0.05,
+        chunk_bytes: int = 512 * 1024,
+        offload=None,
+        offload_min_bytes: int = 64 * 1024
+    ):
+        self.redis = redis
+        self.prefix = prefix
+        self.channel = f"{prefix}:invalidate"
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.chunk_bytes = chunk_bytes
+        self.offload = offload
+        self.offload_min_bytes = offload_min_bytes
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: List[Callable[[str, str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "waits": 0, "published": 0, "received": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, offload=None) -> Optional["SharedCache"]:
+        redis = connect(os.getenv('REDIS_URL'))
+        if redis is None:
+            return None
+        return cls(
+            redis,
+            prefix=os.getenv('SHARED_CACHE_PREFIX', 'portal'),
+            lock_timeout=float(os.getenv('SHARED_CACHE_LOCK_SECONDS', '10')),
+            chunk_bytes=int(os.getenv('SHARED_CACHE_CHUNK_KB', '512')) * 1024,
+            offload=offload
+        )
+
+    def _version_key(self, namespace: str, name: str) -> str:
+        return f"{self.prefix}:version:{namespace}:{name}"
+
+    async def _key(self, namespace: str, name: str) -> str:
+        version = await self.redis.get(self._version_key(namespace, name))
+        return f"{self.prefix}:{namespace}:{name}:v{int(version or 0)}"
+
+    async def get(self, namespace: str, name: str) -> Any:
+        return await self._read(await self._key(namespace, name))
+
+    async def set(self, namespace: str, name: str, value: Any, ttl: float):
+        await self._write(await self._key(namespace, name), value, ttl)
+
+    async def _read(self, key: str) -> Any:
+        """Stored value under ``key``, or None if missing (or a chunk has expired)"""
+        head = await self.redis.get(key)
+        if head is None:
+            return None
+        if head[:1] == b"c":
+            chunks = await self.redis.mget(*[f"{key}:{i}" for i in range(int(head[1:]))])
+            if any(chunk is None for chunk in chunks):
+                return None
+            payload = b"".join(chunks)
+        else:
+            payload = head[1:]
+        if self.offload is not None and len(payload) >= self.offload_min_bytes:
+            return await self.offload.run(decode_value, payload)
+        return decode_value(payload)
+
+    async def _write(self, key: str, value: Any, ttl: float):
+        """Store ``value`` under ``key``: inline (``z`` + data) or as ``c<n>`` plus n chunk keys"""
+        if self.offload is not None:
+            # Size in rows, for whole sheets; small values stay inline
+            payload = await self.offload.run(encode_value, value, size=len(value) if isinstance(value, list) else 0)
+        else:
+            payload = encode_value(value)
+        ex = max(1, int(ttl))
+        if len(payload) <= self.chunk_bytes:
+            await self.redis.set(key, b"z" + payload, ex=ex)
+            return
+        chunks = [payload[i:i + self.chunk_bytes] for i in range(0, len(payload), self.chunk_bytes)]
+        for i, chunk in enumerate(chunks):
+            await self.redis.set(f"{key}:{i}", chunk, ex=ex)
+        # Written last, so readers never see a head whose chunks are missing
+        await self.redis.set(key, f"c{len(chunks)}".encode(), ex=ex)
+
+    async def get_or_load(self, namespace: str, name: str, loader: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        """Shared value, loading it in exactly one worker on a miss"""
+        try:
+            key = await self._key(namespace, name)
+            value = await self._read(key)
+            if value is not None:
+                self.stats["hits"] += 1
+                return value
+
+            self.stats["misses"] += 1
+            lock = f"{key}:lock"
+            owns_lock = bool(await self.redis.set(lock, self.worker_id, px=int(self.lock_timeout * 1000), nx=True))
+            if not owns_lock:
+                # Another worker is loading; wait for its result
+                self.stats["waits"] += 1
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.poll_interval)
+                    value = await self._read(key)
+                    if value is not None:
+                        return value
+                    if await self.redis.get(lock) is None:
+                        break
+        except Exception as e:
+            # Redis trouble must not take reads down with it
+            self.stats["errors"] += 1
+            logger.warning("Error reading shared cache: %s", e)
+            return await loader()
+
+        self.stats["loads"] += 1
+        try:
+            value = await loader()
+            try:
+                await self._write(key, value, ttl)
+            except Exception as e:
+                logger.warning("Error writing shared cache: %s", e)
+            return value
+        finally:
+            if owns_lock:
+                try:
+                    await self.redis.delete(lock)
+                except Exception:
+                    pass
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        """True in exactly one worker per ``ttl`` window (for periodic jobs)"""
+        try:
+            return bool(await self.redis.set(f"{self.prefix}:lease:{name}", self.worker_id, px=int(ttl * 1000), nx=True))
+        except Exception as e:
+            logger.warning("Error acquiring shared lease %s: %s", name, e)
+            return True
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float, wait: Optional[float] = None):
+        """Mutual exclusion across workers for read-modify-write sections.
+
+        Held until the block exits or ``ttl`` runs out, whichever is first.
+        Raises TimeoutError if the lock isn't free within ``wait`` (default
+        ``ttl``); unlike leases this fails closed, since a Redis outage must
+        not let two workers write the same cells.
+        """
+        key = f"{self.prefix}:lock:{name}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + (ttl if wait is None else wait)
+        while not await self.redis.set(key, token, px=int(ttl * 1000), nx=True):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Shared lock {name} is busy")
+            await asyncio.sleep(self.poll_interval)
+        try:
+            yield
+        finally:
+            try:
+                # Only release our own lock; after a ttl expiry it may be someone else's
+                if await self.redis.get(key) == token.encode():
+                    await self.redis.delete(key)
+            except Exception as e:
+                logger.warning("Error releasing shared lock %s: %s", name, e)
+
+    async def invalidate(self, namespace: str, name: str):
+        """Retire the shared value and tell other workers to drop their copies"""
+        try:
+            await self.redis.incr(self._version_key(namespace, name))
+        except Exception as e:
+            logger.error("Error invalidating shared cache: %s", e)
+        await self.publish(namespace, name)
+
+    async def publish(self, namespace: str, name: str):
+        try:
+            await self.redis.publish(self.channel, json.dumps({"origin": self.worker_id, "namespace": namespace, "name": name}))
+            self.stats["published"] += 1
+        except Exception as e:
+            logger.error("Error publishing invalidation: %s", e)
+
+    def subscribe(self, handler: Callable[[str, str], None]):
+        """Call ``handler(namespace, name)`` for invalidations from other workers"""
+        self._handlers.append(handler)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    if event.get("origin") == self.worker_id:
+                        continue
+                    self.stats["received"] += 1
+                    for handler in self._handlers:
+                        handler(event["namespace"], event["name"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Error in invalidation listener, reconnecting: %s", e)
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "worker_id": self.worker_id}
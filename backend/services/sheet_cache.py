@@ -0,0 +1,162 @@
+"""
+Sheet Snapshot Cache
+Keeps parsed copies of Google Sheets tabs in memory with hash indexes
+"""
+
+import time
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.metrics import CACHE_EVENTS, CPU_SECONDS, timer
+
+
+class SheetSnapshot:
+    """Parsed view of a single sheet at a given version"""
+
+    def __init__(self, sheet: str, rows: List[List[Any]], version: int):
+        self.sheet = sheet
+        self.rows = rows
+        self.size = len(rows)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # Named hash indexes, filled in by the sheet's index builder
+        self.indexes: Dict[str, Dict[Any, Any]] = {}
+        self._building: Dict[str, asyncio.Future] = {}
+
+    def index(self, name: str) -> Dict[Any, Any]:
+        return self.indexes.get(name, {})
+
+    def derived(self, name: str, build: Callable[["SheetSnapshot"], Any]) -> Any:
+        """Lazily build and memoize a derived structure for this snapshot"""
+        if name not in self.indexes:
+            self.indexes[name] = build(self)
+        return self.indexes[name]
+
+    async def derived_async(self, name: str, build: Callable[["SheetSnapshot"], Any], offload=None) -> Any:
+        """``derived`` for expensive structures: built through ``offload`` once, shared by concurrent callers"""
+        if name in self.indexes:
+            return self.indexes[name]
+        if offload is None:
+            return self.derived(name, build)
+        pending = self._building.get(name)
+        if pending is None:
+            pending = self._building[name] = asyncio.ensure_future(offload.run(build, self, size=self.size))
+        try:
+            # Shielded: a cancelled caller must not abort the build others wait on
+            value = await asyncio.shield(pending)
+        finally:
+            if pending.done():
+                self._building.pop(name, None)
+        self.indexes[name] = value
+        return value
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class SheetSnapshotCache:
+    """TTL + version based cache of sheet snapshots.
+
+    Each sheet is fetched through ``loader`` at most once per refresh, indexed
+    by its registered builder, and then served from memory. Writes call
+    ``invalidate`` so the next read pulls a fresh copy.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, str], Awaitable[List[List[Any]]]],
+        ttl_seconds: float = 30.0,
+        batch_loader: Optional[Callable[[List[Tuple[str, str]]], Awaitable[Dict[str, List[List[Any]]]]]] = None,
+        offload=None
+    ):
+        self.loader = loader
+        self.batch_loader = batch_loader
+        # Index builders for large sheets run on this executor, off the event loop
+        self.offload = offload
+        self.ttl_seconds = ttl_seconds
+        self._ranges: Dict[str, str] = {}
+        self._builders: Dict[str, Callable[[SheetSnapshot], None]] = {}
+        self._snapshots: Dict[str, SheetSnapshot] = {}
+        self._versions: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def register(self, sheet: str, range: str, builder: Callable[[SheetSnapshot], None]):
+        """Register a sheet, the range to fetch and its index builder"""
+        self._ranges[sheet] = range
+        self._builders[sheet] = builder
+        self._versions.setdefault(sheet, 0)
+
+    def version(self, sheet: str) -> int:
+        return self._versions.get(sheet, 0)
+
+    def _is_fresh(self, snapshot: Optional[SheetSnapshot]) -> bool:
+        if snapshot is None:
+            return False
+        if snapshot.version != self._versions.get(snapshot.sheet, 0):
+            return False
+        return self.ttl_seconds <= 0 or snapshot.age() < self.ttl_seconds
+
+    async def get(self, sheet: str) -> SheetSnapshot:
+        """Return a fresh snapshot, loading it if missing, expired or invalidated"""
+        snapshot = self._snapshots.get(sheet)
+        if self._is_fresh(snapshot):
+            CACHE_EVENTS.inc(cache="sheet_snapshot", result="hit")
+            return snapshot
+
+        CACHE_EVENTS.inc(cache="sheet_snapshot", result="miss")
+        lock = self._locks.setdefault(sheet, asyncio.Lock())
+        async with lock:
+            # Another coroutine may have refreshed while we waited
+            snapshot = self._snapshots.get(sheet)
+            if self._is_fresh(snapshot):
+                return snapshot
+
+            version = self._versions.get(sheet, 0)
+            rows = await self.loader(sheet, self._ranges[sheet])
+            return await self._publish(sheet, rows, version)
+
+    async def get_many(self, sheets: List[str]) -> Dict[str, SheetSnapshot]:
+        """Return fresh snapshots for several sheets, loading stale ones in one batch"""
+        stale = [sheet for sheet in sheets if not self._is_fresh(self._snapshots.get(sheet))]
+        if len(stale) < 2 or self.batch_loader is None:
+            snapshots = await asyncio.gather(*[self.get(sheet) for sheet in sheets])
+            return dict(zip(sheets, snapshots))
+
+        # Lock in a fixed order so concurrent batches can't deadlock
+        locks = [self._locks.setdefault(sheet, asyncio.Lock()) for sheet in sorted(stale)]
+        # Entered one by one so a cancel mid-acquire releases only the locks taken
+        async with AsyncExitStack() as stack:
+            for lock in locks:
+                await stack.enter_async_context(lock)
+            stale = [sheet for sheet in stale if not self._is_fresh(self._snapshots.get(sheet))]
+            if stale:
+                versions = {sheet: self._versions.get(sheet, 0) for sheet in stale}
+                data = await self.batch_loader([(sheet, self._ranges[sheet]) for sheet in stale])
+                for sheet in stale:
+                    await self._publish(sheet, data.get(sheet) or [], versions[sheet])
+
+        snapshots = await asyncio.gather(*[self.get(sheet) for sheet in sheets])
+        return dict(zip(sheets, snapshots))
+
+    async def _publish(self, sheet: str, rows: List[List[Any]], version: int) -> SheetSnapshot:
+        snapshot = SheetSnapshot(sheet, rows[1:] if rows else [], version)  # Skip header
+        with timer(CPU_SECONDS, operation=f"index_{sheet.lower()}"):
+            if self.offload is not None:
+                await self.offload.run(self._builders[sheet], snapshot, size=snapshot.size)
+            else:
+                self._builders[sheet](snapshot)
+        # Builders keep compact records; the raw rows would double the footprint
+        snapshot.rows = []
+
+        # Only publish if no write invalidated the sheet during the fetch
+        if version == self._versions.get(sheet, 0):
+            self._snapshots[sheet] = snapshot
+        return snapshot
+
+    def invalidate(self, sheet: Optional[str] = None):
+        """Drop cached snapshots for one sheet, or all sheets"""
+        sheets = [sheet] if sheet else list(self._versions.keys())
+        for name in sheets:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._snapshots.pop(name, None)
@@ -0,0 +1,138 @@
+"""
+Sheet Records
+Compact in-memory forms of sheet rows; API models are built only when returned
+"""
+
+import sys
+import json
+from array import array
+from typing import Any, Dict, List, Tuple
+
+from models.customer import Customer, Order, Product
+
+_intern = sys.intern
+
+
+def _cell(row: List[Any], i: int, default: str = "") -> Any:
+    return row[i] if len(row) > i and row[i] else default
+
+
+class CustomerRecord:
+    """One Customers row; ``to_model`` builds the API ``Customer``"""
+
+    __slots__ = ("id", "company_name", "email", "phone", "registration_date", "total_spent", "last_order_date", "status")
+
+    def __init__(self, row: List[Any]):
+        self.id = row[0]
+        self.company_name = row[1]
+        self.email = row[2]
+        self.phone = _cell(row, 3)
+        self.registration_date = _cell(row, 4)
+        self.total_spent = float(row[5]) if len(row) > 5 and row[5] else 0.0
+        self.last_order_date = _cell(row, 6)
+        self.status = _intern(str(row[7])) if len(row) > 7 else "active"
+
+    def to_model(self) -> Customer:
+        return Customer(
+            id=self.id,
+            company_name=self.company_name,
+            email=self.email,
+            phone=self.phone,
+            registration_date=self.registration_date,
+            total_spent=self.total_spent,
+            last_order_date=self.last_order_date,
+            status=self.status
+        )
+
+
+class ProductRecord:
+    """One Products row, with category and device names interned across the catalog"""
+
+    __slots__ = ("sku", "name", "category", "price", "stock_level", "description", "compatibility", "image_url")
+
+    def __init__(self, row: List[Any]):
+        self.sku = row[0]
+        self.name = row[1]
+        self.category = _intern(str(row[2]))
+        self.price = float(row[3]) if row[3] else 0.0
+        self.stock_level = int(row[4]) if row[4] else 0
+        self.description = _cell(row, 5)
+        self.compatibility: Tuple[str, ...] = tuple(_intern(model) for model in row[6].split(',')) if len(row) > 6 and row[6] else ()
+        self.image_url = _cell(row, 7)
+
+    def to_model(self) -> Product:
+        return Product(
+            sku=self.sku,
+            name=self.name,
+            category=self.category,
+            price=self.price,
+            stock_level=self.stock_level,
+            description=self.description,
+            compatibility=list(self.compatibility),
+            image_url=self.image_url
+        )
+
+
+class OrderTable:
+    """The Orders sheet as parallel columns; an order is its position.
+
+    No per-row container is kept: ids, dates and the JSON line-item
+    columns are the sheet's own strings, customer ids and statuses are
+    interned (a few thousand distinct values over millions of rows),
+    and totals sit in a float array. Line items are decoded only when an
+    order is turned into a model. Strings aren't tracked by the cyclic
+    GC, so a large table adds almost nothing to collection passes.
+    """
+
+    __slots__ = ("ids", "customer_ids", "dates", "products", "quantities", "totals", "statuses", "tracking", "notes", "positions")
+
+    def __init__(self, rows: List[List[Any]]):
+        self.ids: List[str] = []
+        self.customer_ids: List[str] = []
+        self.dates: List[str] = []
+        self.products: List[str] = []
+        self.quantities: List[str] = []
+        self.totals = array("d")
+        self.statuses: List[str] = []
+        self.tracking: List[str] = []
+        self.notes: List[str] = []
+        self.positions: Dict[str, int] = {}
+        for row in rows:
+            if len(row) < 2 or not row[0] or row[0] in self.positions:
+                continue
+            self.positions[row[0]] = len(self.ids)
+            self.ids.append(row[0])
+            self.customer_ids.append(_intern(str(row[1])))
+            self.dates.append(_cell(row, 2))
+            self.products.append(_cell(row, 3))
+            self.quantities.append(_cell(row, 4))
+            self.totals.append(float(row[5]) if len(row) > 5 and row[5] else 0.0)
+            self.statuses.append(_intern(str(row[6])) if len(row) > 6 else "pending")
+            self.tracking.append(_cell(row, 7))
+            self.notes.append(_cell(row, 8))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def key(self, position: int) -> Tuple[str, str]:
+        """(date, order id), the pagination sort key"""
+        return (self.dates[position], self.ids[position])
+
+    def line_items(self, position: int) -> Tuple[List[Any], List[Any]]:
+        products = self.products[position]
+        quantities = self.quantities[position]
+        return (json.loads(products) if products else [], json.loads(quantities) if quantities else [])
+
+    def to_model(self, position: int) -> Order:
+        products, quantities = self.line_items(position)
+        return Order(
+            id=self.ids[position],
+            customer_id=self.customer_ids[position],
+            date=self.dates[position],
+            products=products,
+            quantities=quantities,
+            total_amount=self.totals[position],
+            status=self.statuses[position],
+            tracking_number=self.tracking[position],
+            notes=self.notes[position]
+        )
@@ -0,0 +1,177 @@
+"""
+Managed Sheets Client
+Rate-limited, retrying, coalescing wrapper around the MCP SheetsClient
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.context_loader import SingleFlight
+from services.metrics import EXTERNAL_ERRORS, EXTERNAL_SECONDS, timer
+
+logger = logging.getLogger("portal.sheets_client_pool")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Reserve ``tokens`` now and sleep until they are earned.
+
+        The balance may go negative: each caller waits out only its own
+        debt, so one slow waiter never holds up the callers behind it.
+        """
+        self._refill()
+        self._tokens -= tokens
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+def _status(error: Exception) -> Optional[int]:
+    status = (
+        getattr(error, "status_code", None)
+        or getattr(error, "http_status", None)
+        or getattr(getattr(error, "resp", None), "status", None)
+    )
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rejected(error: Exception) -> bool:
+    """Quota errors: the request was refused, so nothing was written"""
+    if _status(error) == 429:
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in ("quota", "rate limit", "ratelimit", "too many requests"))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Quota and transient server errors are worth retrying"""
+    if is_rejected(error) or _status(error) in RETRYABLE_STATUS:
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in ("timed out", "unavailable"))
+
+
+class ManagedSheetsClient:
+    """Drop-in wrapper exposing the SheetsClient methods the service uses.
+
+    Every call waits for a rate-limit token and a concurrency slot, retries
+    retryable failures with exponential backoff and full jitter, and
+    concurrent identical reads share a single request.
+    """
+
+    def __init__(
+        self,
+        client,
+        requests_per_minute: float = 60.0,
+        burst: Optional[float] = None,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 32.0
+    ):
+        self.client = client
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst or max(1.0, requests_per_minute / 6))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.flights = SingleFlight()
+        self.stats = {"requests": 0, "retries": 0, "coalesced": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls, client) -> "ManagedSheetsClient":
+        return cls(
+            client,
+            requests_per_minute=float(os.getenv('SHEETS_REQUESTS_PER_MINUTE', '60')),
+            max_concurrency=int(os.getenv('SHEETS_MAX_CONCURRENCY', '4')),
+            max_retries=int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+        )
+
+    async def _call(self, method: str, idempotent: bool = True, **kwargs) -> Any:
+        """Call ``method`` with retries.
+
+        Timeouts and 5xx errors are ambiguous: the request may have been
+        applied. Non-idempotent calls are retried only when refused outright.
+        """
+        retryable = is_retryable if idempotent else is_rejected
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            async with self.semaphore:
+                self.stats["requests"] += 1
+                try:
+                    with timer(EXTERNAL_SECONDS, EXTERNAL_ERRORS, service="sheets", operation=method):
+                        return await getattr(self.client, method)(**kwargs)
+                except Exception as e:
+                    if attempt >= self.max_retries or not retryable(e):
+                        self.stats["failures"] += 1
+                        raise
+                    error = e
+            # Back off outside the semaphore so other calls can proceed
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            logger.warning("Retrying Sheets %s in %.2fs after error: %s", method, delay, error)
+            self.stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get_sheet_data(self, spreadsheet_id: str, sheet: str, range: str) -> List[List[Any]]:
+        key = ("get_sheet_data", spreadsheet_id, sheet, range)
+        if key in self.flights:
+            self.stats["coalesced"] += 1
+        return await self.flights.do(
+            key,
+            lambda: self._call("get_sheet_data", spreadsheet_id=spreadsheet_id, sheet=sheet, range=range)
+        )
+
+    async def batch_get(self, spreadsheet_id: str, ranges: List[Tuple[str, str]]) -> Dict[str, List[List[Any]]]:
+        """Read several (sheet, range) pairs, in one request when the client supports it"""
+        if hasattr(self.client, "batch_get"):
+            key = ("batch_get", spreadsheet_id, tuple(ranges))
+            results = await self.flights.do(
+                key,
+                lambda: self._call("batch_get", spreadsheet_id=spreadsheet_id, ranges=ranges)
+            )
+            return dict(zip([sheet for sheet, _ in ranges], results))
+
+        # Fallback: one request per range, still limited and coalesced
+        results = await asyncio.gather(*[
+            self.get_sheet_data(spreadsheet_id=spreadsheet_id, sheet=sheet, range=range)
+            for sheet, range in ranges
+        ])
+        return dict(zip([sheet for sheet, _ in ranges], results))
+
+    async def batch_update(self, spreadsheet_id: str, sheet: str, ranges: Dict[str, List[List[Any]]]) -> Any:
+        """Write several A1 ranges of one sheet, in one request when the client supports it"""
+        if hasattr(self.client, "batch_update_cells"):
+            return await self._call("batch_update_cells", spreadsheet_id=spreadsheet_id, sheet=sheet, ranges=ranges)
+
+        # Fallback: one request per range
+        return await asyncio.gather(*[
+            self._call("update_cells", spreadsheet_id=spreadsheet_id, sheet=sheet, range=range, data=data)
+            for range, data in ranges.items()
+        ])
+
+    async def add_rows(self, spreadsheet_id: str, sheet: str, data: List[List[Any]]) -> Any:
+        # Writes are never coalesced, and an append that may have landed is never repeated
+        return await self._call("add_rows", idempotent=False, spreadsheet_id=spreadsheet_id, sheet=sheet, data=data)
@@ -6,7 +6,9 @@ Handles all data operations with Google Sheets
 import os
 import json
 import asyncio
-from typing import List, Dict, Any, Optional
+import logging
+from contextlib import AsyncExitStack
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 import uuid
@@ -14,10 +16,26 @@ import uuid
 # MCP Google Sheets integration
 from mcp_google_sheets import SheetsClient
 from models.customer import Customer, Order, Product
+from services.sheet_cache import SheetSnapshotCache, SheetSnapshot
+from services.write_buffer import WriteBehindBuffer
+from services.sheets_client_pool import ManagedSheetsClient
+from services.order_columns import OrderColumns
+from services.product_catalog import ProductCatalog, rows_fingerprint
+from services.compatibility_index import CompatibilityIndex
+from services.db_mirror import DatabaseMirror, MirrorSyncWorker
+from services.shared_cache import SharedCache
+from services.order_index import OrderFilter, OrderIndex
+from services.sheet_records import CustomerRecord, ProductRecord
+from services.metrics import CPU_SECONDS, SHEET_UPDATE_FAILURES, log_event, timer
+from services.offload import get_executor
+
+logger = logging.getLogger("portal.sheets_service")
+
 
 class SheetsService:
-    def __init__(self):
-        self.sheets_client = SheetsClient()
+    def __init__(self, sheets_client=None):
+        # Rate-limited, retrying client; pass a fake SheetsClient in tests
+        self.sheets_client = ManagedSheetsClient.from_env(sheets_client or SheetsClient())
         self.spreadsheet_id = os.getenv('MAIN_SPREADSHEET_ID')
         
         # Sheet names
@@ -27,178 +45,402 @@ class SheetsService:
         self.INTERACTIONS_SHEET = "Interactions"
         self.ANALYTICS_SHEET = "Analytics"
 
+        # Parsing, indexing and analytics over large sheets run off the event loop
+        self.offload = get_executor()
+
+        # Cross-worker tier (Redis); the snapshot cache below is each worker's near-cache
+        self.shared = SharedCache.from_env(offload=self.offload)
+        self.shared_ttl = float(os.getenv('SHARED_SHEETS_TTL_SECONDS', '300'))
+
+        # In-memory snapshot cache for read-heavy sheets
+        self.cache = SheetSnapshotCache(
+            loader=self._load_sheet,
+            ttl_seconds=float(os.getenv('SHEETS_CACHE_TTL_SECONDS', '30')),
+            batch_loader=self._load_sheets,
+            offload=self.offload
+        )
+        self.cache.register(self.CUSTOMERS_SHEET, "A:H", self._index_customers)
+        self.cache.register(self.ORDERS_SHEET, "A:I", self._index_orders)
+        self.cache.register(self.PRODUCTS_SHEET, "A:H", self._index_products)
+        self._catalog: Optional[ProductCatalog] = None
+        self._compatibility: Optional[CompatibilityIndex] = None
+        self._order_lock = asyncio.Lock()
+        self.order_lock_ttl = float(os.getenv('ORDER_LOCK_SECONDS', '60'))
+
+        # Write-behind buffer for sheet appends
+        self.writer = WriteBehindBuffer(
+            writer=self._flush_rows,
+            batch_size=int(os.getenv('SHEETS_WRITE_BATCH_SIZE', '50')),
+            flush_interval=float(os.getenv('SHEETS_WRITE_FLUSH_SECONDS', '1.0')),
+            max_pending=int(os.getenv('SHEETS_WRITE_MAX_PENDING', '5000')),
+            dead_letter_path=os.getenv('SHEETS_DEAD_LETTER_PATH')
+        )
+
+        # Local database mirror; Sheets stays the source of truth
+        self.mirror = DatabaseMirror.from_env()
+        self.mirror_sync = None
+        if self.mirror:
+            self.mirror_sync = MirrorSyncWorker(
+                self.mirror,
+                fetch=self._fetch_sheet_live,
+                on_change=self._sheet_changed,
+                interval=float(os.getenv('SHEETS_MIRROR_SYNC_SECONDS', '60'))
+            )
+            if self.shared:
+                # One worker polls Sheets per interval; the rest hear about changes
+                self.mirror_sync.lease = lambda: self.shared.acquire_lease("mirror-sync", self.mirror_sync.interval * 0.9)
+
+    async def start(self):
+        """Start background workers"""
+        self.writer.start()
+        if self.shared:
+            self.shared.subscribe(self._remote_invalidation)
+            self.shared.start()
+        if self.mirror_sync:
+            # Catch up on edits made while this worker was down before serving reads
+            await self.mirror_sync.sync_once()
+            self.mirror_sync.start()
+
+    async def stop(self):
+        """Flush pending writes and stop background workers"""
+        await self.writer.stop()
+        if self.mirror_sync:
+            await self.mirror_sync.stop()
+        if self.shared:
+            await self.shared.stop()
+
+    async def _sheet_changed(self, sheet: str):
+        """Drop this worker's snapshot and, when shared, everyone else's"""
+        self.cache.invalidate(sheet)
+        if self.shared:
+            await self.shared.invalidate("sheet", sheet)
+
+    def _remote_invalidation(self, namespace: str, name: str):
+        if namespace == "sheet":
+            self.cache.invalidate(name)
+
+    async def _load_sheet(self, sheet: str, range: str) -> List[List[Any]]:
+        """Snapshot loader: the shared tier first, so N workers cost one fetch"""
+        if not self.shared:
+            return await self._fetch_sheet(sheet, range)
+        return await self.shared.get_or_load("sheet", sheet, lambda: self._fetch_sheet(sheet, range), self.shared_ttl)
+
+    async def _load_sheets(self, ranges: List[Tuple[str, str]]) -> Dict[str, List[List[Any]]]:
+        """Batch snapshot loader; only sheets missing from the shared tier are fetched"""
+        if not self.shared:
+            return await self._fetch_sheets(ranges)
+        cached = {}
+        try:
+            values = await asyncio.gather(*[self.shared.get("sheet", sheet) for sheet, _ in ranges])
+            cached = {sheet: rows for (sheet, _), rows in zip(ranges, values) if rows is not None}
+        except Exception as e:
+            logger.warning("Error reading shared cache: %s", e)
+        missing = [(sheet, range) for sheet, range in ranges if sheet not in cached]
+        if missing:
+            fetched = await self._fetch_sheets(missing)
+            for sheet, _ in missing:
+                cached[sheet] = fetched.get(sheet) or []
+                try:
+                    await self.shared.set("sheet", sheet, cached[sheet], self.shared_ttl)
+                except Exception as e:
+                    logger.warning("Error writing shared cache: %s", e)
+        return cached
+
+    async def _append_rows(self, sheet: str, rows: List[List[Any]]):
+        """Append a batch of rows to a sheet in one call"""
+        await self.sheets_client.add_rows(
+            spreadsheet_id=self.spreadsheet_id,
+            sheet=sheet,
+            data=rows
+        )
+
+    async def _flush_rows(self, sheet: str, rows: List[List[Any]]):
+        """Write-behind flush: append to the sheet, then mirror the same rows"""
+        await self._append_rows(sheet, rows)
+        if self.mirror:
+            try:
+                await self.mirror.upsert_rows(sheet, rows)
+            except Exception as e:
+                # The sheet write stands; the next sync brings the mirror up to date
+                logger.error("Error mirroring %s rows to %s: %s", len(rows), sheet, e)
+
+    async def _fetch_sheet(self, sheet: str, range: str) -> List[List[Any]]:
+        """Fetch raw sheet rows, from the mirror when enabled"""
+        if self.mirror:
+            return await self.mirror.fetch_rows(sheet)
+        return await self._fetch_sheet_live(sheet, range)
+
+    async def _fetch_sheet_live(self, sheet: str, range: str) -> List[List[Any]]:
+        """Fetch raw sheet rows from Google Sheets"""
+        return await self.sheets_client.get_sheet_data(
+            spreadsheet_id=self.spreadsheet_id,
+            sheet=sheet,
+            range=range
+        )
+
+    async def _fetch_sheets(self, ranges: List[Tuple[str, str]]) -> Dict[str, List[List[Any]]]:
+        """Fetch several sheets in one batched read"""
+        if self.mirror:
+            rows = await asyncio.gather(*[self.mirror.fetch_rows(sheet) for sheet, _ in ranges])
+            return dict(zip([sheet for sheet, _ in ranges], rows))
+        return await self.sheets_client.batch_get(
+            spreadsheet_id=self.spreadsheet_id,
+            ranges=ranges
+        )
+
+    def _index_customers(self, snapshot: SheetSnapshot):
+        """Build customer id and (company, email) indexes"""
+        by_id = {}
+        by_email = {}
+        row_numbers = {}
+        for position, row in enumerate(snapshot.rows):
+            if len(row) < 3 or not row[0]:
+                continue
+            customer = CustomerRecord(row)
+            by_id.setdefault(customer.id, customer)
+            by_email.setdefault((row[1], row[2]), customer)
+            row_numbers.setdefault(customer.id, position + 2)  # Header is row 1
+        snapshot.indexes["by_id"] = by_id
+        snapshot.indexes["by_email"] = by_email
+        snapshot.indexes["row_numbers"] = row_numbers
+
+    def _index_orders(self, snapshot: SheetSnapshot):
+        """Compact order table grouped by id and customer; models are built when returned"""
+        orders = OrderIndex(snapshot.rows)
+        snapshot.indexes["orders"] = orders
+        snapshot.indexes["by_id"] = orders.by_id
+
+    def _index_products(self, snapshot: SheetSnapshot):
+        """Build the catalog search index, reusing it if the sheet is unchanged"""
+        fingerprint = rows_fingerprint(snapshot.rows)
+        if self._catalog is None or self._catalog.fingerprint != fingerprint:
+            products = [ProductRecord(row) for row in snapshot.rows if len(row) >= 6]
+            self._catalog = ProductCatalog(products, fingerprint)
+            self._compatibility = CompatibilityIndex(products)
+        snapshot.indexes["catalog"] = self._catalog
+        snapshot.indexes["compatibility"] = self._compatibility
+        row_numbers = {}
+        for position, row in enumerate(snapshot.rows):
+            if row and row[0]:
+                row_numbers.setdefault(row[0], position + 2)  # Header is row 1
+        snapshot.indexes["row_numbers"] = row_numbers
+
     async def get_customer_by_email(self, email: str, company_id: str) -> Optional[Customer]:
         """Find customer by email and company"""
         try:
-            # Get customer data from sheet
-            data = await self.sheets_client.get_sheet_data(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.CUSTOMERS_SHEET,
-                range="A:H"  # Customer columns
-            )
-            
-            for row in data[1:]:  # Skip header
-                if len(row) >= 3 and row[2] == email and row[1] == company_id:
-                    return Customer(
-                        id=row[0],
-                        company_name=row[1],
-                        email=row[2],
-                        phone=row[3] if len(row) > 3 else "",
-                        registration_date=row[4] if len(row) > 4 else "",
-                        total_spent=float(row[5]) if len(row) > 5 and row[5] else 0.0,
-                        last_order_date=row[6] if len(row) > 6 else "",
-                        status=row[7] if len(row) > 7 else "active"
-                    )
-            return None
+            if self.mirror:
+                return await self.mirror.get_customer_by_email(email, company_id)
+            snapshot = await self.cache.get(self.CUSTOMERS_SHEET)
+            customer = snapshot.index("by_email").get((company_id, email))
+            return customer.to_model() if customer else None
         except Exception as e:
-            print(f"Error getting customer by email: {e}")
+            logger.error("Error getting customer by email: %s", e)
             return None
 
     async def get_customer(self, customer_id: str) -> Optional[Customer]:
         """Get customer by ID"""
         try:
-            data = await self.sheets_client.get_sheet_data(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.CUSTOMERS_SHEET,
-                range="A:H"
-            )
-            
-            for row in data[1:]:
-                if row[0] == customer_id:
-                    return Customer(
-                        id=row[0],
-                        company_name=row[1],
-                        email=row[2],
-                        phone=row[3] if len(row) > 3 else "",
-                        registration_date=row[4] if len(row) > 4 else "",
-                        total_spent=float(row[5]) if len(row) > 5 and row[5] else 0.0,
-                        last_order_date=row[6] if len(row) > 6 else "",
-                        status=row[7] if len(row) > 7 else "active"
-                    )
-            return None
+            if self.mirror:
+                return await self.mirror.get_customer(customer_id)
+            snapshot = await self.cache.get(self.CUSTOMERS_SHEET)
+            customer = snapshot.index("by_id").get(customer_id)
+            return customer.to_model() if customer else None
         except Exception as e:
-            print(f"Error getting customer: {e}")
+            logger.error("Error getting customer: %s", e)
             return None
 
     async def get_customer_orders(self, customer_id: str, limit: int = 50) -> List[Order]:
-        """Get customer order history"""
+        """Get customer order history (newest first)"""
         try:
-            data = await self.sheets_client.get_sheet_data(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.ORDERS_SHEET,
-                range="A:I"  # Order columns
-            )
-            
-            orders = []
-            for row in data[1:]:  # Skip header
-                if len(row) >= 2 and row[1] == customer_id:
-                    orders.append(Order(
-                        id=row[0],
-                        customer_id=row[1],
-                        date=row[2] if len(row) > 2 else "",
-                        products=json.loads(row[3]) if len(row) > 3 and row[3] else [],
-                        quantities=json.loads(row[4]) if len(row) > 4 and row[4] else [],
-                        total_amount=float(row[5]) if len(row) > 5 and row[5] else 0.0,
-                        status=row[6] if len(row) > 6 else "pending",
-                        tracking_number=row[7] if len(row) > 7 else "",
-                        notes=row[8] if len(row) > 8 else ""
-                    ))
-            
-            # Sort by date descending and limit
-            orders.sort(key=lambda x: x.date, reverse=True)
-            return orders[:limit]
+            page = await self.get_customer_orders_page(customer_id, limit)
+            return page["orders"]
         except Exception as e:
-            print(f"Error getting customer orders: {e}")
+            logger.error("Error getting customer orders: %s", e)
             return []
 
+    async def get_customer_orders_page(
+        self,
+        customer_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        sku: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """One newest-first page of a customer's orders plus the next-page cursor"""
+        filters = OrderFilter(status, date_from, date_to, sku)
+        if self.mirror:
+            orders, next_cursor = await self.mirror.get_customer_orders_page(customer_id, limit, cursor, filters)
+        else:
+            snapshot = await self.cache.get(self.ORDERS_SHEET)
+            index = snapshot.indexes["orders"]
+            positions, next_cursor = index.page(customer_id, limit, cursor, filters)
+            orders = [index.table.to_model(position) for position in positions]
+        return {"orders": orders, "next_cursor": next_cursor}
+
     async def get_products(self, category: Optional[str] = None, search: Optional[str] = None) -> List[Product]:
         """Get product catalog with filtering"""
         try:
-            data = await self.sheets_client.get_sheet_data(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.PRODUCTS_SHEET,
-                range="A:H"  # Product columns
-            )
-            
-            products = []
-            for row in data[1:]:  # Skip header
-                if len(row) >= 6:
-                    product = Product(
-                        sku=row[0],
-                        name=row[1],
-                        category=row[2],
-                        price=float(row[3]) if row[3] else 0.0,
-                        stock_level=int(row[4]) if row[4] else 0,
-                        description=row[5] if len(row) > 5 else "",
-                        compatibility=row[6].split(',') if len(row) > 6 and row[6] else [],
-                        image_url=row[7] if len(row) > 7 else ""
-                    )
-                    
-                    # Apply filters
-                    if category and product.category.lower() != category.lower():
-                        continue
-                    if search and search.lower() not in product.name.lower() and search.lower() not in product.description.lower():
-                        continue
-                    
-                    products.append(product)
-            
-            return products
+            catalog = await self._product_catalog()
+            return [product.to_model() for product in catalog.search(search, category)]
         except Exception as e:
-            print(f"Error getting products: {e}")
+            logger.error("Error getting products: %s", e)
             return []
 
+    async def search_products(self, category: Optional[str] = None, search: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get one ranked page of the product catalog"""
+        catalog = await self._product_catalog()
+        page = catalog.page(search, category, limit, cursor)
+        return {**page, "products": [product.to_model() for product in page["products"]]}
+
     async def create_order(self, customer_id: str, products: List[Dict[str, Any]], notes: Optional[str] = None) -> Order:
         """Create new customer order"""
-        try:
-            order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-            current_date = datetime.now().isoformat()
-            
-            # Calculate total amount
-            total_amount = 0.0
-            product_list = []
-            quantity_list = []
-            
-            for item in products:
-                product_list.append(item['sku'])
-                quantity_list.append(item['quantity'])
-                total_amount += item['price'] * item['quantity']
-            
-            # Add order to sheet
-            order_data = [
-                order_id,
-                customer_id,
-                current_date,
-                json.dumps(product_list),
-                json.dumps(quantity_list),
-                total_amount,
-                "pending",
-                "",  # tracking number
-                notes or ""
-            ]
-            
-            await self.sheets_client.add_rows(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.ORDERS_SHEET,
-                data=[order_data]
-            )
-            
-            # Update customer total spent
-            await self._update_customer_total_spent(customer_id, total_amount)
-            
-            return Order(
-                id=order_id,
-                customer_id=customer_id,
-                date=current_date,
-                products=product_list,
-                quantities=quantity_list,
-                total_amount=total_amount,
-                status="pending",
-                tracking_number="",
-                notes=notes or ""
-            )
-        except Exception as e:
-            print(f"Error creating order: {e}")
-            raise
+        result = await self.create_orders([{"customer_id": customer_id, "products": products, "notes": notes}])
+        if result["errors"]:
+            raise ValueError(result["errors"][0]["error"])
+        return result["orders"][0]
+
+    async def create_orders(self, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Validate, price and write many orders in one append plus one update per sheet.
+
+        SKUs and quantities are checked against the catalog snapshot and
+        prices come from the catalog, never the client. Stock levels and
+        customer totals are read live from Sheets and written back while
+        holding this worker's lock plus, with Redis, a lock shared by all
+        workers, so concurrent batches can't oversell or overwrite each
+        other's totals. Orders that fail validation are reported by index
+        and the rest are still placed; ``update_errors`` lists sheets whose
+        stock or total update failed after the orders were appended.
+        """
+        async with self._order_lock, AsyncExitStack() as stack:
+            if self.shared:
+                await stack.enter_async_context(self.shared.lock("create-orders", self.order_lock_ttl))
+            try:
+                catalog = await self._product_catalog()
+                customer_ids = list(dict.fromkeys(order.get("customer_id", "") for order in orders))
+                found = await asyncio.gather(*[self.get_customer(customer_id) for customer_id in customer_ids])
+                customers = {customer_id: customer for customer_id, customer in zip(customer_ids, found) if customer}
+                levels, totals = await self._live_levels()
+
+                stock: Dict[str, int] = {}
+                spent: Dict[str, float] = {}
+                last_dates: Dict[str, str] = {}
+                created: List[Order] = []
+                errors: List[Dict[str, Any]] = []
+                rows: List[List[Any]] = []
+                current_date = datetime.now().isoformat()
+
+                for index, request in enumerate(orders):
+                    try:
+                        customer_id = request.get("customer_id", "")
+                        if customer_id not in customers:
+                            raise ValueError(f"Customer {customer_id} not found")
+                        product_list, quantity_list, total_amount = self._price_order(request.get("products") or [], catalog, stock, levels)
+                    except ValueError as e:
+                        errors.append({"index": index, "error": str(e)})
+                        continue
+
+                    current = totals[customer_id][1] if customer_id in totals else customers[customer_id].total_spent
+                    spent[customer_id] = spent.get(customer_id, current) + total_amount
+                    last_dates[customer_id] = current_date
+                    order = Order(
+                        id=f"ORD-{uuid.uuid4().hex[:8].upper()}",
+                        customer_id=customer_id,
+                        date=current_date,
+                        products=product_list,
+                        quantities=quantity_list,
+                        total_amount=total_amount,
+                        status="pending",
+                        tracking_number="",
+                        notes=request.get("notes") or ""
+                    )
+                    created.append(order)
+                    rows.append([
+                        order.id,
+                        order.customer_id,
+                        order.date,
+                        json.dumps(product_list),
+                        json.dumps(quantity_list),
+                        total_amount,
+                        order.status,
+                        "",  # tracking number
+                        order.notes
+                    ])
+
+                update_errors: List[Dict[str, Any]] = []
+                if rows:
+                    # One append for every order, then the totals and stock updates side by side
+                    await self._append_rows(self.ORDERS_SHEET, rows)
+                    failures = await asyncio.gather(
+                        self._update_customer_totals(customers, spent, last_dates, totals),
+                        self._update_stock_levels(catalog, stock, levels)
+                    )
+                    update_errors = [failure for failure in failures if failure]
+                    if self.mirror:
+                        await self.mirror.upsert_rows(self.ORDERS_SHEET, rows)
+                    # Awaited, so other workers drop their copies before the lock is released
+                    await asyncio.gather(*[
+                        self._sheet_changed(sheet) for sheet in (self.ORDERS_SHEET, self.CUSTOMERS_SHEET, self.PRODUCTS_SHEET)
+                    ])
+                    if self.shared:
+                        # Other workers rebuild these customers' AI context
+                        for customer_id in spent:
+                            await self.shared.publish("customer", customer_id)
+
+                return {"orders": created, "errors": errors, "update_errors": update_errors}
+            except Exception as e:
+                logger.error("Error creating orders: %s", e)
+                raise
+
+    async def _live_levels(self) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, Tuple[int, float]]]:
+        """(sheet row, current value) of stock per SKU and total spent per customer, read from Sheets.
+
+        Snapshots (and the mirror) may lag other workers' orders, so values
+        that are written back as absolutes are always read fresh.
+        """
+        data = await self.sheets_client.batch_get(
+            spreadsheet_id=self.spreadsheet_id,
+            ranges=[(self.PRODUCTS_SHEET, "A:E"), (self.CUSTOMERS_SHEET, "A:F")]
+        )
+        levels: Dict[str, Tuple[int, int]] = {}
+        for position, row in enumerate(data.get(self.PRODUCTS_SHEET) or []):
+            if position > 0 and row and row[0] and row[0] not in levels:
+                levels[row[0]] = (position + 1, int(float(row[4])) if len(row) > 4 and row[4] not in ("", None) else 0)
+        totals: Dict[str, Tuple[int, float]] = {}
+        for position, row in enumerate(data.get(self.CUSTOMERS_SHEET) or []):
+            if position > 0 and row and row[0] and row[0] not in totals:
+                totals[row[0]] = (position + 1, float(row[5]) if len(row) > 5 and row[5] not in ("", None) else 0.0)
+        return levels, totals
+
+    def _price_order(self, items: List[Dict[str, Any]], catalog: ProductCatalog, stock: Dict[str, int], levels: Dict[str, Tuple[int, int]]) -> Tuple[List[str], List[int], float]:
+        """Catalog-priced SKUs, quantities and total; reserves stock in ``stock`` only if every line fits"""
+        if not items:
+            raise ValueError("Order has no products")
+        requested: Dict[str, int] = {}
+        for item in items:
+            sku = item.get("sku")
+            try:
+                quantity = int(item.get("quantity", 0))
+            except (TypeError, ValueError):
+                quantity = 0
+            if sku not in catalog.by_sku or sku not in levels:
+                raise ValueError(f"Unknown SKU {sku}")
+            if quantity <= 0:
+                raise ValueError(f"Invalid quantity for {sku}")
+            requested[sku] = requested.get(sku, 0) + quantity
+
+        for sku, quantity in requested.items():
+            available = stock.get(sku, levels[sku][1])
+            if quantity > available:
+                raise ValueError(f"Insufficient stock for {sku}: {available} available")
+        for sku, quantity in requested.items():
+            stock[sku] = stock.get(sku, levels[sku][1]) - quantity
+
+        product_list = [item["sku"] for item in items]
+        quantity_list = [int(item["quantity"]) for item in items]
+        total_amount = round(sum(catalog.by_sku[sku].price * quantity for sku, quantity in zip(product_list, quantity_list)), 2)
+        return product_list, quantity_list, total_amount
 
     async def log_interaction(self, customer_id: str, query: str, response: str, session_id: Optional[str] = None):
         """Log customer interaction"""
@@ -213,123 +455,172 @@ class SheetsService:
                 ""  # satisfaction score - to be filled later
             ]
             
-            await self.sheets_client.add_rows(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.INTERACTIONS_SHEET,
-                data=[interaction_data]
-            )
+            # Buffered; flushed (and mirrored) in batches by the write-behind worker
+            await self.writer.enqueue(self.INTERACTIONS_SHEET, interaction_data)
         except Exception as e:
-            print(f"Error logging interaction: {e}")
+            logger.error("Error logging interaction: %s", e)
 
     async def get_customer_analytics(self, customer_id: str) -> Dict[str, Any]:
         """Get customer analytics and insights"""
         try:
-            orders = await self.get_customer_orders(customer_id, 100)
-            
-            if not orders:
-                return {"total_orders": 0, "total_spent": 0, "avg_order_value": 0}
-            
-            total_spent = sum(order.total_amount for order in orders)
-            avg_order_value = total_spent / len(orders)
-            
-            # Calculate trends
-            recent_orders = [o for o in orders if self._is_recent(o.date, 30)]
-            monthly_spend = sum(order.total_amount for order in recent_orders)
-            
-            # Product preferences
-            product_counts = {}
-            for order in orders:
-                for product in order.products:
-                    product_counts[product] = product_counts.get(product, 0) + 1
-            
-            top_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-            
-            return {
-                "total_orders": len(orders),
-                "total_spent": total_spent,
-                "avg_order_value": avg_order_value,
-                "monthly_spend": monthly_spend,
-                "top_products": top_products,
-                "last_order_date": orders[0].date if orders else None,
-                "customer_since": orders[-1].date if orders else None
-            }
+            columns = await self._order_columns()
+            return columns.customer_summary(customer_id)
         except Exception as e:
-            print(f"Error getting customer analytics: {e}")
+            logger.error("Error getting customer analytics: %s", e)
             return {}
 
     async def check_compatibility(self, sku: str, device_model: str) -> Dict[str, Any]:
         """Check product compatibility with device"""
         try:
-            products = await self.get_products()
-            
-            for product in products:
-                if product.sku == sku:
-                    is_compatible = any(device_model.lower() in comp.lower() for comp in product.compatibility)
-                    return {
-                        "compatible": is_compatible,
-                        "product_name": product.name,
-                        "supported_devices": product.compatibility
-                    }
-            
-            return {"compatible": False, "error": "Product not found"}
+            index = await self.get_compatibility_index()
+            return index.check(sku, device_model)
         except Exception as e:
-            print(f"Error checking compatibility: {e}")
+            logger.error("Error checking compatibility: %s", e)
             return {"compatible": False, "error": str(e)}
 
-    async def get_order_tracking(self, order_id: str) -> Dict[str, Any]:
-        """Get order tracking information"""
+    async def check_compatibility_batch(self, checks: List[Dict[str, str]], device_models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Check many SKU/device pairs and list accessories for devices in one call"""
         try:
-            data = await self.sheets_client.get_sheet_data(
-                spreadsheet_id=self.spreadsheet_id,
-                sheet=self.ORDERS_SHEET,
-                range="A:I"
-            )
+            index = await self.get_compatibility_index()
+            return {
+                "results": [
+                    {"sku": check["sku"], "device_model": check["device_model"], **index.check(check["sku"], check["device_model"])}
+                    for check in checks
+                ],
+                "accessories": {
+                    device_model: [product.to_model() for product in index.products_for_device(device_model)]
+                    for device_model in device_models or []
+                }
+            }
+        except Exception as e:
+            logger.error("Error checking compatibility batch: %s", e)
+            return {"results": [], "accessories": {}, "error": str(e)}
+
+    async def get_order(self, order_id: str) -> Optional[Order]:
+        """Get a single order by ID"""
+        try:
+            if self.mirror:
+                return await self.mirror.get_order(order_id)
+            snapshot = await self.cache.get(self.ORDERS_SHEET)
+            position = snapshot.index("by_id").get(order_id)
+            return snapshot.indexes["orders"].table.to_model(position) if position is not None else None
+        except Exception as e:
+            logger.error("Error getting order: %s", e)
+            return None
+
+    async def get_interaction_queries(self, limit: int = 5000) -> List[str]:
+        """Most recent logged customer queries, for training the intent model"""
+        try:
+            data = await self._fetch_sheet(self.INTERACTIONS_SHEET, "A:G")
+            return [row[3] for row in data[1:][-limit:] if len(row) > 3 and row[3]]
+        except Exception as e:
+            logger.error("Error getting interaction queries: %s", e)
+            return []
+
+    async def get_order_tracking(self, order_id: str, customer_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get order tracking information, limited to ``customer_id``'s orders when given"""
+        try:
+            order = await self.get_order(order_id)
             
-            for row in data[1:]:
-                if row[0] == order_id:
-                    return {
-                        "order_id": row[0],
-                        "status": row[6] if len(row) > 6 else "pending",
-                        "tracking_number": row[7] if len(row) > 7 else "",
-                        "estimated_delivery": self._calculate_delivery_date(row[2] if len(row) > 2 else ""),
-                        "order_date": row[2] if len(row) > 2 else ""
-                    }
+            if order and (customer_id is None or order.customer_id == customer_id):
+                return {
+                    "order_id": order.id,
+                    "status": order.status,
+                    "tracking_number": order.tracking_number,
+                    "estimated_delivery": self._calculate_delivery_date(order.date),
+                    "order_date": order.date
+                }
             
             return {"error": "Order not found"}
         except Exception as e:
-            print(f"Error getting order tracking: {e}")
+            logger.error("Error getting order tracking: %s", e)
             return {"error": str(e)}
 
     async def get_dashboard_analytics(self) -> Dict[str, Any]:
         """Get business dashboard analytics"""
         try:
-            # This would aggregate data across all customers
-            # Implementation depends on specific business metrics needed
-            return {
-                "total_customers": 0,
-                "total_orders": 0,
-                "total_revenue": 0,
-                "avg_order_value": 0,
-                "top_products": [],
-                "recent_activity": []
-            }
+            customers, columns = await asyncio.gather(
+                self.cache.get(self.CUSTOMERS_SHEET),
+                self._order_columns()
+            )
+            return await self.offload.run(columns.dashboard, len(customers.index("by_id")), size=len(columns))
         except Exception as e:
-            print(f"Error getting dashboard analytics: {e}")
+            logger.error("Error getting dashboard analytics: %s", e)
             return {}
 
     # Helper methods
-    async def _update_customer_total_spent(self, customer_id: str, amount: float):
-        """Update customer's total spent amount"""
-        # Implementation to update customer record
-        pass
+    async def _product_catalog(self) -> ProductCatalog:
+        snapshot = await self.cache.get(self.PRODUCTS_SHEET)
+        return snapshot.indexes["catalog"]
+
+    async def get_compatibility_index(self) -> CompatibilityIndex:
+        """Prebuilt SKU/device compatibility index for the current catalog"""
+        snapshot = await self.cache.get(self.PRODUCTS_SHEET)
+        return snapshot.indexes["compatibility"]
+
+    async def _order_columns(self) -> OrderColumns:
+        """Columnar view of the current Orders snapshot, built once per snapshot"""
+        snapshot = await self.cache.get(self.ORDERS_SHEET)
+        return await snapshot.derived_async("columns", self._build_order_columns, self.offload)
+
+    def _build_order_columns(self, snapshot: SheetSnapshot) -> OrderColumns:
+        with timer(CPU_SECONDS, operation="order_columns"):
+            return OrderColumns.from_table(snapshot.indexes["orders"].table)
+
+    async def _update_customer_totals(self, customers: Dict[str, Customer], spent: Dict[str, float], last_dates: Dict[str, str], totals: Dict[str, Tuple[int, float]]) -> Optional[Dict[str, str]]:
+        """Write new totals and last order dates for every touched customer in one batched update"""
+        if not spent:
+            return None
+        ranges = {}
+        for customer_id, total in spent.items():
+            if customer_id in totals:
+                row = totals[customer_id][0]
+                ranges[f"F{row}:G{row}"] = [[round(total, 2), last_dates[customer_id]]]
+        failure = await self._update_ranges(self.CUSTOMERS_SHEET, ranges)
+        if self.mirror and not failure:
+            rows = []
+            for customer_id, total in spent.items():
+                customer = customers[customer_id]
+                rows.append([
+                    customer.id, customer.company_name, customer.email, customer.phone, customer.registration_date,
+                    round(total, 2), last_dates[customer_id], customer.status
+                ])
+            await self.mirror.upsert_rows(self.CUSTOMERS_SHEET, rows)
+        return failure
 
-    def _is_recent(self, date_str: str, days: int) -> bool:
-        """Check if date is within recent days"""
+    async def _update_stock_levels(self, catalog: ProductCatalog, stock: Dict[str, int], levels: Dict[str, Tuple[int, int]]) -> Optional[Dict[str, str]]:
+        """Write remaining stock for every ordered SKU in one batched update"""
+        if not stock:
+            return None
+        ranges = {f"E{levels[sku][0]}": [[level]] for sku, level in stock.items() if sku in levels}
+        failure = await self._update_ranges(self.PRODUCTS_SHEET, ranges)
+        if self.mirror and not failure:
+            rows = []
+            for sku, level in stock.items():
+                product = catalog.by_sku[sku]
+                rows.append([
+                    product.sku, product.name, product.category, product.price, level,
+                    product.description, ",".join(product.compatibility), product.image_url
+                ])
+            await self.mirror.upsert_rows(self.PRODUCTS_SHEET, rows)
+        return failure
+
+    async def _update_ranges(self, sheet: str, ranges: Dict[str, List[List[Any]]]) -> Optional[Dict[str, str]]:
+        """Batched cell update; orders already appended stand even if this fails, so the failure is returned"""
+        if not ranges:
+            return None
         try:
-            date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            return (datetime.now() - date).days <= days
-        except:
-            return False
+            await self.sheets_client.batch_update(
+                spreadsheet_id=self.spreadsheet_id,
+                sheet=sheet,
+                ranges=ranges
+            )
+        except Exception as e:
+            SHEET_UPDATE_FAILURES.inc(sheet=sheet)
+            # The cells now disagree with the appended orders until someone fixes them
+            log_event("sheet_update_failed", logging.ERROR, sheet=sheet, ranges=ranges, error=str(e))
+            return {"sheet": sheet, "error": str(e)}
+        return None
 
     def _calculate_delivery_date(self, order_date: str) -> str:
         """Calculate estimated delivery date"""
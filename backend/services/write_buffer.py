@@ -0,0 +1,187 @@
+"""
+Write-Behind Buffer
+Batches sheet appends so many rows share one add_rows round trip
+"""
+
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.metrics import WRITE_BUFFER_DROPPED, log_event
+from services.sheets_client_pool import is_rejected
+
+logger = logging.getLogger("portal.write_buffer")
+
+
+class WriteBehindBuffer:
+    """Per-sheet append buffer flushed by size or time window.
+
+    ``enqueue`` returns as soon as the row is buffered unless ``wait=True``,
+    in which case it resolves once the row's batch has been written. The
+    total number of buffered rows is capped at ``max_pending``; producers
+    wait for space when the cap is hit (backpressure).
+
+    Only failures where the write was refused (``retryable``) are retried,
+    since a timed-out append may have landed. A batch still refused after
+    ``max_retries`` is kept for the next flush while at most
+    ``max_retained`` rows are buffered; anything else that fails is dropped,
+    logged row by row at ERROR, counted in ``WRITE_BUFFER_DROPPED`` and,
+    with ``dead_letter_path`` set, appended there as JSON lines for replay.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[str, List[List[Any]]], Awaitable[Any]],
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_pending: int = 5000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_retained: int = 1000,
+        retryable: Callable[[Exception], bool] = is_rejected,
+        dead_letter_path: Optional[str] = None
+    ):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retained = max_retained
+        self.retryable = retryable
+        self.dead_letter_path = dead_letter_path
+        self.stats = {"written": 0, "retained": 0, "dropped": 0}
+
+        self._pending: Dict[str, List[Tuple[List[Any], Optional[asyncio.Future]]]] = {}
+        self._count = 0
+        self._space = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        return self._count
+
+    def start(self):
+        """Start the background flusher on the running loop"""
+        if self._closing:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        self._closing = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+        # Rows still refused at shutdown have nowhere left to go
+        for sheet, entries in list(self._pending.items()):
+            self._drop(sheet, entries, "shutdown", None)
+        self._pending.clear()
+        self._count = 0
+
+    async def enqueue(self, sheet: str, row: List[Any], wait: bool = False):
+        """Buffer a row for ``sheet``; optionally wait until it is written"""
+        self.start()
+        future = None
+        async with self._space:
+            await self._space.wait_for(lambda: self._count < self.max_pending)
+            if wait:
+                future = asyncio.get_running_loop().create_future()
+            entries = self._pending.setdefault(sheet, [])
+            entries.append((row, future))
+            self._count += 1
+            if len(entries) >= self.batch_size or wait:
+                self._wakeup.set()
+        if self._closing:
+            # No flusher after shutdown; write through
+            await self.flush()
+        if future:
+            await future
+
+    async def flush(self):
+        """Write all buffered rows, one add_rows call per sheet batch"""
+        async with self._flush_lock:
+            for sheet in list(self._pending.keys()):
+                entries = self._pending.pop(sheet, [])
+                while entries:
+                    batch, entries = entries[:self.batch_size], entries[self.batch_size:]
+                    if not await self._write_batch(sheet, batch):
+                        # Kept for the next flush, ahead of rows queued since
+                        self._pending[sheet] = batch + entries + self._pending.get(sheet, [])
+                        break
+                    async with self._space:
+                        self._count -= len(batch)
+                        self._space.notify_all()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write_batch(self, sheet: str, batch: List[Tuple[List[Any], Optional[asyncio.Future]]]) -> bool:
+        """Write one batch; False when it was refused and should be kept for the next flush"""
+        rows = [row for row, _ in batch]
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.writer(sheet, rows)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if not self.retryable(e) or attempt >= self.max_retries:
+                    break
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+
+        if error is None:
+            self.stats["written"] += len(rows)
+            self._settle(batch, None)
+            return True
+
+        logger.error("Error flushing %s rows to %s: %s", len(rows), sheet, error)
+        if self.retryable(error) and not self._closing and self._count <= self.max_retained:
+            self.stats["retained"] += len(rows)
+            return False
+        self._drop(sheet, batch, "refused" if self.retryable(error) else "unconfirmed", error)
+        return True
+
+    def _drop(self, sheet: str, batch: List[Tuple[List[Any], Optional[asyncio.Future]]], reason: str, error: Optional[Exception]):
+        """Give up on ``batch``; the rows are logged so they can be replayed by hand"""
+        self.stats["dropped"] += len(batch)
+        WRITE_BUFFER_DROPPED.inc(len(batch), sheet=sheet, reason=reason)
+        detail = str(error) if error else None
+        for row, _ in batch:
+            # ERROR, so the rows show up even where logging isn't configured
+            log_event("write_buffer_dropped", logging.ERROR, sheet=sheet, reason=reason, error=detail, row=row)
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a") as f:
+                    for row, _ in batch:
+                        f.write(json.dumps({"ts": round(time.time(), 3), "sheet": sheet, "reason": reason, "error": detail, "row": row}, default=str) + "\n")
+            except OSError as e:
+                logger.error("Error writing %s dropped rows to %s: %s", len(batch), self.dead_letter_path, e)
+        self._settle(batch, error or RuntimeError(f"{sheet} rows dropped at {reason}"))
+
+    def _settle(self, batch: List[Tuple[List[Any], Optional[asyncio.Future]]], error: Optional[Exception]):
+        for _, future in batch:
+            if future is None or future.done():
+                continue
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": self._count}
@@ -0,0 +1,105 @@
+"""
+Test Configuration
+Makes the backend packages importable and stands in for modules the tests never exercise
+"""
+
+import os
+import sys
+import types
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def _missing(name: str) -> bool:
+    try:
+        __import__(name)
+        return False
+    except ImportError:
+        return True
+
+
+def _install(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    if "." in name:
+        parent, _, child = name.rpartition(".")
+        setattr(sys.modules.get(parent) or _install(parent, __path__=[]), child, module)
+    return module
+
+
+# API models: the services read attributes only, so plain dataclasses are enough
+if _missing("models.customer"):
+    @dataclass
+    class Customer:
+        id: str
+        company_name: str = ""
+        email: str = ""
+        phone: Optional[str] = ""
+        registration_date: str = ""
+        total_spent: float = 0.0
+        last_order_date: Optional[str] = ""
+        status: str = "active"
+
+    @dataclass
+    class Order:
+        id: str
+        customer_id: str = ""
+        date: str = ""
+        products: List[Any] = field(default_factory=list)
+        quantities: List[Any] = field(default_factory=list)
+        total_amount: float = 0.0
+        status: str = "pending"
+        tracking_number: Optional[str] = ""
+        notes: Optional[str] = ""
+
+    @dataclass
+    class Product:
+        sku: str
+        name: str = ""
+        category: str = ""
+        price: float = 0.0
+        stock_level: int = 0
+        description: str = ""
+        compatibility: List[str] = field(default_factory=list)
+        image_url: Optional[str] = ""
+
+    @dataclass
+    class ChatMessage:
+        message: str
+        session_id: Optional[str] = None
+
+    _install("models.customer", Customer=Customer, Order=Order, Product=Product, ChatMessage=ChatMessage)
+
+# External clients: tests pass fakes, so only the import names have to exist
+if _missing("mcp_google_sheets"):
+    class SheetsClient:
+        def __getattr__(self, name):
+            raise RuntimeError("No Google Sheets client in tests; pass a fake")
+
+    _install("mcp_google_sheets", SheetsClient=SheetsClient)
+
+if _missing("openai"):
+    class ChatCompletion:
+        @staticmethod
+        async def acreate(**kwargs):
+            raise RuntimeError("No OpenAI client in tests; pass a fake")
+
+    _install("openai", api_key=None, api_base=None, ChatCompletion=ChatCompletion)
+
+if _missing("elevenlabs"):
+    class Voice:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    class VoiceSettings(Voice):
+        pass
+
+    def generate(*args, **kwargs):
+        raise RuntimeError("No ElevenLabs client in tests; pass a fake")
+
+    _install("elevenlabs", generate=generate, set_api_key=lambda key: None, Voice=Voice, VoiceSettings=VoiceSettings)
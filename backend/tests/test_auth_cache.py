@@ -0,0 +1,124 @@
+"""
+Auth Cache Tests
+Claims helpers and the verified-token cache
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from services.auth_cache import TokenCache, claims_customer_id, claims_is_staff
+from services.shared_cache import SharedCache, connect
+
+
+@pytest.mark.parametrize("claims, staff", [
+    ({"sub": "C1", "role": "admin"}, True),
+    ({"sub": "C1", "roles": ["customer", "staff"]}, True),
+    ({"sub": "C1", "roles": "customer staff"}, True),
+    ({"sub": "C1", "role": "customer"}, False),
+    ({"sub": "C1"}, False),
+    ("C1", False),
+    (None, False),
+])
+def test_staff_claims(claims, staff):
+    assert claims_is_staff(claims) is staff
+
+
+def test_customer_id_from_claims():
+    assert claims_customer_id({"customer_id": "C1", "sub": "user-9"}) == "C1"
+    assert claims_customer_id({"sub": 42}) == "42"
+    assert claims_customer_id("C2") == "C2"
+    assert claims_customer_id({}) is None
+
+
+class Verifier:
+    """Decodes ``customer:iat[:exp]`` tokens and counts how often it runs"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        if token.startswith("bad"):
+            raise ValueError("Invalid token")
+        customer_id, iat, *exp = token.split(":")
+        claims = {"sub": customer_id, "iat": float(iat)}
+        if exp:
+            claims["exp"] = float(exp[0])
+        return claims
+
+
+def test_verified_claims_are_reused_until_the_ttl():
+    verifier = Verifier()
+    cache = TokenCache(verifier, ttl_seconds=300)
+    token = f"C1:{time.time()}"
+
+    async def scenario():
+        first = await cache.verify(token)
+        assert await cache.verify(token) is first
+        cache._entries[next(iter(cache._entries))] = (time.monotonic() - 1, first)
+        await cache.verify(token)
+
+    asyncio.run(scenario())
+    assert verifier.calls == 2
+    assert cache.stats["hits"] == 1
+
+
+def test_failed_and_expired_tokens_are_not_cached():
+    verifier = Verifier()
+    cache = TokenCache(verifier, ttl_seconds=300)
+    expired = f"C1:{time.time() - 60}:{time.time() - 1}"
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await cache.verify("bad-token")
+            await cache.verify(expired)
+
+    asyncio.run(scenario())
+    assert verifier.calls == 4
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_revoked_token_is_rejected_at_once():
+    cache = TokenCache(Verifier())
+    token = f"C1:{time.time()}"
+
+    async def scenario():
+        claims = await cache.verify(token)
+        await cache.revoke(token, claims)
+        with pytest.raises(ValueError, match="revoked"):
+            await cache.verify(token)
+
+    asyncio.run(scenario())
+
+
+def test_customer_revocation_voids_earlier_tokens_only():
+    cache = TokenCache(Verifier())
+    earlier, other = f"C1:{time.time() - 5}", f"C2:{time.time() - 5}"
+
+    async def scenario():
+        await cache.verify(earlier)
+        await cache.revoke_customer("C1")
+        with pytest.raises(ValueError, match="revoked"):
+            await cache.verify(earlier)
+        await cache.verify(other)
+        await cache.verify(f"C1:{time.time() + 1}")
+
+    asyncio.run(scenario())
+
+
+def test_revocations_reach_workers_that_start_later():
+    token = f"C1:{time.time()}"
+
+    async def scenario():
+        redis = connect("memory://auth-cache")
+        first = TokenCache(Verifier(), shared=SharedCache(redis))
+        await first.revoke(token, await first.verify(token))
+        # A worker started afterwards never heard the broadcast
+        later = TokenCache(Verifier(), shared=SharedCache(redis))
+        with pytest.raises(ValueError, match="revoked"):
+            await later.verify(token)
+
+    asyncio.run(scenario())
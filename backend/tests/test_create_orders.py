@@ -0,0 +1,173 @@
+"""
+Bulk Order Tests
+Catalog pricing, stock reservation and the sheet writes made by create_orders
+"""
+
+import asyncio
+
+import pytest
+
+from benchmarks.data import HEADERS
+from benchmarks.fakes import FakeSheetsClient, LatencyModel
+
+
+@pytest.fixture
+def sheets():
+    return {
+        "Customers": [
+            HEADERS["Customers"],
+            ["C1", "Acme", "ops@acme.test", "", "2023-01-01", "100.00", "2024-01-01", "active"],
+            ["C2", "Globex", "buy@globex.test", "", "2023-02-01", "0", "", "active"],
+        ],
+        "Orders": [HEADERS["Orders"]],
+        "Products": [
+            HEADERS["Products"],
+            ["SKU-1", "USB-C Cable", "Cables", "12.50", "10", "Braided cable", "iPhone 15", ""],
+            ["SKU-2", "Wall Charger", "Chargers", "30.00", "5", "Fast charger", "Pixel 8", ""],
+        ],
+        "Interactions": [HEADERS["Interactions"]],
+    }
+
+
+@pytest.fixture
+def service_env(monkeypatch):
+    monkeypatch.setenv("MAIN_SPREADSHEET_ID", "test")
+    monkeypatch.setenv("SHEETS_MIRROR_ENABLED", "false")
+    monkeypatch.setenv("SHEETS_REQUESTS_PER_MINUTE", "100000")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+
+
+def run_with_service(sheets, scenario):
+    from services.sheets_service import SheetsService
+
+    async def main():
+        service = SheetsService(sheets_client=FakeSheetsClient(sheets))
+        await service.start()
+        try:
+            return await scenario(service)
+        finally:
+            await service.stop()
+
+    return asyncio.run(main())
+
+
+def test_prices_come_from_the_catalog(sheets, service_env):
+    async def scenario(service):
+        return await service.create_orders([
+            {"customer_id": "C1", "products": [{"sku": "SKU-1", "quantity": 2, "price": 0.01}, {"sku": "SKU-2", "quantity": 1}]}
+        ])
+
+    result = run_with_service(sheets, scenario)
+    assert result["errors"] == []
+    [order] = result["orders"]
+    assert order.total_amount == 55.0
+    assert (order.products, order.quantities) == (["SKU-1", "SKU-2"], [2, 1])
+    assert sheets["Orders"][1][:2] == [order.id, "C1"]
+    assert sheets["Orders"][1][5] == 55.0
+
+
+def test_stock_and_totals_are_updated_across_a_batch(sheets, service_env):
+    async def scenario(service):
+        return await service.create_orders([
+            {"customer_id": "C1", "products": [{"sku": "SKU-1", "quantity": 4}]},
+            {"customer_id": "C1", "products": [{"sku": "SKU-1", "quantity": 4}, {"sku": "SKU-2", "quantity": 5}]},
+            {"customer_id": "C2", "products": [{"sku": "SKU-1", "quantity": 4}]},
+        ])
+
+    result = run_with_service(sheets, scenario)
+    assert [order.total_amount for order in result["orders"]] == [50.0, 200.0]
+    assert result["errors"] == [{"index": 2, "error": "Insufficient stock for SKU-1: 2 available"}]
+    # One append for both orders, then remaining stock and running totals
+    assert len(sheets["Orders"]) == 3
+    assert [row[4] for row in sheets["Products"][1:]] == [2, 0]
+    assert sheets["Customers"][1][5] == 350.0
+    assert sheets["Customers"][2][5] == "0"
+
+
+def test_invalid_orders_are_reported_by_index(sheets, service_env):
+    async def scenario(service):
+        return await service.create_orders([
+            {"customer_id": "NOPE", "products": [{"sku": "SKU-1", "quantity": 1}]},
+            {"customer_id": "C1", "products": [{"sku": "SKU-X", "quantity": 1}]},
+            {"customer_id": "C1", "products": [{"sku": "SKU-1", "quantity": 0}]},
+            {"customer_id": "C1", "products": []},
+            {"customer_id": "C1", "products": [{"sku": "SKU-2", "quantity": 1}]},
+        ])
+
+    result = run_with_service(sheets, scenario)
+    assert [error["index"] for error in result["errors"]] == [0, 1, 2, 3]
+    assert "not found" in result["errors"][0]["error"]
+    assert [order.products for order in result["orders"]] == [["SKU-2"]]
+    assert [row[4] for row in sheets["Products"][1:]] == ["10", 4]
+
+
+def test_next_batch_sees_the_updated_stock(sheets, service_env):
+    async def scenario(service):
+        await service.create_order("C1", [{"sku": "SKU-2", "quantity": 5}])
+        with pytest.raises(ValueError, match="Insufficient stock"):
+            await service.create_order("C2", [{"sku": "SKU-2", "quantity": 1}])
+        customer = await service.get_customer("C1")
+        return customer.total_spent
+
+    assert run_with_service(sheets, scenario) == 250.0
+    assert len(sheets["Orders"]) == 2
+
+
+def test_a_stale_snapshot_does_not_oversell(sheets, service_env):
+    from services.sheets_service import SheetsService
+
+    async def main():
+        client = FakeSheetsClient(sheets)
+        first, second = SheetsService(sheets_client=client), SheetsService(sheets_client=client)
+        # Both workers have the catalog cached before either sells anything
+        await asyncio.gather(first.get_products(), second.get_products())
+        await first.create_order("C1", [{"sku": "SKU-2", "quantity": 4}])
+        return await second.create_orders([{"customer_id": "C1", "products": [{"sku": "SKU-2", "quantity": 4}]}])
+
+    result = asyncio.run(main())
+    assert result["errors"] == [{"index": 0, "error": "Insufficient stock for SKU-2: 1 available"}]
+    assert sheets["Products"][2][4] == 1
+    assert sheets["Customers"][1][5] == 220.0
+
+
+def test_workers_sharing_redis_sell_the_last_unit_once(sheets, service_env, monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "memory://create-orders")
+    sheets["Products"][2][4] = "1"
+    from services.sheets_service import SheetsService
+
+    async def main():
+        # Latency lets both workers' reads land before either write
+        client = FakeSheetsClient(sheets, latency=LatencyModel(base=0.01))
+        workers = [SheetsService(sheets_client=client) for _ in range(2)]
+        await asyncio.gather(*[worker.get_products() for worker in workers], *[worker.get_customer("C1") for worker in workers])
+        return await asyncio.gather(*[
+            worker.create_orders([{"customer_id": customer_id, "products": [{"sku": "SKU-2", "quantity": 1}]}])
+            for worker, customer_id in zip(workers, ["C1", "C2"])
+        ])
+
+    results = asyncio.run(main())
+    assert sorted(len(result["orders"]) for result in results) == [0, 1]
+    assert sheets["Products"][2][4] == 0
+    assert len(sheets["Orders"]) == 2
+
+
+def test_failed_updates_are_reported(sheets, service_env):
+    class FailingUpdates(FakeSheetsClient):
+        async def batch_update_cells(self, spreadsheet_id, sheet, ranges):
+            if sheet == "Products":
+                raise RuntimeError("quota exceeded")
+            return await super().batch_update_cells(spreadsheet_id, sheet, ranges)
+
+    from services.metrics import SHEET_UPDATE_FAILURES
+    from services.sheets_service import SheetsService
+
+    async def main():
+        service = SheetsService(sheets_client=FailingUpdates(sheets))
+        return await service.create_orders([{"customer_id": "C1", "products": [{"sku": "SKU-1", "quantity": 1}]}])
+
+    from services.metrics import SHEET_UPDATE_FAILURES
+    result = asyncio.run(main())
+    assert len(result["orders"]) == 1
+    assert result["update_errors"] == [{"sheet": "Products", "error": "quota exceeded"}]
+    assert sheets["Customers"][1][5] == 112.5
+    assert SHEET_UPDATE_FAILURES._values[("Products",)] >= 1
@@ -0,0 +1,89 @@
+"""
+Database Mirror Tests
+Configuration, incremental sync and the startup sync that runs before serving
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.data import HEADERS
+from benchmarks.fakes import FakeSheetsClient
+from services.db_mirror import DatabaseMirror
+
+
+@pytest.fixture
+def mirror_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'mirror.db'}"
+
+
+def test_mirror_is_off_unless_enabled(monkeypatch, mirror_url):
+    monkeypatch.delenv("SHEETS_MIRROR_ENABLED", raising=False)
+    monkeypatch.setenv("DATABASE_URL", mirror_url)
+    assert DatabaseMirror.from_env() is None
+
+
+def test_enabled_mirror_requires_a_database_url(monkeypatch):
+    monkeypatch.setenv("SHEETS_MIRROR_ENABLED", "true")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    with pytest.raises(ValueError, match="DATABASE_URL"):
+        DatabaseMirror.from_env()
+
+
+def test_sync_only_rewrites_changed_rows(mirror_url):
+    async def main():
+        mirror = DatabaseMirror(mirror_url)
+        header = HEADERS["Orders"]
+        first = await mirror.sync_sheet("Orders", [header, ["O1", "C1", "2024-01-01"], ["O2", "C1", "2024-01-02"]])
+        same = await mirror.sync_sheet("Orders", [header, ["O1", "C1", "2024-01-01"], ["O2", "C1", "2024-01-02"]])
+        edited = await mirror.sync_sheet("Orders", [header, ["O1", "C1", "2024-01-01"], ["O2", "C2", "2024-01-02"]])
+        removed = await mirror.sync_sheet("Orders", [header, ["O2", "C2", "2024-01-02"]])
+        return (first, same, edited, removed), await mirror.fetch_rows("Orders")
+
+    counts, rows = asyncio.run(main())
+    assert counts == (2, 0, 1, 1)
+    assert [row[:2] for row in rows[1:]] == [["O2", "C2"]]
+
+
+def test_sync_keeps_rows_upserted_after_the_read_began(mirror_url):
+    async def main():
+        mirror = DatabaseMirror(mirror_url)
+        header = HEADERS["Orders"]
+        await mirror.sync_sheet("Orders", [header, ["O1", "C1", "2024-01-01"]])
+        fetched_at = time.time()
+        await mirror.upsert_rows("Orders", [["O2", "C1", "2024-01-02"]])
+        # A read that began before the upsert doesn't know about O2
+        await mirror.sync_sheet("Orders", [header, ["O1", "C1", "2024-01-01"]], fetched_at)
+        return [row[0] for row in (await mirror.fetch_rows("Orders"))[1:]]
+
+    assert sorted(asyncio.run(main())) == ["O1", "O2"]
+
+
+def test_startup_syncs_a_populated_mirror_before_serving(monkeypatch, mirror_url):
+    monkeypatch.setenv("MAIN_SPREADSHEET_ID", "test")
+    monkeypatch.setenv("SHEETS_MIRROR_ENABLED", "true")
+    monkeypatch.setenv("DATABASE_URL", mirror_url)
+    monkeypatch.setenv("SHEETS_MIRROR_SYNC_SECONDS", "3600")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    from services.sheets_service import SheetsService
+
+    sheets = {
+        "Customers": [HEADERS["Customers"], ["C1", "Acme", "ops@acme.test", "", "2023-01-01", "0", "", "active"]],
+        "Orders": [HEADERS["Orders"]],
+        "Products": [HEADERS["Products"]],
+        "Interactions": [HEADERS["Interactions"]],
+    }
+
+    async def run_worker():
+        service = SheetsService(sheets_client=FakeSheetsClient(sheets))
+        await service.start()
+        try:
+            return await service.get_customer("C1")
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run_worker()).company_name == "Acme"
+    # Edited while no worker was running; the mirror isn't empty, but it is stale
+    sheets["Customers"][1][1] = "Acme Corp"
+    assert asyncio.run(run_worker()).company_name == "Acme Corp"
@@ -0,0 +1,61 @@
+"""
+Intent Router Tests
+Rule scoring, the learned fallback and which intents bypass the response cache
+"""
+
+import pytest
+
+from services.ai_service import UNCACHEABLE_INTENTS
+from services.intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("message, intent", [
+    # Explicit buy/order verbs outweigh shipping words
+    ("I want to order 5 cases shipped to our office", "create_order"),
+    ("Please order me some cables with express shipping", "create_order"),
+    ("Can you reorder my last order and deliver by Friday", "create_order"),
+    ("I want to buy a charger that works with iPhone 15", "create_order"),
+    ("Please place an order for 10 cables", "create_order"),
+    ("ship me 3 chargers", "create_order"),
+    # "order" as a noun names an existing order
+    ("order history please", "track_order"),
+    ("orders placed last week", "track_order"),
+    ("our order", "track_order"),
+    ("Where is my order ORD-1A2B3C4D?", "track_order"),
+    ("Can I get an invoice for order ORD-1A2B3C4D", "track_order"),
+    ("Has my order shipped?", "track_order"),
+    ("When will my package arrive", "track_order"),
+    # Changes to an existing order
+    ("cancel my order", "modify_order"),
+    ("I need to return a damaged item from my last order", "modify_order"),
+    ("Is the SKU-000001 compatible with my iPhone 15?", "product_inquiry"),
+    ("Do you have any chargers in stock?", "information"),
+    ("What is your return policy", "information"),
+])
+def test_rules(router, message, intent):
+    result = router.classify(message)
+    assert result["type"] == intent
+    assert result["source"] == "rules"
+
+
+def test_order_changing_intents_are_never_cached(router):
+    assert router.classify("Please order me some cables with express shipping")["type"] in UNCACHEABLE_INTENTS
+    assert router.classify("cancel my order")["type"] in UNCACHEABLE_INTENTS
+    assert router.classify("order history please")["type"] not in UNCACHEABLE_INTENTS
+
+
+def test_model_labels_come_from_the_rules(router):
+    queries = [f"where is my order number {i}" for i in range(15)] + [f"please order {i} more cables" for i in range(15)]
+    assert router.train(queries) == 30
+    assert router.model is not None
+    assert router.classify("hello there")["type"] == "information"
+
+
+def test_too_few_queries_train_nothing(router):
+    assert router.train(["where is my order"] * 5) == 0
+    assert router.model is None
@@ -0,0 +1,190 @@
+"""
+LLM Gateway Tests
+Fair concurrency limiting, circuit breaker state transitions and what trips the breaker
+"""
+
+import asyncio
+
+import pytest
+
+from services.llm_gateway import CircuitBreaker, FairLimiter, LLMGateway, ModelRoute, OverloadedError
+
+
+def test_limiter_serves_waiting_customers_round_robin():
+    limiter = FairLimiter(max_concurrent=1)
+    served = []
+
+    async def call(key, tag):
+        async with limiter.slot(key):
+            served.append(tag)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await limiter.acquire("holder")
+        # One customer's burst queues ahead of another's single request
+        tasks = [asyncio.ensure_future(call(key, tag)) for key, tag in (("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"))]
+        await asyncio.sleep(0)
+        assert limiter.waiting == 4
+        limiter.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert served == ["a1", "b1", "a2", "a3"]
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_limiter_rejects_when_the_queue_is_full():
+    limiter = FairLimiter(max_concurrent=1, max_queue=1)
+
+    async def scenario():
+        await limiter.acquire("a")
+        waiter = asyncio.ensure_future(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError):
+            await limiter.acquire("c")
+        limiter.release()
+        await waiter
+        limiter.release()
+
+    asyncio.run(scenario())
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    limiter = FairLimiter(max_concurrent=1)
+
+    async def scenario():
+        await limiter.acquire("a")
+        cancelled = asyncio.ensure_future(limiter.acquire("b"))
+        waiter = asyncio.ensure_future(limiter.acquire("c"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert limiter.waiting == 1
+        limiter.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        limiter.release()
+
+    asyncio.run(scenario())
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_waiter_cancelled_after_the_handoff_returns_the_slot():
+    limiter = FairLimiter(max_concurrent=1)
+
+    async def scenario():
+        await limiter.acquire("a")
+        waiter = asyncio.ensure_future(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        limiter.release()  # Slot handed to the waiter, which has not resumed yet
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def expire(breaker):
+    """Move the breaker past its reset timeout"""
+    breaker.opened_at -= breaker.reset_timeout
+    if breaker._trial_at is not None:
+        breaker._trial_at -= breaker.reset_timeout
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_released_trial_lets_another_call_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+
+def test_unreleased_trial_expires():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    assert not breaker.allow()
+    expire(breaker)
+    assert breaker.allow()
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def failing_gateway(errors):
+    async def create(**kwargs):
+        raise errors.pop(0)
+
+    return LLMGateway(create=create, hedge_delay=None, max_retries=0, failure_threshold=2, reset_timeout=30)
+
+
+def test_bad_requests_leave_the_breaker_alone():
+    gateway = failing_gateway([TimeoutError(), BadRequest("invalid messages"), TimeoutError()])
+    route = ModelRoute("gpt-4", 100, "large")
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(Exception):
+                await gateway.complete("a", route, [{"role": "user", "content": "hi"}])
+
+    asyncio.run(scenario())
+    # The bad request didn't reset the failure count between the two timeouts
+    assert gateway.breaker("gpt-4").state == "open"
+
+
+def test_bad_request_trial_keeps_the_breaker_half_open():
+    gateway = failing_gateway([BadRequest("invalid messages")])
+    route = ModelRoute("gpt-4", 100, "large")
+    breaker = gateway.breaker("gpt-4")
+    breaker.record_failure()
+    breaker.record_failure()
+    expire(breaker)
+
+    async def scenario():
+        with pytest.raises(BadRequest):
+            await gateway.complete("a", route, [{"role": "user", "content": "hi"}])
+
+    asyncio.run(scenario())
+    assert breaker.state == "half_open"
+    # The trial was released, so the next call may probe
+    assert breaker.allow()
@@ -0,0 +1,107 @@
+"""
+Order Index Tests
+Cursor encoding, filters, keyset pagination and order table parsing
+"""
+
+import json
+
+import pytest
+
+from services.order_index import OrderFilter, OrderIndex, decode_order_cursor, encode_order_cursor
+from services.sheet_records import OrderTable
+
+
+def order_row(order_id, customer_id, date, skus=("SKU-1",), status="delivered", total=10.0):
+    return [order_id, customer_id, date, json.dumps(list(skus)), json.dumps([1] * len(skus)), total, status, "", ""]
+
+
+@pytest.fixture
+def index():
+    rows = [
+        order_row("O1", "C1", "2024-01-05", status="delivered"),
+        order_row("O2", "C1", "2024-02-10", skus=("SKU-2",), status="shipped"),
+        order_row("O3", "C2", "2024-02-11"),
+        order_row("O4", "C1", "2024-03-01T09:30:00", skus=("SKU-1", "SKU-3"), status="pending"),
+        order_row("O5", "C1", "2024-03-15", skus=("SKU-10",), status="delivered"),
+    ]
+    return OrderIndex(rows)
+
+
+def ids(index, positions):
+    return [index.table.ids[position] for position in positions]
+
+
+def collect(index, customer_id, limit, filters=None):
+    """Every page of a customer's history, following cursors"""
+    pages, cursor = [], None
+    while True:
+        positions, cursor = index.page(customer_id, limit, cursor, filters)
+        pages.append(ids(index, positions))
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    key = ("2024-03-01T09:30:00", "ORD-ABC")
+    assert decode_order_cursor(encode_order_cursor(key)) == key
+    assert decode_order_cursor(None) is None
+    assert decode_order_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30=", "WzFd"])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_order_cursor(cursor)
+
+
+def test_pages_are_newest_first_without_gaps_or_repeats(index):
+    assert collect(index, "C1", 2) == [["O5", "O4"], ["O2", "O1"]]
+    assert collect(index, "C1", 3) == [["O5", "O4", "O2"], ["O1"]]
+    assert collect(index, "C1", 10) == [["O5", "O4", "O2", "O1"]]
+
+
+def test_unknown_customer_has_an_empty_page(index):
+    assert index.page("NOPE", 5) == ([], None)
+
+
+def test_zero_limit_returns_one_order(index):
+    positions, cursor = index.page("C1", 0)
+    assert ids(index, positions) == ["O5"]
+    assert cursor is not None
+
+
+def test_status_filter(index):
+    assert collect(index, "C1", 1, OrderFilter(status="DELIVERED")) == [["O5"], ["O1"]]
+
+
+def test_sku_filter_matches_whole_skus(index):
+    # "SKU-1" is a substring of "SKU-10" but not one of its line items
+    assert collect(index, "C1", 5, OrderFilter(sku="SKU-1")) == [["O4", "O1"]]
+
+
+def test_date_range_is_inclusive_of_the_end_day(index):
+    filters = OrderFilter(date_from="2024-02-01", date_to="2024-03-01")
+    assert collect(index, "C1", 5, filters) == [["O4", "O2"]]
+    assert collect(index, "C1", 1, filters) == [["O4"], ["O2"]]
+
+
+def test_order_table_keeps_first_row_per_id_and_skips_blank_rows():
+    table = OrderTable([
+        order_row("O1", "C1", "2024-01-01", total=5.0),
+        ["", "C1"],
+        ["O9"],
+        order_row("O1", "C2", "2024-06-01", total=99.0),
+        order_row("O2", "C1", "2024-01-02"),
+    ])
+    assert table.ids == ["O1", "O2"]
+    assert table.positions == {"O1": 0, "O2": 1}
+    order = table.to_model(table.positions["O1"])
+    assert (order.customer_id, order.total_amount, order.products) == ("C1", 5.0, ["SKU-1"])
+
+
+def test_order_table_defaults_missing_columns():
+    table = OrderTable([["O1", "C1", "2024-01-01"]])
+    order = table.to_model(0)
+    assert order.status == "pending"
+    assert order.products == [] and order.quantities == []
+    assert order.total_amount == 0.0
@@ -0,0 +1,88 @@
+"""
+Response Cache Tests
+Exact and similarity lookups, context scoping, expiry and the Redis tier
+"""
+
+import asyncio
+import time
+
+from services.response_cache import ResponseCache, context_digest, normalize_message
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_messages_match_after_normalization():
+    cache = ResponseCache()
+    digest = context_digest({"customer": "C1"})
+
+    async def scenario():
+        await cache.set("Where is my order?", digest, "It ships today.")
+        return await cache.get("  where IS my order ", digest), await cache.get("Where is my refund?", digest)
+
+    assert run(scenario()) == ("It ships today.", None)
+    assert normalize_message("Hello,   World!") == "hello world"
+    assert cache.get_stats()["hit_rate"] == 0.5
+
+
+def test_answers_are_scoped_to_their_context():
+    cache = ResponseCache()
+    before = context_digest({"customer": "C1", "orders": 1})
+    after = context_digest({"orders": 2, "customer": "C1"})
+
+    async def scenario():
+        await cache.set("Where is my order?", before, "It ships today.")
+        return await cache.get("Where is my order?", after)
+
+    assert run(scenario()) is None
+    assert context_digest({"a": 1, "b": 2}) == context_digest({"b": 2, "a": 1})
+
+
+def test_similar_questions_hit_only_above_the_threshold():
+    cache = ResponseCache(similarity_threshold=0.8)
+    digest = context_digest({"customer": "C1"})
+
+    async def scenario():
+        await cache.set("Where is my order?", digest, "It ships today.")
+        return (
+            await cache.get("Where is my order please?", digest),
+            await cache.get("What is your return policy?", digest),
+            await cache.get("Where is my order please?", context_digest({"customer": "C2"}))
+        )
+
+    assert run(scenario()) == ("It ships today.", None, None)
+    assert cache.stats["similar_hits"] == 1
+
+
+def test_entries_expire_and_are_evicted_least_recently_used():
+    cache = ResponseCache(max_entries=2, similarity_threshold=0.8)
+    digest = context_digest({})
+
+    async def scenario():
+        await cache.set("first question", digest, "1")
+        await cache.set("second question", digest, "2")
+        await cache.get("first question", digest)
+        await cache.set("third question", digest, "3")
+        evicted = await cache.get("second question", digest)
+        key = cache.key("first question", digest)
+        cache._entries[key] = (time.monotonic() - 1, "1")
+        expired = await cache.get("first question", digest)
+        return evicted, expired, await cache.get("third question", digest)
+
+    assert run(scenario()) == (None, None, "3")
+    # Evicted and expired answers leave the similarity tier too
+    assert [key for key, _ in cache._vectors[digest]] == [cache.key("third question", digest)]
+
+
+def test_redis_tier_is_shared_between_workers():
+    digest = context_digest({"customer": "C1"})
+    first = ResponseCache(redis_url="memory://response-cache")
+    second = ResponseCache(redis_url="memory://response-cache")
+
+    async def scenario():
+        await first.set("Where is my order?", digest, "It ships today.")
+        return await second.get("where is my order", digest)
+
+    assert run(scenario()) == "It ships today."
+    assert second.get_stats()["backend"] == "redis"
@@ -0,0 +1,63 @@
+"""
+Voice Streaming Tests
+Chunks pass through as synthesized, are cached once complete, and failures are raised
+"""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def ai_service(monkeypatch, tmp_path):
+    # The audio cache lives under the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    from services.ai_service import AIService
+    return AIService()
+
+
+def synthesizer(chunks, error=None):
+    def generate(text, voice, stream):
+        yield from chunks
+        if error:
+            raise error
+    return generate
+
+
+def collect(service, text):
+    async def main():
+        received = []
+        try:
+            async for chunk in service.stream_voice(text):
+                received.append(chunk)
+        except Exception as e:
+            return received, e
+        return received, None
+
+    return asyncio.run(main())
+
+
+def test_chunks_stream_through_and_are_cached(ai_service, monkeypatch):
+    monkeypatch.setattr("services.ai_service.generate", synthesizer([b"ab", b"cd"]))
+    assert collect(ai_service, "Hello") == ([b"ab", b"cd"], None)
+
+    monkeypatch.setattr("services.ai_service.generate", synthesizer([], RuntimeError("not called")))
+    assert collect(ai_service, "Hello") == ([b"abcd"], None)
+
+
+def test_error_before_the_first_chunk_is_raised(ai_service, monkeypatch):
+    monkeypatch.setattr("services.ai_service.generate", synthesizer([], RuntimeError("quota exceeded")))
+    received, error = collect(ai_service, "Hello")
+    assert received == []
+    assert str(error) == "quota exceeded"
+
+
+def test_error_mid_stream_is_raised_and_nothing_is_cached(ai_service, monkeypatch):
+    monkeypatch.setattr("services.ai_service.generate", synthesizer([b"ab"], RuntimeError("connection reset")))
+    received, error = collect(ai_service, "Hello")
+    assert received == [b"ab"]
+    assert str(error) == "connection reset"
+
+    monkeypatch.setattr("services.ai_service.generate", synthesizer([b"xy"]))
+    assert collect(ai_service, "Hello") == ([b"xy"], None)
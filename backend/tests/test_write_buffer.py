@@ -0,0 +1,144 @@
+"""
+Write Buffer Tests
+Batching, retention of refused batches and the record kept of dropped rows
+"""
+
+import json
+import asyncio
+import logging
+
+from services.write_buffer import WriteBehindBuffer
+
+
+class Quota(Exception):
+    status_code = 429
+
+
+class Writer:
+    """Records batches; raises ``error`` while it is set"""
+
+    def __init__(self):
+        self.batches = []
+        self.error = None
+
+    async def __call__(self, sheet, rows):
+        if self.error is not None:
+            raise self.error
+        self.batches.append((sheet, [row[0] for row in rows]))
+
+
+def make_buffer(writer, **kwargs):
+    options = {"batch_size": 2, "flush_interval": 60, "max_retries": 1, "retry_backoff": 0}
+    return WriteBehindBuffer(writer, **{**options, **kwargs})
+
+
+def test_rows_are_written_in_batches_per_sheet():
+    writer = Writer()
+
+    async def scenario():
+        buffer = make_buffer(writer)
+        for i in range(3):
+            await buffer.enqueue("Interactions", [i])
+        await buffer.enqueue("Orders", ["o"])
+        await buffer.stop()
+        return buffer.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert writer.batches == [("Interactions", [0, 1]), ("Interactions", [2]), ("Orders", ["o"])]
+    assert stats["written"] == 4 and stats["pending"] == 0
+
+
+def test_wait_resolves_after_the_write():
+    writer = Writer()
+
+    async def scenario():
+        buffer = make_buffer(writer, batch_size=50)
+        await asyncio.wait_for(buffer.enqueue("Interactions", ["now"], wait=True), timeout=2)
+        assert writer.batches == [("Interactions", ["now"])]
+        await buffer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_refused_batch_is_kept_and_written_first_later():
+    writer = Writer()
+
+    async def scenario():
+        buffer = make_buffer(writer)
+        writer.error = Quota("rate limit exceeded")
+        await buffer.enqueue("Interactions", [1])
+        await buffer.enqueue("Interactions", [2])
+        await buffer.flush()
+        assert buffer.pending == 2 and writer.batches == []
+
+        writer.error = None
+        await buffer.enqueue("Interactions", [3])
+        await buffer.stop()
+        return buffer.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert writer.batches == [("Interactions", [1, 2]), ("Interactions", [3])]
+    assert stats["dropped"] == 0
+
+
+def test_ambiguous_failure_drops_and_logs_every_row(caplog, tmp_path):
+    writer = Writer()
+    dead_letter = tmp_path / "dropped.jsonl"
+
+    async def scenario():
+        buffer = make_buffer(writer, dead_letter_path=str(dead_letter))
+        writer.error = TimeoutError("timed out")
+        await buffer.enqueue("Interactions", ["a"])
+        await buffer.enqueue("Interactions", ["b"])
+        await buffer.flush()
+        await buffer.stop()
+        return buffer.get_stats()
+
+    with caplog.at_level(logging.WARNING, logger="portal"):
+        stats = asyncio.run(scenario())
+
+    assert stats["dropped"] == 2 and stats["pending"] == 0
+    events = [json.loads(record.message) for record in caplog.records if record.name == "portal.metrics"]
+    assert [(e["event"], e["row"], e["reason"]) for e in events] == [
+        ("write_buffer_dropped", ["a"], "unconfirmed"),
+        ("write_buffer_dropped", ["b"], "unconfirmed"),
+    ]
+    assert all(record.levelno == logging.ERROR for record in caplog.records if record.name == "portal.metrics")
+    lines = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [line["row"] for line in lines] == [["a"], ["b"]]
+
+
+def test_waiters_see_the_drop():
+    writer = Writer()
+    writer.error = TimeoutError("timed out")
+
+    async def scenario():
+        buffer = make_buffer(writer)
+        try:
+            await asyncio.wait_for(buffer.enqueue("Interactions", ["x"], wait=True), timeout=2)
+        finally:
+            await buffer.stop()
+
+    try:
+        asyncio.run(scenario())
+    except TimeoutError as e:
+        assert str(e) == "timed out"
+    else:
+        raise AssertionError("enqueue(wait=True) should raise the write error")
+
+
+def test_refused_rows_over_the_retention_cap_are_dropped():
+    writer = Writer()
+    writer.error = Quota("quota exceeded")
+
+    async def scenario():
+        buffer = make_buffer(writer, max_retained=1)
+        await buffer.enqueue("Interactions", [1])
+        await buffer.enqueue("Interactions", [2])
+        await buffer.flush()
+        stats = buffer.get_stats()
+        await buffer.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["dropped"] == 2 and stats["pending"] == 0